@@ -0,0 +1,205 @@
+import math
+import os
+import threading
+import time
+from itertools import count
+
+from ollama_pool import OLLAMA_HOSTS
+
+OLLAMA_MAX_PARALLEL = int(os.getenv("OLLAMA_MAX_PARALLEL", "2"))
+OLLAMA_QUEUE_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_QUEUE_TIMEOUT_SECONDS", "120"))
+SERVICE_TIME_SMOOTHING = 0.2
+INITIAL_SERVICE_SECONDS = 15.0
+
+
+class QueueTimeout(TimeoutError):
+    pass
+
+
+class Ticket:
+    def __init__(self, controller, session_id, sequence, on_grant=None, on_timeout=None):
+        self.controller = controller
+        self.session_id = session_id
+        self.sequence = sequence
+        self.on_grant = on_grant
+        self.on_timeout = on_timeout
+        self.enqueued_at = time.monotonic()
+        self.deadline = self.enqueued_at + controller.queue_timeout
+        self.granted_at = None
+        self.released = False
+
+    @property
+    def granted(self):
+        return self.granted_at is not None
+
+    def waited(self):
+        return (self.granted_at or time.monotonic()) - self.enqueued_at
+
+    def interrupt(self):
+        self.controller.release(self)
+
+
+class AdmissionController:
+    def __init__(self, max_parallel=OLLAMA_MAX_PARALLEL, queue_timeout=OLLAMA_QUEUE_TIMEOUT_SECONDS):
+        self.max_parallel = max(1, max_parallel)
+        self.queue_timeout = queue_timeout
+        self.condition = threading.Condition()
+        self.sequence = count()
+        self.grants = count(1)
+        self.waiting = []
+        self.running = {}
+        self.last_served = {}
+        self.active = 0
+        self.service_seconds = INITIAL_SERVICE_SECONDS
+        self.admitted = 0
+        self.timeouts = 0
+        self.watcher = None
+
+    def enqueue(self, session_id, on_grant=None, on_timeout=None):
+        return self.submit(Ticket(self, session_id, next(self.sequence), on_grant, on_timeout))
+
+    def submit(self, ticket):
+        with self.condition:
+            self.waiting.append(ticket)
+            granted = self._grant()
+            if self.watcher is None:
+                self.watcher = threading.Thread(target=self._expire_waiting, name="admission-timeouts", daemon=True)
+                self.watcher.start()
+            self.condition.notify_all()
+        self._notify_granted(granted)
+        return ticket
+
+    def _queue_order(self):
+        return sorted(self.waiting, key=lambda ticket: (self.last_served.get(ticket.session_id, 0), ticket.sequence))
+
+    def _grant(self):
+        granted = []
+        while self.active < self.max_parallel and self.waiting:
+            ticket = self._queue_order()[0]
+            self.waiting.remove(ticket)
+            ticket.granted_at = time.monotonic()
+            self.active += 1
+            self.running[ticket.session_id] = self.running.get(ticket.session_id, 0) + 1
+            self.last_served[ticket.session_id] = next(self.grants)
+            self.admitted += 1
+            granted.append(ticket)
+        if granted:
+            self.condition.notify_all()
+        return granted
+
+    @staticmethod
+    def _notify_granted(granted):
+        for ticket in granted:
+            if ticket.on_grant is not None:
+                ticket.on_grant()
+
+    def _expire_waiting(self):
+        while True:
+            with self.condition:
+                now = time.monotonic()
+                expired = [ticket for ticket in self.waiting if ticket.deadline <= now]
+                for ticket in expired:
+                    self.waiting.remove(ticket)
+                    ticket.released = True
+                    self.timeouts += 1
+                if not expired:
+                    self.condition.wait(min((ticket.deadline for ticket in self.waiting), default=now + self.queue_timeout) - now)
+                    continue
+                self.condition.notify_all()
+            for ticket in expired:
+                if ticket.on_timeout is not None:
+                    ticket.on_timeout(self.timeout_error(ticket))
+
+    @staticmethod
+    def timeout_error(ticket):
+        return QueueTimeout(
+            f"Waited {ticket.waited():.0f}s for a free model slot; the local Ollama server is busy. "
+            f"Please try again shortly."
+        )
+
+    def acquire(self, ticket, timeout=None):
+        with self.condition:
+            self.condition.wait_for(lambda: ticket.granted or ticket.released, timeout)
+            return ticket.granted
+
+    def release(self, ticket):
+        with self.condition:
+            if ticket.released:
+                return
+            ticket.released = True
+
+            if ticket.granted:
+                self.active -= 1
+                remaining = self.running[ticket.session_id] - 1
+                if remaining:
+                    self.running[ticket.session_id] = remaining
+                else:
+                    del self.running[ticket.session_id]
+                held = time.monotonic() - ticket.granted_at
+                self.service_seconds += SERVICE_TIME_SMOOTHING * (held - self.service_seconds)
+            else:
+                self.waiting.remove(ticket)
+            granted = self._grant()
+            if not self.waiting:
+                self.last_served = {session_id: self.last_served[session_id] for session_id in self.running}
+            self.condition.notify_all()
+        self._notify_granted(granted)
+
+    def position(self, ticket):
+        with self.condition:
+            if ticket.granted or ticket.released:
+                return 0
+            return self._queue_order().index(ticket) + 1
+
+    def estimated_wait(self, ticket):
+        position = self.position(ticket)
+        if not position:
+            return 0.0
+        return math.ceil(position / self.max_parallel) * self.service_seconds
+
+    def status(self, ticket):
+        position = self.position(ticket)
+        if not position:
+            return None
+        return (f"⏳ Waiting for a free model slot · position {position} in queue · "
+                f"~{self.estimated_wait(ticket):.0f}s (waited {ticket.waited():.0f}s)")
+
+    def admit(self, session_id, handle):
+        chunk_source = handle.chunk_source
+
+        def admitted():
+            try:
+                yield from chunk_source() if callable(chunk_source) else chunk_source
+            finally:
+                self.release(ticket)
+
+        ticket = Ticket(self, session_id, next(self.sequence), on_grant=handle.start, on_timeout=handle.fail)
+        handle.chunk_source = admitted
+        if handle.state is not None:
+            handle.state["ticket"] = ticket
+        self.submit(ticket)
+        handle.cancel_event.register(ticket)
+        return ticket
+
+    def run(self, session_id, func, *args, **kwargs):
+        ticket = self.enqueue(session_id)
+        try:
+            if not self.acquire(ticket):
+                raise self.timeout_error(ticket)
+            return func(*args, **kwargs)
+        finally:
+            self.release(ticket)
+
+    def stats(self):
+        with self.condition:
+            return {
+                "max_parallel": self.max_parallel,
+                "active": self.active,
+                "queued": len(self.waiting),
+                "admitted": self.admitted,
+                "timeouts": self.timeouts,
+                "avg_service_seconds": round(self.service_seconds, 2)
+            }
+
+
+ollama_admission = AdmissionController(OLLAMA_MAX_PARALLEL * len(OLLAMA_HOSTS))
@@ -1,9 +1,53 @@
 import streamlit as st
-import time
+import atexit
+import uuid
 from datetime import datetime
 import os
-from dotenv import load_dotenv
-from huggingface_hub import InferenceClient
+from startup_timing import timed_import, mark_first_render, startup_report
+
+with timed_import("app modules"):
+    from dotenv import load_dotenv
+    from themes import THEMES, THEME_CSS
+    from think_parser import split_thinking
+    from response_cache import ResponseCache, make_cache_key, is_cache_eligible, replay_stream
+    from semantic_cache import SemanticCache, DEFAULT_THRESHOLD, SEMANTIC_CACHE_ENABLED
+    from context_window import ContextOverflow, ConversationContext, count_tokens, get_context_length
+    from rendering import render_message
+    from chat_history import (
+        init_history,
+        persist_history,
+        history_window,
+        show_more_history,
+        render_conversation_list,
+        render_memory_report
+    )
+    from message_memory import MessageRecord, session_memory
+    from document_panel import render_document_panel, retrieve_references
+    from repository_panel import render_repository_panel
+    from retrieval import format_references
+    from generation_worker import GenerationHandle
+    from model_router import hf_router
+    from rate_limit import hf_rate_limiter
+    from generation import (
+        LANGUAGES,
+        HF_MODELS,
+        build_hf_prompt,
+        hf_system_prompt,
+        make_hf_client,
+        stream_response_with_hf_api,
+        generate_full_response
+    )
+    from tracing import Trace, trace_recorder, METRICS_PORT
+    from single_flight import single_flight
+    from chat_ui import (
+        render_timestamp,
+        render_thinking,
+        render_stop_button,
+        render_streamed_response,
+        render_timings,
+        render_latency_panel,
+        cache_status_label
+    )
 
 load_dotenv()
 
@@ -13,66 +57,11 @@ st.set_page_config(
     layout="wide"
 )
 
-THEMES = {
-    "Dark Mode": {
-        "bg_color": "#1a1a1a",
-        "sidebar_bg": "#2d2d2d",
-        "text_color": "#ffffff",
-        "accent_color": "#4287f5",
-        "secondary_bg": "#3d3d3d",
-        "card_bg": "#2a2a2a",
-        "code_bg": "#252525",
-        "highlight_color": "#f9a825"
-    },
-    "Oceanic": {
-        "bg_color": "#0f2027",
-        "sidebar_bg": "#203a43",
-        "text_color": "#f0f8ff",
-        "accent_color": "#64b5f6",
-        "secondary_bg": "#2c5364",
-        "card_bg": "#1c313a",
-        "code_bg": "#162025",
-        "highlight_color": "#4fc3f7"
-    },
-    "Forest": {
-        "bg_color": "#0a1e0f",
-        "sidebar_bg": "#1e3b26",
-        "text_color": "#e8f5e9",
-        "accent_color": "#66bb6a",
-        "secondary_bg": "#2e5735",
-        "card_bg": "#1b2e20",
-        "code_bg": "#0f2213",
-        "highlight_color": "#aed581"
-    },
-    "Sunset": {
-        "bg_color": "#1a0f1c",
-        "sidebar_bg": "#2c1e33",
-        "text_color": "#ffebee",
-        "accent_color": "#ff7043",
-        "secondary_bg": "#3e2842",
-        "card_bg": "#261829",
-        "code_bg": "#1c131e",
-        "highlight_color": "#ffab40"
-    }
-}
-
-LANGUAGES = [
-    "Python", "JavaScript", "TypeScript", "Java", "C++", "C#", 
-    "Go", "Rust", "PHP", "Ruby", "Swift", "Kotlin"
-]
-
-HF_MODELS = {
-    "Bloom": "bigscience/bloom", 
-    "Bloom-560m": "bigscience/bloom-560m",
-    "Flan-T5-XL": "google/flan-t5-xl",
-    "Flan-T5-Large": "google/flan-t5-large",
-    "GPT2": "gpt2",
-    "GPT2-XL": "gpt2-xl",
-    "GPT-Neo": "EleutherAI/gpt-neo-1.3B"
-}
-
-if "message_log" not in st.session_state:
-    st.session_state.message_log = [{"role": "ai", "content": "Hi! I'm DeepSeek. How can I help you code today? 💻"}]
+GREETING = "Hi! I'm DeepSeek. How can I help you code today? 💻"
+CONVERSATION_APP = "cloud"
+
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 if "theme" not in st.session_state:
     st.session_state.theme = "Dark Mode"
@@ -80,121 +69,38 @@ if "theme" not in st.session_state:
 if "language" not in st.session_state:
     st.session_state.language = "Python"
 
+if "conversation_context" not in st.session_state:
+    st.session_state.conversation_context = ConversationContext(reserve_tokens=512)
+
+init_history(GREETING)
+
+if "active_generation" not in st.session_state:
+    st.session_state.active_generation = None
+
 if "thinking_visible" not in st.session_state:
     st.session_state.thinking_visible = True
+
+if "streaming_enabled" not in st.session_state:
+    st.session_state.streaming_enabled = True
+
+if "hedging_enabled" not in st.session_state:
+    st.session_state.hedging_enabled = True
+
+if "cache_enabled" not in st.session_state:
+    st.session_state.cache_enabled = True
+
+if "cache_any_temperature" not in st.session_state:
+    st.session_state.cache_any_temperature = False
+
+if "semantic_cache_enabled" not in st.session_state:
+    st.session_state.semantic_cache_enabled = SEMANTIC_CACHE_ENABLED
     
 if "model" not in st.session_state:
     st.session_state.model = "GPT2" 
 
 theme = THEMES[st.session_state.theme]
 
-st.markdown(f"""
-<style>
-    .main {{
-        background-color: {theme["bg_color"]};
-        color: {theme["text_color"]};
-    }}
-    
-    .sidebar .sidebar-content {{
-        background-color: {theme["sidebar_bg"]};
-    }}
-    
-    .stTextInput textarea, .stTextArea textarea {{
-        color: {theme["text_color"]} !important;
-        background-color: {theme["secondary_bg"]} !important;
-        border: 1px solid {theme["accent_color"]}40 !important;
-    }}
-    
-    .stSelectbox div[data-baseweb="select"] {{
-        color: {theme["text_color"]} !important;
-        background-color: {theme["secondary_bg"]} !important;
-        border: 1px solid {theme["accent_color"]}40 !important;
-    }}
-    
-    .stSelectbox svg {{
-        fill: {theme["text_color"]} !important;
-    }}
-    
-    div[role="listbox"] div {{
-        background-color: {theme["sidebar_bg"]} !important;
-        color: {theme["text_color"]} !important;
-    }}
-    
-    .stButton > button {{
-        background-color: {theme["accent_color"]};
-        color: {theme["text_color"]};
-        border: none;
-        border-radius: 4px;
-        padding: 0.5rem 1rem;
-        transition: all 0.3s;
-    }}
-    
-    .stButton > button:hover {{
-        background-color: {theme["highlight_color"]};
-    }}
-    
-    .message-container {{
-        background-color: {theme["card_bg"]};
-        border-radius: 10px;
-        padding: 15px;
-        margin-bottom: 15px;
-        border-left: 4px solid {theme["accent_color"]};
-        box-shadow: 0 2px 5px rgba(0,0,0,0.2);
-    }}
-    
-    .thinking-container {{
-        background-color: {theme["card_bg"]}90;
-        border-radius: 10px;
-        padding: 10px 15px;
-        margin: 10px 0;
-        border-left: 3px dashed {theme["highlight_color"]};
-    }}
-    
-    .time-stamp {{
-        font-size: 0.7rem;
-        color: {theme["text_color"]}80;
-        margin-top: 5px;
-        font-style: italic;
-    }}
-    
-    .header-container {{
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        margin-bottom: 20px;
-    }}
-    
-    .code-block {{
-        background-color: {theme["code_bg"]};
-        border-radius: 5px;
-        border-left: 3px solid {theme["accent_color"]};
-    }}
-    
-    /* Hide default streamlit branding */
-    #MainMenu, footer, header {{
-        visibility: hidden;
-    }}
-    
-    /* Custom scrollbar */
-    ::-webkit-scrollbar {{
-        width: 8px;
-        height: 8px;
-    }}
-    
-    ::-webkit-scrollbar-track {{
-        background: {theme["bg_color"]};
-    }}
-    
-    ::-webkit-scrollbar-thumb {{
-        background: {theme["accent_color"]}80;
-        border-radius: 4px;
-    }}
-    
-    ::-webkit-scrollbar-thumb:hover {{
-        background: {theme["accent_color"]};
-    }}
-</style>
-""", unsafe_allow_html=True)
+st.markdown(THEME_CSS[st.session_state.theme], unsafe_allow_html=True)
 
 with st.sidebar:
     st.markdown(f"""
@@ -237,8 +143,34 @@ with st.sidebar:
         st.session_state.language = selected_language
     
     st.session_state.thinking_visible = st.toggle("Show Thinking Process", value=st.session_state.thinking_visible)
+    st.session_state.streaming_enabled = st.toggle("Stream Responses", value=st.session_state.streaming_enabled)
+    st.session_state.hedging_enabled = st.toggle(
+        "Hedge Slow Models",
+        value=st.session_state.hedging_enabled,
+        disabled=not st.session_state.streaming_enabled,
+        help="Start a fallback model if the selected one has not produced a token in time"
+    )
     
     temperature = st.slider("Temperature", min_value=0.0, max_value=1.0, value=0.3, step=0.1)
+    st.session_state.cache_enabled = st.toggle("Response Cache", value=st.session_state.cache_enabled)
+    st.session_state.cache_any_temperature = st.checkbox(
+        "Cache at any temperature",
+        value=st.session_state.cache_any_temperature,
+        disabled=not st.session_state.cache_enabled
+    )
+    st.session_state.semantic_cache_enabled = st.toggle(
+        "Semantic Cache",
+        value=st.session_state.semantic_cache_enabled,
+        disabled=not st.session_state.cache_enabled
+    )
+    semantic_threshold = st.slider(
+        "Similarity Threshold",
+        min_value=0.8,
+        max_value=0.99,
+        value=DEFAULT_THRESHOLD,
+        step=0.01,
+        disabled=not (st.session_state.cache_enabled and st.session_state.semantic_cache_enabled)
+    )
     
     st.divider()
     
@@ -259,18 +191,15 @@ with st.sidebar:
     
     st.markdown("### 🚀 Try These Examples")
     if st.button("Debug a recursive function"):
-        example_query = "Debug this recursive function that's causing a stack overflow: def factorial(n): return n * factorial(n-1)"
-        st.session_state.message_log.append({"role": "user", "content": example_query})
+        st.session_state.pending_query = "Debug this recursive function that's causing a stack overflow: def factorial(n): return n * factorial(n-1)"
         st.rerun()
         
     if st.button("Explain a sorting algorithm"):
-        example_query = "Explain how quicksort works and show me an implementation in Python"
-        st.session_state.message_log.append({"role": "user", "content": example_query})
+        st.session_state.pending_query = "Explain how quicksort works and show me an implementation in Python"
         st.rerun()
         
     if st.button("Generate a REST API"):
-        example_query = f"Create a simple REST API for a todo app using {st.session_state.language}"
-        st.session_state.message_log.append({"role": "user", "content": example_query})
+        st.session_state.pending_query = f"Create a simple REST API for a todo app using {st.session_state.language}"
         st.rerun()
     
     st.divider()
@@ -300,113 +229,174 @@ def get_hf_api_client():
     if not hf_token:
         st.warning("⚠️ HF_TOKEN not found in environment. Some models may have limited access.")
     
-    return InferenceClient(token=hf_token)
+    return make_hf_client(hf_token)
 
-def generate_response_with_hf_api(client, query, model_name, temp):
-    try:
-        model_id = HF_MODELS[model_name]
-        system_prompt = f"You are DeepSeek, an expert AI coding assistant specialized in {st.session_state.language}."
-        
-        conversation = system_prompt + "\n\n"
-        
-        for msg in st.session_state.message_log[-5:]: 
-            if msg["role"] == "user":
-                conversation += f"User: {msg['content']}\n\n"
-            elif msg["role"] == "ai":
-                conversation += f"Assistant: {msg['content']}\n\n"
-        
-        conversation += f"User: {query}\n\nAssistant:"
-        
-        try:
-            if "t5" in model_id.lower():
-                response = client.text_generation(
-                    prompt=conversation,
-                    model=model_id,
-                    max_new_tokens=512,
-                    temperature=temp,
-                    do_sample=True
-                )
-            else:
-                response = client.text_generation(
-                    prompt=conversation,
-                    model=model_id,
-                    max_new_tokens=512,
-                    temperature=temp,
-                    do_sample=True
-                )
-            
-            return response.strip()
-        except Exception as e:
-            fallback_model = "gpt2"
-            st.warning(f"Error with primary model: {str(e)}. Trying fallback model...")
-            
-            response = client.text_generation(
-                prompt=conversation,
-                model=fallback_model,
-                max_new_tokens=512, 
-                temperature=temp,
-                do_sample=True
-            )
-            
-            return response.strip() + "\n\n(Note: This response was generated using a fallback model)"
-    except Exception as e:
-        return f"""
-I'm sorry, I encountered an error generating a response: {str(e)}
-
-This could be due to:
-1. The model being unavailable on Hugging Face
-2. Missing or invalid HF_TOKEN
-3. Network connectivity issues
-4. Rate limiting on the Hugging Face API
-
-Please try:
-- Selecting a different model
-- Checking your HF_TOKEN in the .env file
-- Reducing the complexity of your query
-- Waiting a few minutes and trying again
-"""
-
-def format_code_block(content):
-    formatted = content
-    if "```" in content:
-        parts = content.split("```")
-        for i in range(1, len(parts), 2):
-            if i < len(parts):
-                code_lines = parts[i].strip().split("\n")
-                if code_lines[0] and not code_lines[0].startswith(" "):
-                    lang = code_lines[0]
-                    code = "\n".join(code_lines[1:])
-                    parts[i] = f"{lang}\n{code}"
-                
-                parts[i] = f'<div class="code-block">\n```{parts[i]}```\n</div>'
+@st.cache_resource
+def get_trace_recorder():
+    trace_recorder.register_collector(session_memory.prometheus_lines)
+    if METRICS_PORT:
+        trace_recorder.start_metrics_server(METRICS_PORT)
+    return trace_recorder
+
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache()
+
+@st.cache_resource
+def get_semantic_cache():
+    semantic_cache = SemanticCache()
+    atexit.register(semantic_cache.flush)
+    return semantic_cache
+
+def build_conversation(query, references=""):
+    history = st.session_state.message_log
+    if history and history[-1]["role"] == "user" and history[-1]["content"] == query:
+        history = history[:-1]
+    
+    summary, history = st.session_state.conversation_context.fit(
+        history,
+        count_tokens(hf_system_prompt(st.session_state.language)) + count_tokens(references) + count_tokens(query),
+        keep_last=False
+    )
+    return build_hf_prompt(st.session_state.language, query, history, summary, references)
+
+def start_generation(query):
+    model_id = HF_MODELS[st.session_state.model]
+    trace = Trace(model_id, "huggingface")
+    st.session_state.conversation_context.context_length = get_context_length(model_id)
+    with trace.span("retrieval"):
+        references = retrieve_references(query, st.session_state.conversation_context.prompt_budget())
+    with trace.span("prompt_build"):
+        conversation = build_conversation(query, format_references(references))
+    
+    response_cache = get_response_cache()
+    cache_eligible = st.session_state.cache_enabled and is_cache_eligible(temperature, st.session_state.cache_any_temperature)
+    cache_key = make_cache_key(model_id, temperature, st.session_state.language, conversation)
+    with trace.span("cache_lookup"):
+        cached_response = response_cache.get(cache_key) if cache_eligible else None
+        cache_source = "exact" if cached_response is not None else None
+        similarity = None
         
-        formatted = "".join(parts)
-    
-    return formatted
-
-def generate_thinking_process(query):
-    thinking_steps = [
-        "Analyzing the problem...",
-        f"Considering best practices for {st.session_state.language}...",
-        "Evaluating potential solutions...",
-        "Checking for edge cases...",
-        "Optimizing for readability and performance...",
-        "Formulating explanation and examples..."
-    ]
+        semantic_cache = get_semantic_cache()
+        semantic_scope = SemanticCache.scope_id(model_id, st.session_state.language, round(float(temperature), 2))
+        semantic_eligible = (
+            cache_eligible
+            and st.session_state.semantic_cache_enabled
+            and st.session_state.history_offset == 0
+            and not references
+            and sum(1 for msg in st.session_state.message_log if msg["role"] == "user") == 1
+        )
+        if cached_response is None and semantic_eligible:
+            semantic_match = semantic_cache.lookup(query, semantic_scope, semantic_threshold)
+            if semantic_match is not None:
+                cached_response, similarity = semantic_match
+                cache_source = "semantic"
+    
+    outcome = {"status": "cached"}
+    if cached_response is not None:
+        handle = GenerationHandle(replay_stream(cached_response))
+        handle.state = outcome
+    elif st.session_state.streaming_enabled:
+        handle = single_flight.subscribe(cache_key, lambda: stream_response_with_hf_api(
+            get_hf_api_client(), conversation, st.session_state.model, temperature, outcome, st.session_state.hedging_enabled
+        ), state=outcome)
+    else:
+        handle = single_flight.subscribe(cache_key, lambda: generate_full_response(
+            get_hf_api_client(), conversation, st.session_state.model, temperature, outcome
+        ), state=outcome)
+    
+    st.session_state.active_generation = {
+        "trace": trace,
+        "handle": handle,
+        "shared": not getattr(handle, "leader", True),
+        "query": query,
+        "outcome": handle.state,
+        "progressive": st.session_state.streaming_enabled,
+        "cache_eligible": cache_eligible,
+        "cache_key": cache_key,
+        "cache_source": cache_source,
+        "similarity": similarity,
+        "references": len(references),
+        "semantic_eligible": semantic_eligible,
+        "semantic_scope": semantic_scope
+    }
+    return st.session_state.active_generation
+
+def finish_generation(active_generation):
+    handle = active_generation["handle"]
+    handle.wait(timeout=1.0)
+    raw_response = handle.text()
+    _, ai_response = split_thinking(raw_response)
+    
+    completed = handle.done and not handle.cancelled and handle.error is None and handle.claim_finalization()
+    if completed and ai_response and active_generation["cache_eligible"] and active_generation["outcome"]["status"] == "ok":
+        get_response_cache().put(active_generation["cache_key"], raw_response)
+        if active_generation["semantic_eligible"]:
+            get_semantic_cache().add(active_generation["query"], raw_response, active_generation["semantic_scope"])
+    
+    trace = active_generation["trace"]
+    trace.add_generation_spans(handle)
+    trace.finish(
+        status="error" if handle.error is not None else "cancelled" if handle.cancelled else active_generation["outcome"]["status"],
+        cache_source=active_generation["cache_source"],
+        shared=active_generation["shared"],
+        response_chars=len(raw_response)
+    )
+    get_trace_recorder().record(trace)
     
-    thinking_container = st.empty()
+    if ai_response:
+        st.session_state.message_log.append(MessageRecord("ai", ai_response, trace.breakdown()))
+        persist_history(CONVERSATION_APP)
+    st.session_state.active_generation = None
+    return ai_response
+
+def render_active_generation(active_generation):
+    handle = active_generation["handle"]
     
-    for step in thinking_steps:
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        thinking_container.markdown(f"""
-        <div class="thinking-container">
-            <span>💭 {step}</span>
-            <div class="time-stamp">⏱️ {timestamp}</div>
-        </div>
-        """, unsafe_allow_html=True)
-        time.sleep(0.5 + (hash(step) % 7) / 10)
+    thinking_placeholder = None
+    if st.session_state.thinking_visible:
+        thinking_placeholder = st.empty()
+        render_thinking(thinking_placeholder, "")
     
-    return thinking_container
+    with st.chat_message("ai"):
+        stop_placeholder = st.empty()
+        if not handle.cancelled:
+            render_stop_button(stop_placeholder)
+        
+        render_timing = {}
+        render_streamed_response(
+            handle.iter_chunks(),
+            thinking_placeholder,
+            active_generation["progressive"],
+            status=hf_rate_limiter.status,
+            timing=render_timing
+        )
+        active_generation["trace"].add_span(
+            "render",
+            render_timing["started"],
+            render_timing["started"] + render_timing["render_seconds"]
+        )
+        stop_placeholder.empty()
+        ai_response = finish_generation(active_generation)
+        
+        if active_generation["outcome"].get("warning"):
+            st.warning(active_generation["outcome"]["warning"])
+        if handle.error is not None:
+            st.error(f"Generation failed: {str(handle.error)}")
+        if handle.cancelled:
+            st.caption("⏹ Generation stopped")
+        status_label = cache_status_label(
+            active_generation["cache_eligible"],
+            active_generation["cache_source"],
+            active_generation["similarity"]
+        )
+        if active_generation["shared"]:
+            status_label += " · 🔗 shared in-flight request"
+        if active_generation["references"]:
+            status_label += f" · 📎 {active_generation['references']} excerpts"
+        render_timestamp(status_label)
+        if ai_response:
+            render_timings(st.session_state.message_log[-1]["timings"])
 
 st.markdown("""
     <div class='header-container'>
@@ -417,11 +407,18 @@ st.markdown("""
 chat_container = st.container()
 
 with chat_container:
-    for message in st.session_state.message_log:
+    first_visible, hidden_messages = history_window()
+    
+    if hidden_messages:
+        if st.button(f"⬆️ Load earlier messages ({hidden_messages} hidden)"):
+            show_more_history()
+            st.rerun()
+    
+    for message in st.session_state.message_log[first_visible:]:
         timestamp = datetime.now().strftime("%H:%M:%S")
         with st.chat_message(message["role"]):
             if message["role"] == "ai":
-                formatted_message = format_code_block(message["content"])
+                formatted_message = render_message(message["content"])
                 st.markdown(formatted_message, unsafe_allow_html=True)
             else:
                 st.markdown(message["content"])
@@ -429,6 +426,7 @@ with chat_container:
             st.markdown(f"""
             <div class="time-stamp">⏱️ {timestamp}</div>
             """, unsafe_allow_html=True)
+            render_timings(message.get("timings"))
 
 hf_token = os.getenv("HF_TOKEN")
 
@@ -450,39 +448,44 @@ if not hf_token:
         This will authenticate your requests and increase your rate limits.
         """)
 
-user_query = st.chat_input("Ask me about code, debugging, documentation, or algorithms...")
+user_query = st.chat_input("Ask me about code, debugging, documentation, or algorithms...") or st.session_state.pop("pending_query", None)
+
+mark_first_render()
+
+with st.sidebar:
+    render_conversation_list(CONVERSATION_APP, GREETING)
+    render_document_panel()
+    render_repository_panel(allow_local_paths=False)
+    render_memory_report()
+    with st.expander("⏱️ Startup timing"):
+        st.json(startup_report())
+    with st.expander("🧭 Model routing"):
+        st.json(hf_router.stats())
+    with st.expander("🪣 API rate limit"):
+        st.json(hf_rate_limiter.stats())
+    render_latency_panel(get_trace_recorder(), HF_MODELS[st.session_state.model])
+
+active_generation = st.session_state.active_generation
 
 if user_query:
+    if active_generation is not None:
+        active_generation["handle"].cancel()
+        partial_response = finish_generation(active_generation)
+        if partial_response:
+            with st.chat_message("ai"):
+                st.markdown(render_message(partial_response), unsafe_allow_html=True)
+                st.caption("⏹ Generation stopped")
+    
     with st.chat_message("user"):
         st.markdown(user_query)
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        st.markdown(f"""
-        <div class="time-stamp">⏱️ {timestamp}</div>
-        """, unsafe_allow_html=True)
-    
-    st.session_state.message_log.append({"role": "user", "content": user_query})
-    
-    if st.session_state.thinking_visible:
-        thinking_placeholder = generate_thinking_process(user_query)
-    
-    with st.spinner("🧠 Processing..."):
-        client = get_hf_api_client()
-        ai_response = generate_response_with_hf_api(
-            client, 
-            user_query, 
-            st.session_state.model, 
-            temperature
-        )
+        render_timestamp()
     
-    if st.session_state.thinking_visible:
-        thinking_placeholder.empty()
-    
-    with st.chat_message("ai"):
-        formatted_response = format_code_block(ai_response)
-        st.markdown(formatted_response, unsafe_allow_html=True)
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        st.markdown(f"""
-        <div class="time-stamp">⏱️ {timestamp}</div>
-        """, unsafe_allow_html=True)
-    
-    st.session_state.message_log.append({"role": "ai", "content": ai_response})
\ No newline at end of file
+    st.session_state.message_log.append(MessageRecord("user", user_query))
+    persist_history(CONVERSATION_APP)
+    try:
+        active_generation = start_generation(user_query)
+    except ContextOverflow as e:
+        st.error(str(e))
+
+if active_generation is not None:
+    render_active_generation(active_generation)
@@ -1,14 +1,52 @@
 import streamlit as st
-import time
+import atexit
+import uuid
 from datetime import datetime
-from langchain_ollama import ChatOllama
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import (
-    SystemMessagePromptTemplate,
-    HumanMessagePromptTemplate,
-    AIMessagePromptTemplate,
-    ChatPromptTemplate
-)
+from startup_timing import timed_import, mark_first_render, startup_report
+
+with timed_import("app modules"):
+    from themes import THEMES, THEME_CSS
+    from think_parser import split_thinking
+    from response_cache import ResponseCache, make_cache_key, is_cache_eligible, replay_stream
+    from semantic_cache import SemanticCache, DEFAULT_THRESHOLD, SEMANTIC_CACHE_ENABLED
+    from context_window import ContextOverflow, ConversationContext, count_tokens, extractive_summary, get_context_length
+    from prompt_builder import PromptHistory
+    from rendering import render_message
+    from chat_history import (
+        init_history,
+        persist_history,
+        history_window,
+        show_more_history,
+        render_conversation_list,
+        render_memory_report
+    )
+    from message_memory import MessageRecord, session_memory
+    from document_panel import render_document_panel, retrieve_references
+    from repository_panel import render_repository_panel
+    from retrieval import format_references
+    from generation_worker import GenerationHandle
+    from single_flight import single_flight
+    from admission import ollama_admission
+    from model_warmup import ModelWarmer, OLLAMA_KEEP_ALIVE
+    from ollama_pool import ollama_pool
+    from tracing import Trace, trace_recorder, METRICS_PORT
+    from generation import (
+        LANGUAGES,
+        OLLAMA_MODELS,
+        local_system_prompt,
+        make_ollama_engine,
+        generate_ai_response,
+        stream_ai_response
+    )
+    from chat_ui import (
+        render_timestamp,
+        render_thinking,
+        render_stop_button,
+        render_streamed_response,
+        render_timings,
+        render_latency_panel,
+        cache_status_label
+    )
 
 st.set_page_config(
     page_title="DeepSeek Code Companion",
@@ -16,56 +54,26 @@ st.set_page_config(
     layout="wide"
 )
 
-THEMES = {
-    "Dark Mode": {
-        "bg_color": "#1a1a1a",
-        "sidebar_bg": "#2d2d2d",
-        "text_color": "#ffffff",
-        "accent_color": "#4287f5",
-        "secondary_bg": "#3d3d3d",
-        "card_bg": "#2a2a2a",
-        "code_bg": "#252525",
-        "highlight_color": "#f9a825"
-    },
-    "Oceanic": {
-        "bg_color": "#0f2027",
-        "sidebar_bg": "#203a43",
-        "text_color": "#f0f8ff",
-        "accent_color": "#64b5f6",
-        "secondary_bg": "#2c5364",
-        "card_bg": "#1c313a",
-        "code_bg": "#162025",
-        "highlight_color": "#4fc3f7"
-    },
-    "Forest": {
-        "bg_color": "#0a1e0f",
-        "sidebar_bg": "#1e3b26",
-        "text_color": "#e8f5e9",
-        "accent_color": "#66bb6a",
-        "secondary_bg": "#2e5735",
-        "card_bg": "#1b2e20",
-        "code_bg": "#0f2213",
-        "highlight_color": "#aed581"
-    },
-    "Sunset": {
-        "bg_color": "#1a0f1c",
-        "sidebar_bg": "#2c1e33",
-        "text_color": "#ffebee",
-        "accent_color": "#ff7043",
-        "secondary_bg": "#3e2842",
-        "card_bg": "#261829",
-        "code_bg": "#1c131e",
-        "highlight_color": "#ffab40"
-    }
-}
+GREETING = "Hi! I'm DeepSeek. How can I help you code today? 💻"
+CONVERSATION_APP = "local"
+
+@st.cache_resource
+def get_ollama_pool():
+    ollama_pool.start()
+    atexit.register(ollama_pool.stop)
+    return ollama_pool
 
-LANGUAGES = [
-    "Python", "JavaScript", "TypeScript", "Java", "C++", "C#", 
-    "Go", "Rust", "PHP", "Ruby", "Swift", "Kotlin"
-]
+@st.cache_resource
+def get_model_warmers():
+    model_warmers = {}
+    for base_url in get_ollama_pool().urls:
+        model_warmers[base_url] = ModelWarmer(base_url)
+        model_warmers[base_url].preload()
+        atexit.register(model_warmers[base_url].stop)
+    return model_warmers
 
-if "message_log" not in st.session_state:
-    st.session_state.message_log = [{"role": "ai", "content": "Hi! I'm DeepSeek. How can I help you code today? 💻"}]
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 if "theme" not in st.session_state:
     st.session_state.theme = "Dark Mode"
@@ -73,118 +81,35 @@ if "theme" not in st.session_state:
 if "language" not in st.session_state:
     st.session_state.language = "Python"
 
+if "conversation_context" not in st.session_state:
+    st.session_state.conversation_context = ConversationContext(reserve_tokens=1024)
+
+if "prompt_history" not in st.session_state:
+    st.session_state.prompt_history = PromptHistory()
+
+init_history(GREETING)
+
+if "active_generation" not in st.session_state:
+    st.session_state.active_generation = None
+
 if "thinking_visible" not in st.session_state:
     st.session_state.thinking_visible = True
 
+if "streaming_enabled" not in st.session_state:
+    st.session_state.streaming_enabled = True
+
+if "cache_enabled" not in st.session_state:
+    st.session_state.cache_enabled = True
+
+if "cache_any_temperature" not in st.session_state:
+    st.session_state.cache_any_temperature = False
+
+if "semantic_cache_enabled" not in st.session_state:
+    st.session_state.semantic_cache_enabled = SEMANTIC_CACHE_ENABLED
+
 theme = THEMES[st.session_state.theme]
 
-st.markdown(f"""
-<style>
-    .main {{
-        background-color: {theme["bg_color"]};
-        color: {theme["text_color"]};
-    }}
-    
-    .sidebar .sidebar-content {{
-        background-color: {theme["sidebar_bg"]};
-    }}
-    
-    .stTextInput textarea, .stTextArea textarea {{
-        color: {theme["text_color"]} !important;
-        background-color: {theme["secondary_bg"]} !important;
-        border: 1px solid {theme["accent_color"]}40 !important;
-    }}
-    
-    .stSelectbox div[data-baseweb="select"] {{
-        color: {theme["text_color"]} !important;
-        background-color: {theme["secondary_bg"]} !important;
-        border: 1px solid {theme["accent_color"]}40 !important;
-    }}
-    
-    .stSelectbox svg {{
-        fill: {theme["text_color"]} !important;
-    }}
-    
-    div[role="listbox"] div {{
-        background-color: {theme["sidebar_bg"]} !important;
-        color: {theme["text_color"]} !important;
-    }}
-    
-    .stButton > button {{
-        background-color: {theme["accent_color"]};
-        color: {theme["text_color"]};
-        border: none;
-        border-radius: 4px;
-        padding: 0.5rem 1rem;
-        transition: all 0.3s;
-    }}
-    
-    .stButton > button:hover {{
-        background-color: {theme["highlight_color"]};
-    }}
-    
-    .message-container {{
-        background-color: {theme["card_bg"]};
-        border-radius: 10px;
-        padding: 15px;
-        margin-bottom: 15px;
-        border-left: 4px solid {theme["accent_color"]};
-        box-shadow: 0 2px 5px rgba(0,0,0,0.2);
-    }}
-    
-    .thinking-container {{
-        background-color: {theme["card_bg"]}90;
-        border-radius: 10px;
-        padding: 10px 15px;
-        margin: 10px 0;
-        border-left: 3px dashed {theme["highlight_color"]};
-    }}
-    
-    .time-stamp {{
-        font-size: 0.7rem;
-        color: {theme["text_color"]}80;
-        margin-top: 5px;
-        font-style: italic;
-    }}
-    
-    .header-container {{
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        margin-bottom: 20px;
-    }}
-    
-    .code-block {{
-        background-color: {theme["code_bg"]};
-        border-radius: 5px;
-        border-left: 3px solid {theme["accent_color"]};
-    }}
-    
-    /* Hide default streamlit branding */
-    #MainMenu, footer, header {{
-        visibility: hidden;
-    }}
-    
-    /* Custom scrollbar */
-    ::-webkit-scrollbar {{
-        width: 8px;
-        height: 8px;
-    }}
-    
-    ::-webkit-scrollbar-track {{
-        background: {theme["bg_color"]};
-    }}
-    
-    ::-webkit-scrollbar-thumb {{
-        background: {theme["accent_color"]}80;
-        border-radius: 4px;
-    }}
-    
-    ::-webkit-scrollbar-thumb:hover {{
-        background: {theme["accent_color"]};
-    }}
-</style>
-""", unsafe_allow_html=True)
+st.markdown(THEME_CSS[st.session_state.theme], unsafe_allow_html=True)
 
 with st.sidebar:
     st.markdown(f"""
@@ -210,10 +135,19 @@ with st.sidebar:
     
     selected_model = st.selectbox(
         "Model",
-        ["deepseek-r1:1.5b", "deepseek-r1:3b"],
+        OLLAMA_MODELS,
         index=0
     )
     
+    model_warmers = get_model_warmers()
+    if st.session_state.get("warmed_model") != selected_model:
+        for model_warmer in model_warmers.values():
+            model_warmer.warm(selected_model, force=True)
+        st.session_state.warmed_model = selected_model
+    for base_url, model_warmer in model_warmers.items():
+        for status_line in model_warmer.status_lines():
+            st.caption(status_line + (f" · {base_url}" if len(model_warmers) > 1 else ""))
+    
     selected_language = st.selectbox(
         "Code Output Language",
         LANGUAGES,
@@ -224,7 +158,27 @@ with st.sidebar:
         st.session_state.language = selected_language
     
     st.session_state.thinking_visible = st.toggle("Show Thinking Process", value=st.session_state.thinking_visible)
+    st.session_state.streaming_enabled = st.toggle("Stream Responses", value=st.session_state.streaming_enabled)
     temperature = st.slider("Temperature", min_value=0.0, max_value=1.0, value=0.3, step=0.1)
+    st.session_state.cache_enabled = st.toggle("Response Cache", value=st.session_state.cache_enabled)
+    st.session_state.cache_any_temperature = st.checkbox(
+        "Cache at any temperature",
+        value=st.session_state.cache_any_temperature,
+        disabled=not st.session_state.cache_enabled
+    )
+    st.session_state.semantic_cache_enabled = st.toggle(
+        "Semantic Cache",
+        value=st.session_state.semantic_cache_enabled,
+        disabled=not st.session_state.cache_enabled
+    )
+    semantic_threshold = st.slider(
+        "Similarity Threshold",
+        min_value=0.8,
+        max_value=0.99,
+        value=DEFAULT_THRESHOLD,
+        step=0.01,
+        disabled=not (st.session_state.cache_enabled and st.session_state.semantic_cache_enabled)
+    )
     
     st.divider()
     
@@ -252,81 +206,236 @@ with st.sidebar:
     """, unsafe_allow_html=True)
 
 @st.cache_resource
-def get_llm_engine(model_name, temp):
-    return ChatOllama(
-        model=model_name,
-        base_url="http://localhost:11434",
-        temperature=temp
-    )
+def get_llm_engine(model_name, temp, base_url):
+    return make_ollama_engine(model_name, temp, base_url, OLLAMA_KEEP_ALIVE)
 
-llm_engine = get_llm_engine(selected_model, temperature)
+def get_llm_engines(model_name, temp):
+    return {base_url: get_llm_engine(model_name, temp, base_url) for base_url in get_ollama_pool().urls}
 
-def get_system_prompt():
-    return SystemMessagePromptTemplate.from_template(
-        f"""You are DeepSeek, an expert AI coding assistant specialized in {st.session_state.language}.
-        Provide concise, correct solutions with strategic print statements for debugging.
-        When generating code solutions, prioritize writing in {st.session_state.language} unless specifically asked otherwise.
-        Break down complex problems step-by-step with clear explanations.
-        Always respond in English and follow best practices for {st.session_state.language} development."""
-    )
+st.session_state.conversation_context.context_length = get_context_length(selected_model)
+
+@st.cache_resource
+def get_trace_recorder():
+    trace_recorder.register_collector(session_memory.prometheus_lines)
+    if METRICS_PORT:
+        trace_recorder.start_metrics_server(METRICS_PORT)
+    return trace_recorder
+
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache()
+
+@st.cache_resource
+def get_semantic_cache():
+    semantic_cache = SemanticCache()
+    atexit.register(semantic_cache.flush)
+    return semantic_cache
 
-def format_code_block(content):
-    formatted = content
-    if "```" in content:
-        parts = content.split("```")
-        for i in range(1, len(parts), 2):
-            if i < len(parts):
-                code_lines = parts[i].strip().split("\n")
-                if code_lines[0] and not code_lines[0].startswith(" "):
-                    lang = code_lines[0]
-                    code = "\n".join(code_lines[1:])
-                    parts[i] = f"{lang}\n{code}"
-                parts[i] = f'<div class="code-block">\n```{parts[i]}```\n</div>'
-        formatted = "".join(parts)
+def load_langchain_core():
+    with timed_import("langchain_core", deferred=True):
+        from langchain_core.messages import SystemMessage, HumanMessage
+        from langchain_core.output_parsers import StrOutputParser
+        from langchain_core.prompts import ChatPromptTemplate
     
-    return formatted
-
-def generate_thinking_process(query):
-    thinking_steps = [
-        "Analyzing the problem...",
-        f"Considering best practices for {st.session_state.language}...",
-        "Evaluating potential solutions...",
-        "Checking for edge cases...",
-        "Optimizing for readability and performance...",
-        "Formulating explanation and examples..."
+    return SystemMessage, HumanMessage, StrOutputParser, ChatPromptTemplate
+
+def get_system_prompt():
+    SystemMessage = load_langchain_core()[0]
+    return SystemMessage(content=local_system_prompt(st.session_state.language))
+
+def routed_response(prompt_chain):
+    llm_engines = get_llm_engines(selected_model, temperature)
+    respond = stream_ai_response if st.session_state.streaming_enabled else generate_ai_response
+    return get_ollama_pool().stream(selected_model, lambda base_url: respond(prompt_chain, llm_engines[base_url]))
+
+def admission_gate():
+    session_id = st.session_state.session_id
+    return lambda handle: ollama_admission.admit(session_id, handle)
+
+def queue_status(admission_state):
+    ticket = admission_state.get("ticket")
+    return ollama_admission.status(ticket) if ticket is not None else None
+
+def summarize_evicted_turns(model_name, llm_engines, previous_summary, messages):
+    SystemMessage, HumanMessage = load_langchain_core()[:2]
+    transcript = extractive_summary(previous_summary, messages, max_line_chars=600)
+    summary_request = [
+        SystemMessage(content="Summarize this earlier part of a coding conversation in under 150 words. "
+                              "Keep names, errors, decisions and code identifiers."),
+        HumanMessage(content=transcript)
     ]
+    response = ollama_admission.run(
+        "context-summary",
+        ollama_pool.call,
+        model_name,
+        lambda base_url: llm_engines[base_url].invoke(summary_request)
+    )
+    _, summary = split_thinking(response.content)
+    return summary or transcript
+
+def build_prompt_chain(current_query=None, references=""):
+    SystemMessage, HumanMessage, _, ChatPromptTemplate = load_langchain_core()
+    system_prompt = get_system_prompt()
+    prompt_sequence = [system_prompt]
+    if references:
+        prompt_sequence.append(SystemMessage(content=references))
+    
+    model_name, llm_engines = selected_model, get_llm_engines(selected_model, temperature)
+    st.session_state.conversation_context.summarizer = lambda previous_summary, messages: summarize_evicted_turns(
+        model_name, llm_engines, previous_summary, messages
+    )
+    summary, history = st.session_state.conversation_context.fit(
+        st.session_state.message_log,
+        count_tokens(system_prompt.content) + count_tokens(references) + (count_tokens(current_query) if current_query else 0)
+    )
+    if summary:
+        prompt_sequence.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
     
-    thinking_container = st.empty()
-    
-    for step in thinking_steps:
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        thinking_container.markdown(f"""
-        <div class="thinking-container">
-            <span>💭 {step}</span>
-            <div class="time-stamp">⏱️ {timestamp}</div>
-        </div>
-        """, unsafe_allow_html=True)
-        time.sleep(0.5 + (hash(step) % 7) / 10)
+    prompt_sequence.extend(st.session_state.prompt_history.tail(st.session_state.message_log, len(history)))
     
-    return thinking_container
+    if current_query:
+        prompt_sequence.append(HumanMessage(content=current_query))
+        
+    return ChatPromptTemplate.from_messages(prompt_sequence)
 
-def generate_ai_response(prompt_chain):
-    processing_pipeline = prompt_chain | llm_engine | StrOutputParser()
-    return processing_pipeline.invoke({})
+def start_generation(query):
+    trace = Trace(selected_model, "ollama")
+    with trace.span("retrieval"):
+        references = retrieve_references(query, st.session_state.conversation_context.prompt_budget())
+    with trace.span("prompt_build"):
+        prompt_chain = build_prompt_chain(references=format_references(references))
+    
+    response_cache = get_response_cache()
+    cache_eligible = st.session_state.cache_enabled and is_cache_eligible(temperature, st.session_state.cache_any_temperature)
+    cache_key = make_cache_key(
+        selected_model,
+        temperature,
+        st.session_state.language,
+        [(message.type, message.content) for message in prompt_chain.messages]
+    )
+    with trace.span("cache_lookup"):
+        cached_response = response_cache.get(cache_key) if cache_eligible else None
+        cache_source = "exact" if cached_response is not None else None
+        similarity = None
+        
+        semantic_cache = get_semantic_cache()
+        semantic_scope = SemanticCache.scope_id(selected_model, st.session_state.language, round(float(temperature), 2))
+        semantic_eligible = (
+            cache_eligible
+            and st.session_state.semantic_cache_enabled
+            and st.session_state.history_offset == 0
+            and not references
+            and sum(1 for msg in st.session_state.message_log if msg["role"] == "user") == 1
+        )
+        if cached_response is None and semantic_eligible:
+            semantic_match = semantic_cache.lookup(query, semantic_scope, semantic_threshold)
+            if semantic_match is not None:
+                cached_response, similarity = semantic_match
+                cache_source = "semantic"
+    
+    if cached_response is not None:
+        handle = GenerationHandle(replay_stream(cached_response))
+        handle.state = {}
+    else:
+        handle = single_flight.subscribe(
+            cache_key,
+            lambda: routed_response(prompt_chain),
+            state={},
+            gate=admission_gate()
+        )
+    
+    st.session_state.active_generation = {
+        "trace": trace,
+        "handle": handle,
+        "shared": not getattr(handle, "leader", True),
+        "query": query,
+        "progressive": st.session_state.streaming_enabled,
+        "cache_eligible": cache_eligible,
+        "cache_key": cache_key,
+        "cache_source": cache_source,
+        "similarity": similarity,
+        "references": len(references),
+        "semantic_eligible": semantic_eligible,
+        "semantic_scope": semantic_scope
+    }
+    return st.session_state.active_generation
 
-def build_prompt_chain(current_query=None):
-    prompt_sequence = [get_system_prompt()]
+def finish_generation(active_generation):
+    handle = active_generation["handle"]
+    handle.wait(timeout=1.0)
+    raw_response = handle.text()
+    _, ai_response = split_thinking(raw_response)
+    
+    completed = handle.done and not handle.cancelled and handle.error is None and handle.claim_finalization()
+    if completed and ai_response and active_generation["cache_eligible"] and active_generation["cache_source"] is None:
+        get_response_cache().put(active_generation["cache_key"], raw_response)
+        if active_generation["semantic_eligible"]:
+            get_semantic_cache().add(active_generation["query"], raw_response, active_generation["semantic_scope"])
+    
+    trace = active_generation["trace"]
+    ticket = (handle.state or {}).get("ticket")
+    if ticket is not None and ticket.granted:
+        trace.add_span("queue_wait", ticket.enqueued_at, ticket.granted_at)
+    trace.add_generation_spans(handle)
+    trace.finish(
+        status="error" if handle.error is not None else "cancelled" if handle.cancelled else "ok",
+        cache_source=active_generation["cache_source"],
+        shared=active_generation["shared"],
+        response_chars=len(raw_response)
+    )
+    get_trace_recorder().record(trace)
     
-    for msg in st.session_state.message_log:
-        if msg["role"] == "user":
-            prompt_sequence.append(HumanMessagePromptTemplate.from_template(msg["content"]))
-        elif msg["role"] == "ai":
-            prompt_sequence.append(AIMessagePromptTemplate.from_template(msg["content"]))
+    if ai_response:
+        st.session_state.message_log.append(MessageRecord("ai", ai_response, trace.breakdown()))
+        persist_history(CONVERSATION_APP)
+    st.session_state.active_generation = None
+    return ai_response
+
+def render_active_generation(active_generation):
+    handle = active_generation["handle"]
     
-    if current_query:
-        prompt_sequence.append(HumanMessagePromptTemplate.from_template(current_query))
+    thinking_placeholder = None
+    if st.session_state.thinking_visible:
+        thinking_placeholder = st.empty()
+        render_thinking(thinking_placeholder, "")
+    
+    with st.chat_message("ai"):
+        stop_placeholder = st.empty()
+        if not handle.cancelled:
+            render_stop_button(stop_placeholder)
         
-    return ChatPromptTemplate.from_messages(prompt_sequence)
+        render_timing = {}
+        render_streamed_response(
+            handle.iter_chunks(),
+            thinking_placeholder,
+            active_generation["progressive"],
+            status=lambda: queue_status(handle.state),
+            timing=render_timing
+        )
+        active_generation["trace"].add_span(
+            "render",
+            render_timing["started"],
+            render_timing["started"] + render_timing["render_seconds"]
+        )
+        stop_placeholder.empty()
+        ai_response = finish_generation(active_generation)
+        
+        if handle.error is not None:
+            st.error(f"Generation failed: {str(handle.error)}")
+        if handle.cancelled:
+            st.caption("⏹ Generation stopped")
+        status_label = cache_status_label(
+            active_generation["cache_eligible"],
+            active_generation["cache_source"],
+            active_generation["similarity"]
+        )
+        if active_generation["shared"]:
+            status_label += " · 🔗 shared in-flight request"
+        if active_generation["references"]:
+            status_label += f" · 📎 {active_generation['references']} excerpts"
+        render_timestamp(status_label)
+        if ai_response:
+            render_timings(st.session_state.message_log[-1]["timings"])
 
 st.markdown("""
     <div class='header-container'>
@@ -337,11 +446,18 @@ st.markdown("""
 chat_container = st.container()
 
 with chat_container:
-    for message in st.session_state.message_log:
+    first_visible, hidden_messages = history_window()
+    
+    if hidden_messages:
+        if st.button(f"⬆️ Load earlier messages ({hidden_messages} hidden)"):
+            show_more_history()
+            st.rerun()
+    
+    for message in st.session_state.message_log[first_visible:]:
         timestamp = datetime.now().strftime("%H:%M:%S")
         with st.chat_message(message["role"]):
             if message["role"] == "ai":
-                formatted_message = format_code_block(message["content"])
+                formatted_message = render_message(message["content"])
                 st.markdown(formatted_message, unsafe_allow_html=True)
             else:
                 st.markdown(message["content"])
@@ -349,35 +465,46 @@ with chat_container:
             st.markdown(f"""
             <div class="time-stamp">⏱️ {timestamp}</div>
             """, unsafe_allow_html=True)
+            render_timings(message.get("timings"))
 
 user_query = st.chat_input("Ask me about code, debugging, documentation, or algorithms...")
 
+mark_first_render()
+
+with st.sidebar:
+    render_conversation_list(CONVERSATION_APP, GREETING)
+    render_document_panel()
+    render_repository_panel()
+    render_memory_report()
+    with st.expander("⏱️ Startup timing"):
+        st.json(startup_report())
+    with st.expander("🚦 Ollama queue"):
+        st.json(ollama_admission.stats())
+    with st.expander("🖧 Ollama hosts"):
+        st.json(get_ollama_pool().stats())
+    render_latency_panel(get_trace_recorder(), selected_model)
+
+active_generation = st.session_state.active_generation
+
 if user_query:
+    if active_generation is not None:
+        active_generation["handle"].cancel()
+        partial_response = finish_generation(active_generation)
+        if partial_response:
+            with st.chat_message("ai"):
+                st.markdown(render_message(partial_response), unsafe_allow_html=True)
+                st.caption("⏹ Generation stopped")
+    
     with st.chat_message("user"):
         st.markdown(user_query)
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        st.markdown(f"""
-        <div class="time-stamp">⏱️ {timestamp}</div>
-        """, unsafe_allow_html=True)
-    
-    st.session_state.message_log.append({"role": "user", "content": user_query})
-    
-    if st.session_state.thinking_visible:
-        thinking_placeholder = generate_thinking_process(user_query)
-    
-    with st.spinner("🧠 Processing..."):
-        prompt_chain = build_prompt_chain()
-        ai_response = generate_ai_response(prompt_chain)
-    
-    if st.session_state.thinking_visible:
-        thinking_placeholder.empty()
-    
-    with st.chat_message("ai"):
-        formatted_response = format_code_block(ai_response)
-        st.markdown(formatted_response, unsafe_allow_html=True)
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        st.markdown(f"""
-        <div class="time-stamp">⏱️ {timestamp}</div>
-        """, unsafe_allow_html=True)
-    
-    st.session_state.message_log.append({"role": "ai", "content": ai_response})
\ No newline at end of file
+        render_timestamp()
+    
+    st.session_state.message_log.append(MessageRecord("user", user_query))
+    persist_history(CONVERSATION_APP)
+    try:
+        active_generation = start_generation(user_query)
+    except ContextOverflow as e:
+        st.error(str(e))
+
+if active_generation is not None:
+    render_active_generation(active_generation)
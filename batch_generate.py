@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from dotenv import load_dotenv
+
+from generation import Generator
+from ollama_pool import ollama_pool
+
+BACKENDS = ["ollama", "huggingface"]
+
+
+def read_prompts(path):
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"id": str(line_number), "error": f"Invalid JSON on line {line_number}: {e}"}
+                continue
+            if isinstance(request, str):
+                request = {"prompt": request}
+            request.setdefault("id", str(line_number))
+            request["id"] = str(request["id"])
+            yield request
+
+
+def completed_ids(path, retry_errors=False):
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if retry_errors and record.get("status") == "error":
+                continue
+            done.add(str(record.get("id")))
+    return done
+
+
+def run_request(generator, request, defaults):
+    if "error" in request:
+        return {"id": request["id"], "status": "error", "error": request["error"]}
+    if not request.get("prompt"):
+        return {"id": request["id"], "status": "error", "error": "Missing prompt"}
+
+    started = time.monotonic()
+    try:
+        result = generator.generate(
+            request["prompt"],
+            backend=request.get("backend", defaults.backend),
+            model=request.get("model", defaults.model),
+            language=request.get("language", defaults.language),
+            temperature=float(request.get("temperature", defaults.temperature)),
+            history=request.get("history", ())
+        )
+    except Exception as e:
+        return {
+            "id": request["id"],
+            "status": "error",
+            "error": f"{type(e).__name__}: {e}",
+            "elapsed_s": round(time.monotonic() - started, 3)
+        }
+    return dict(result, id=request["id"])
+
+
+def terminate_partial_line(path):
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def run_batch(args):
+    skip = set() if args.no_resume else completed_ids(args.output, args.retry_errors)
+    if not args.no_resume:
+        terminate_partial_line(args.output)
+    generator = Generator()
+    ollama_pool.start()
+
+    counts = {"ok": 0, "fallback": 0, "error": 0, "skipped": 0}
+    started = time.monotonic()
+    pending = set()
+    mode = "w" if args.no_resume else "a"
+
+    with open(args.output, mode, encoding="utf-8") as out, ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        def drain(return_when):
+            nonlocal pending
+            finished, pending = wait(pending, return_when=return_when)
+            for future in finished:
+                record = future.result()
+                counts[record["status"]] = counts.get(record["status"], 0) + 1
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                if not args.quiet:
+                    done = sum(counts.values()) - counts["skipped"]
+                    rate = done / max(time.monotonic() - started, 1e-9)
+                    print(f"[{done}] {record['id']} {record['status']} ({rate:.2f}/s)", file=sys.stderr, flush=True)
+
+        try:
+            for request in read_prompts(args.input):
+                if request["id"] in skip:
+                    counts["skipped"] += 1
+                    continue
+                while len(pending) >= args.concurrency * 2:
+                    drain(FIRST_COMPLETED)
+                pending.add(executor.submit(run_request, generator, request, args))
+            while pending:
+                drain(FIRST_COMPLETED)
+        except KeyboardInterrupt:
+            for future in pending:
+                future.cancel()
+            print("interrupted; rerun the same command to resume", file=sys.stderr)
+        finally:
+            ollama_pool.stop()
+
+    counts["elapsed_s"] = round(time.monotonic() - started, 1)
+    return counts
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Run a JSONL file of prompts through the Ollama or Hugging Face backend")
+    parser.add_argument("input", help="JSONL file with one request per line: "
+                                      '{"id", "prompt", "language", "model", "temperature", "backend", "history"}')
+    parser.add_argument("output", help="JSONL file that results are appended to in completion order")
+    parser.add_argument("--backend", choices=BACKENDS, default="ollama", help="backend for lines without one")
+    parser.add_argument("--model", default=None, help="model for lines without one")
+    parser.add_argument("--language", default="Python", help="language for lines without one")
+    parser.add_argument("--temperature", type=float, default=0.3, help="temperature for lines without one")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight at once")
+    parser.add_argument("--no-resume", action="store_true", help="overwrite the output instead of skipping finished ids")
+    parser.add_argument("--retry-errors", action="store_true", help="rerun ids whose previous result was an error")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    print(json.dumps(run_batch(args)))
+
+
+if __name__ == "__main__":
+    main()
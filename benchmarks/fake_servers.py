@@ -0,0 +1,199 @@
+import json
+import random
+import select
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPONSE_WORDS = (
+    "<think> The user wants a fix for the recursion . Check the base case first . </think> "
+    "The function never stops because there is no base case . Here is a corrected version : "
+    "```python\ndef factorial ( n ) :\n    if n <= 1 :\n        return 1\n    return n * factorial ( n - 1 )\n``` "
+    "Call it with small values first and print intermediate results while debugging ."
+).split(" ")
+
+
+class FakeConfig:
+    def __init__(self, token_rate=50.0, first_token_delay=0.2, tokens=200, error_rate=0.0, error_status=500, seed=0, prefill_delay=0.0):
+        self.token_rate = token_rate
+        self.first_token_delay = first_token_delay
+        self.tokens = tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.prefill_delay = prefill_delay
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.disconnects = 0
+
+    def should_fail(self):
+        with self.lock:
+            self.requests += 1
+            failed = self.random.random() < self.error_rate
+            self.errors += failed
+            return failed
+
+    def tokens_for_response(self):
+        return [RESPONSE_WORDS[index % len(RESPONSE_WORDS)] + " " for index in range(self.tokens)]
+
+    def pace(self, index):
+        if index == 0:
+            time.sleep(self.first_token_delay)
+        elif self.token_rate > 0:
+            time.sleep(1.0 / self.token_rate)
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_response(self):
+        self.send_response(self.config.error_status)
+        body = json.dumps({"error": "injected failure"}).encode("utf-8")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.config.error_status in (429, 503):
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def wait_for_prefill(self):
+        deadline = time.monotonic() + self.config.prefill_delay
+        while time.monotonic() < deadline:
+            readable, _, _ = select.select([self.connection], [], [], min(0.05, max(deadline - time.monotonic(), 0)))
+            if readable and not self.connection.recv(1, socket.MSG_PEEK):
+                with self.config.lock:
+                    self.config.disconnects += 1
+                return False
+        return True
+
+    def start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class FakeOllamaHandler(FakeHandler):
+    def do_GET(self):
+        self.send_json({"models": [{"name": model, "model": model} for model in self.server.loaded_models]})
+
+    def do_POST(self):
+        request = self.read_json()
+        model = request.get("model", "")
+        if self.path == "/api/generate" and not request.get("prompt"):
+            self.server.loaded_models.add(model)
+            self.send_json({"model": model, "response": "", "done": True})
+            return
+        if self.config.should_fail():
+            self.send_error_response()
+            return
+
+        tokens = self.config.tokens_for_response()
+        if not request.get("stream", True):
+            for index in range(len(tokens)):
+                self.config.pace(index)
+            self.send_json(self.chat_message(model, "".join(tokens), done=True))
+            return
+
+        if not self.wait_for_prefill():
+            return
+        self.start_chunked("application/x-ndjson")
+        for index, token in enumerate(tokens):
+            self.config.pace(index)
+            self.write_chunk((json.dumps(self.chat_message(model, token, done=False)) + "\n").encode("utf-8"))
+        self.write_chunk((json.dumps(self.chat_message(model, "", done=True)) + "\n").encode("utf-8"))
+        self.end_chunked()
+
+    @staticmethod
+    def chat_message(model, content, done):
+        message = {
+            "model": model,
+            "created_at": "2024-01-01T00:00:00Z",
+            "message": {"role": "assistant", "content": content},
+            "done": done
+        }
+        if done:
+            message.update({"done_reason": "stop", "total_duration": 1, "load_duration": 1, "prompt_eval_count": 1,
+                            "prompt_eval_duration": 1, "eval_count": 1, "eval_duration": 1})
+        return message
+
+
+class FakeTextGenerationHandler(FakeHandler):
+    def do_POST(self):
+        request = self.read_json()
+        if self.config.should_fail():
+            self.send_error_response()
+            return
+
+        tokens = self.config.tokens_for_response()
+        if not request.get("stream"):
+            for index in range(len(tokens)):
+                self.config.pace(index)
+            self.send_json([{"generated_text": "".join(tokens)}])
+            return
+
+        if not self.wait_for_prefill():
+            return
+        self.start_chunked("text/event-stream")
+        for index, token in enumerate(tokens):
+            self.config.pace(index)
+            last = index == len(tokens) - 1
+            payload = {
+                "index": index,
+                "token": {"id": index, "text": token, "logprob": 0.0, "special": False},
+                "generated_text": "".join(tokens) if last else None,
+                "details": None
+            }
+            self.write_chunk(f"data:{json.dumps(payload)}\n\n".encode("utf-8"))
+        self.end_chunked()
+
+
+def start_server(handler, config, host="127.0.0.1", port=0):
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.config = config
+    server.loaded_models = set()
+    threading.Thread(target=server.serve_forever, name=f"fake-{handler.__name__}", daemon=True).start()
+    return server
+
+
+def server_url(server):
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def start_fake_ollama(config, host="127.0.0.1", port=0):
+    return start_server(FakeOllamaHandler, config, host, port)
+
+
+def start_fake_text_generation(config, host="127.0.0.1", port=0):
+    return start_server(FakeTextGenerationHandler, config, host, port)
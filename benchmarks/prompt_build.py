@@ -0,0 +1,94 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import SystemMessage
+from langchain_core.prompts import (
+    AIMessagePromptTemplate,
+    ChatPromptTemplate,
+    HumanMessagePromptTemplate,
+    SystemMessagePromptTemplate
+)
+
+from prompt_builder import PromptHistory
+
+SYSTEM_PROMPT = "You are DeepSeek, an expert AI coding assistant specialized in Python."
+USER_TURN = "Why does my recursive factorial overflow the stack when n is large? " * 3
+AI_TURN = "The recursion never reaches a base case. Add `if n <= 1: return 1` before recursing.\n" * 12
+
+
+def make_message_log(turns):
+    message_log = []
+    for _ in range(turns):
+        message_log.append({"role": "user", "content": USER_TURN})
+        message_log.append({"role": "ai", "content": AI_TURN})
+    return message_log
+
+
+def build_with_templates(message_log):
+    prompt_sequence = [SystemMessagePromptTemplate.from_template(SYSTEM_PROMPT)]
+    for msg in message_log:
+        if msg["role"] == "user":
+            prompt_sequence.append(HumanMessagePromptTemplate.from_template(msg["content"]))
+        elif msg["role"] == "ai":
+            prompt_sequence.append(AIMessagePromptTemplate.from_template(msg["content"]))
+    return ChatPromptTemplate.from_messages(prompt_sequence)
+
+
+def build_incremental(prompt_history, message_log):
+    prompt_sequence = [SystemMessage(content=SYSTEM_PROMPT)]
+    prompt_sequence.extend(prompt_history.tail(message_log, len(message_log)))
+    return ChatPromptTemplate.from_messages(prompt_sequence)
+
+
+def time_call(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(lengths, repeat):
+    results = []
+    for turns in lengths:
+        message_log = make_message_log(turns)
+        template_seconds = time_call(lambda: build_with_templates(message_log), repeat)
+
+        prompt_history = PromptHistory()
+        prompt_history.sync(message_log[:-2])
+
+        def next_turn():
+            del prompt_history.sources[len(message_log) - 2:]
+            del prompt_history.messages[len(message_log) - 2:]
+            build_incremental(prompt_history, message_log)
+
+        incremental_seconds = time_call(next_turn, repeat)
+        results.append({
+            "turns": turns,
+            "messages": len(message_log),
+            "template_ms": template_seconds * 1000,
+            "incremental_ms": incremental_seconds * 1000,
+            "speedup": template_seconds / incremental_seconds if incremental_seconds else float("inf")
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt build time vs. history length")
+    parser.add_argument("--lengths", type=int, nargs="+", default=[5, 25, 50, 100, 200])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'turns':>6} {'messages':>9} {'templates (ms)':>15} {'incremental (ms)':>17} {'speedup':>8}")
+    for row in run(args.lengths, args.repeat):
+        print(f"{row['turns']:>6} {row['messages']:>9} {row['template_ms']:>15.2f} "
+              f"{row['incremental_ms']:>17.2f} {row['speedup']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
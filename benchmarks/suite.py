@@ -0,0 +1,494 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_servers import FakeConfig, server_url, start_fake_ollama, start_fake_text_generation
+
+SCENARIOS = ["ollama_stream", "hf_stream", "prompt_build", "format_code_block", "rerun_render", "pool_failover", "semantic_precision",
+             "cancel_prefill", "admission_fairness", "reopen_summary_gap"]
+BENCHMARK_PROMPT = "Debug this recursive function that's causing a stack overflow: def factorial(n): return n * factorial(n-1)"
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(values, scale=1.0, digits=2):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values) * scale, digits),
+        "p50": round(percentile(values, 0.5) * scale, digits),
+        "p95": round(percentile(values, 0.95) * scale, digits),
+        "max": round(max(values) * scale, digits)
+    }
+
+
+def measure_stream(open_stream, repeat):
+    first_token, totals, rates, errors = [], [], [], []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        first = None
+        tokens = 0
+        try:
+            for chunk in open_stream():
+                if not chunk:
+                    continue
+                if first is None:
+                    first = time.perf_counter() - started
+                tokens += 1
+        except Exception as e:
+            errors.append(type(e).__name__)
+            continue
+        total = time.perf_counter() - started
+        first_token.append(first if first is not None else total)
+        totals.append(total)
+        streaming_seconds = total - (first or 0)
+        if tokens > 1 and streaming_seconds > 0:
+            rates.append((tokens - 1) / streaming_seconds)
+
+    return {
+        "ttft_ms": summarize(first_token, 1000),
+        "total_ms": summarize(totals, 1000),
+        "tokens_per_second": summarize(rates),
+        "errors": len(errors),
+        "error_types": sorted(set(errors))
+    }
+
+
+def run_ollama_stream(args):
+    from langchain_core.messages import HumanMessage
+    from langchain_ollama import ChatOllama
+
+    config = FakeConfig(args.token_rate, args.first_token_delay, args.tokens, args.error_rate, args.error_status)
+    server = start_fake_ollama(config)
+    try:
+        engine = ChatOllama(model="deepseek-r1:1.5b", base_url=server_url(server), temperature=0.3)
+        result = measure_stream(lambda: (chunk.content for chunk in engine.stream([HumanMessage(content=BENCHMARK_PROMPT)])), args.repeat)
+    finally:
+        server.shutdown()
+        server.server_close()
+    result["server_requests"] = config.requests
+    return result
+
+
+def run_hf_stream(args):
+    from huggingface_hub import InferenceClient
+
+    config = FakeConfig(args.token_rate, args.first_token_delay, args.tokens, args.error_rate, args.error_status)
+    server = start_fake_text_generation(config)
+    try:
+        client = InferenceClient(model=server_url(server))
+        result = measure_stream(lambda: client.text_generation(
+            prompt=f"User: {BENCHMARK_PROMPT}\n\nAssistant:",
+            max_new_tokens=512,
+            temperature=0.3,
+            do_sample=True,
+            stream=True
+        ), args.repeat)
+    finally:
+        server.shutdown()
+        server.server_close()
+    result["server_requests"] = config.requests
+    return result
+
+
+def run_prompt_build(args):
+    import prompt_build
+
+    return prompt_build.run(args.history_lengths, args.repeat)
+
+
+def make_response(size):
+    paragraph = "The recursion never reaches a base case, so every call pushes a new frame.\n\n"
+    code = "```python\ndef factorial(n):\n    if n <= 1:\n        return 1\n    return n * factorial(n - 1)\n```\n\n"
+    block = paragraph + code
+    return (block * (size // len(block) + 1))[:size]
+
+
+def run_format_code_block(args):
+    from rendering import CodeFenceFormatter, format_code_block
+
+    results = []
+    for size in args.response_sizes:
+        response = make_response(size)
+        one_shot = []
+        streamed = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            format_code_block(response)
+            one_shot.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            formatter = CodeFenceFormatter()
+            for start in range(0, len(response), 16):
+                formatter.feed(response[start:start + 16])
+                formatter.preview()
+            formatter.close()
+            streamed.append(time.perf_counter() - started)
+
+        results.append({
+            "bytes": size,
+            "format_ms": summarize(one_shot, 1000, 3),
+            "streamed_ms": summarize(streamed, 1000, 3),
+            "format_mb_per_second": round(size / min(one_shot) / 1e6, 2)
+        })
+    return results
+
+
+def make_history(turns):
+    message_log = [{"role": "ai", "content": "Hi! I'm DeepSeek. How can I help you code today? 💻"}]
+    for turn in range(turns):
+        message_log.append({"role": "user", "content": f"Question {turn}: {BENCHMARK_PROMPT}"})
+        message_log.append({"role": "ai", "content": make_response(1500)})
+    return message_log
+
+
+def run_rerun_render(args):
+    config = FakeConfig(args.token_rate, args.first_token_delay, args.tokens)
+    server = start_fake_ollama(config)
+    work_dir = tempfile.mkdtemp(prefix="rerun-render-")
+    os.environ.setdefault("OLLAMA_HOSTS", server_url(server))
+    os.environ.setdefault("RESPONSE_CACHE_PATH", os.path.join(work_dir, "responses.sqlite3"))
+    os.environ.setdefault("SEMANTIC_CACHE_PATH", os.path.join(work_dir, "semantic"))
+
+    from streamlit.testing.v1 import AppTest
+    from rendering import HISTORY_PAGE_SIZE
+
+    results = []
+    try:
+        for turns in args.history_lengths:
+            message_log = make_history(turns)
+            for label, pages in (("paged", 1), ("full", len(message_log) // HISTORY_PAGE_SIZE + 1)):
+                app = AppTest.from_file(os.path.join(REPO_ROOT, "app_local.py"), default_timeout=120)
+                app.session_state["message_log"] = message_log
+                app.session_state["history_pages"] = pages
+                app.run()
+                timings = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    app.run()
+                    timings.append(time.perf_counter() - started)
+                results.append({
+                    "turns": turns,
+                    "messages": len(message_log),
+                    "mode": label,
+                    "rerun_ms": summarize(timings, 1000)
+                })
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def route_requests(pool, requests):
+    from concurrent.futures import ThreadPoolExecutor
+    from urllib.request import Request, urlopen
+
+    routed = []
+    errors = []
+
+    def send(url):
+        body = json.dumps({"model": "deepseek-r1:1.5b", "messages": [], "stream": False}).encode("utf-8")
+        with urlopen(Request(url + "/api/chat", data=body, headers={"Content-Type": "application/json"}), timeout=30) as response:
+            response.read()
+        return url
+
+    def route(_):
+        try:
+            url = pool.call("deepseek-r1:1.5b", send)
+        except Exception as e:
+            errors.append(type(e).__name__)
+            return
+        routed.append(url)
+
+    with ThreadPoolExecutor(max_workers=len(pool.hosts) * 2) as executor:
+        list(executor.map(route, range(requests)))
+    return {"routed": {url: routed.count(url) for url in pool.urls if url in routed}, "errors": len(errors)}
+
+
+def run_pool_failover(args):
+    from ollama_pool import OllamaPool
+
+    config = FakeConfig(args.token_rate, args.first_token_delay, min(args.tokens, 20))
+    servers = [start_fake_ollama(config) for _ in range(2)]
+    urls = [server_url(server) for server in servers]
+    pool = OllamaPool(urls, probe_timeout=0.5)
+    requests = args.repeat * 4
+    try:
+        pool.probe_all()
+        before = route_requests(pool, requests)
+
+        down = servers.pop()
+        down.shutdown()
+        down.server_close()
+        during = route_requests(pool, requests)
+        probes = 0
+        while pool.hosts[1].healthy and probes < 10:
+            pool.probe(pool.hosts[1])
+            probes += 1
+        removed = route_requests(pool, requests)
+
+        host, port = down.server_address[:2]
+        servers.append(start_fake_ollama(config, host, port))
+        pool.probe_all()
+        after = route_requests(pool, requests)
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+    return {
+        "hosts": urls,
+        "before": before,
+        "during_outage": during,
+        "after_removal": removed,
+        "after_restart": after,
+        "probes_to_remove": probes,
+        "failovers": pool.failovers,
+        "removed": urls[1] not in removed["routed"] and removed["errors"] == 0,
+        "readmitted": pool.hosts[1].healthy and urls[1] in after["routed"]
+    }
+
+
+OPPOSITE_PROMPTS = [
+    ("How do I sort a list in ascending order?", "How do I sort a list in descending order?"),
+    ("Implement quicksort in Python", "Implement mergesort in Python"),
+    ("How do I convert a str to an int?", "How do I convert an int to a str?"),
+    ("What is the difference between a list and a tuple?", "What is the difference between a list and a set?")
+]
+EQUIVALENT_PROMPTS = [
+    ("How do I reverse a string in Python?", "how can I reverse a string in python"),
+    ("Explain Python decorators", "Please explain python decorators.")
+]
+
+
+def run_semantic_precision(args):
+    from semantic_cache import SemanticCache
+
+    results = {"threshold": 0.8, "opposite": [], "equivalent": []}
+    for label, pairs in (("opposite", OPPOSITE_PROMPTS), ("equivalent", EQUIVALENT_PROMPTS)):
+        for cached_prompt, query in pairs:
+            semantic_cache = SemanticCache(tempfile.mkdtemp(prefix="semantic-precision-"))
+            semantic_cache.add(cached_prompt, "cached answer", scope=0)
+            vectors = semantic_cache.embedder.embed([cached_prompt, query])
+            results[label].append({
+                "cached": cached_prompt,
+                "query": query,
+                "similarity": round(float(vectors[0] @ vectors[1]), 3),
+                "hit": semantic_cache.lookup(query, 0, results["threshold"]) is not None
+            })
+
+    results["false_hits"] = sum(result["hit"] for result in results["opposite"])
+    results["missed_equivalents"] = sum(not result["hit"] for result in results["equivalent"])
+    if results["false_hits"]:
+        raise AssertionError(f"semantic cache answered {results['false_hits']} opposite-meaning prompts")
+    return results
+
+
+def cancel_during_prefill(start_server, open_stream, prefill_delay=10.0):
+    from generation_worker import GenerationHandle
+
+    config = FakeConfig(prefill_delay=prefill_delay)
+    server = start_server(config)
+    try:
+        handle = GenerationHandle(lambda: open_stream(server_url(server)))
+        while not config.requests and not handle.done:
+            time.sleep(0.01)
+        cancelled_at = time.perf_counter()
+        handle.cancel()
+        stopped = handle.wait(prefill_delay / 2)
+        stopped_ms = (time.perf_counter() - cancelled_at) * 1000
+        while not config.disconnects and time.perf_counter() - cancelled_at < prefill_delay / 2:
+            time.sleep(0.01)
+        closed_ms = (time.perf_counter() - cancelled_at) * 1000
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    if not stopped or not config.disconnects:
+        raise AssertionError("cancel() during prefill left the upstream request open")
+    return {
+        "handle_stopped_ms": round(stopped_ms, 1),
+        "upstream_closed_ms": round(closed_ms, 1),
+        "handle_error": repr(handle.error) if handle.error else None,
+        "chunks": len(handle.chunks)
+    }
+
+
+def run_cancel_prefill(args):
+    from langchain_core.messages import HumanMessage
+    from generation import make_hf_client, make_ollama_engine, stream_hf_tokens
+    from model_router import hf_router
+
+    def ollama_stream(url):
+        engine = make_ollama_engine("deepseek-r1:1.5b", 0.3, url)
+        return (chunk.content for chunk in engine.stream([HumanMessage(content=BENCHMARK_PROMPT)]))
+
+    def hf_stream(url):
+        client = make_hf_client()
+        return hf_router.hedged_stream(lambda model_id: stream_hf_tokens(client, f"User: {BENCHMARK_PROMPT}\n\nAssistant:", model_id, 0.3), url, deadline=0)
+
+    return {
+        "ollama": cancel_during_prefill(start_fake_ollama, ollama_stream),
+        "hf": cancel_during_prefill(start_fake_text_generation, hf_stream)
+    }
+
+
+def run_admission_fairness(args):
+    from concurrent.futures import ThreadPoolExecutor
+    from admission import AdmissionController, QueueTimeout
+    from generation_worker import GenerationHandle
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    served = []
+
+    def submit(controller, session_id, name):
+        def chunks():
+            served.append(name)
+            time.sleep(0.05)
+            yield name
+        return GenerationHandle(chunks, executor, state={}, gate=lambda handle: controller.admit(session_id, handle))
+
+    controller = AdmissionController(max_parallel=1, queue_timeout=30)
+    handles = [submit(controller, session_id, f"{session_id}{index}") for index, session_id in enumerate("AAAB", 1)]
+    positions = [controller.position(handle.state["ticket"]) for handle in handles]
+    withdrawn = submit(controller, "C", "C5")
+    withdrawn.cancel()
+    withdrawn_ticket = withdrawn.state["ticket"]
+    for handle in handles:
+        handle.wait(10)
+
+    expiring = AdmissionController(max_parallel=1, queue_timeout=0.2)
+    blocker = expiring.enqueue("A")
+    timed_out = submit(expiring, "B", "B6")
+    timed_out.wait(5)
+    expiring.release(blocker)
+    executor.shutdown()
+
+    if served.index("B4") > served.index("A3"):
+        raise AssertionError(f"session B was served after A's third request: {served}")
+    if "C5" in served or withdrawn_ticket.granted or withdrawn_ticket in controller.waiting:
+        raise AssertionError("cancelled request kept its place in the queue")
+    if not isinstance(timed_out.error, QueueTimeout):
+        raise AssertionError(f"queued request did not time out: {timed_out.error!r}")
+    return {
+        "served": served,
+        "positions_at_submit": positions,
+        "withdrawn_released": withdrawn_ticket.released,
+        "timeout_error": str(timed_out.error),
+        "stats": controller.stats()
+    }
+
+
+def reopen_conversation_script(conversation_id, owner_id):
+    import streamlit as st
+    from chat_history import open_conversation
+    from context_window import ConversationContext
+
+    st.session_state.session_id = "reopen-summary-gap"
+    st.session_state.owner_id = owner_id
+    st.session_state.conversation_context = ConversationContext(context_length=32_768)
+    open_conversation(conversation_id, "Hi")
+    summary, history = st.session_state.conversation_context.fit(st.session_state.message_log)
+    st.session_state.prompt = {"summary": summary, "history": [message["content"] for message in history]}
+
+
+def run_reopen_summary_gap(args):
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["CONVERSATION_STORE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="summary-gap-"), "conversations.sqlite3")
+    from conversation_store import DEFAULT_STORE_PATH, ConversationStore
+    from rendering import HISTORY_PAGE_SIZE
+
+    owner_id = "0" * 32
+    turns = 3 * HISTORY_PAGE_SIZE
+    summarized_upto = 4
+    store = ConversationStore(DEFAULT_STORE_PATH)
+    conversation_id = store.create("local", owner_id, "summary gap")
+    store.append(conversation_id, 0, [
+        {"role": "user" if seq % 2 == 0 else "ai", "content": f"turn {seq}"} for seq in range(turns)
+    ])
+    store.save_summary(conversation_id, f"summary of turns 0-{summarized_upto - 1}", summarized_upto)
+
+    app = AppTest.from_function(reopen_conversation_script, args=(conversation_id, owner_id), default_timeout=30)
+    app.run()
+    if app.exception:
+        raise AssertionError(app.exception[0].message)
+    prompt = app.session_state["prompt"]
+    expected = [f"turn {seq}" for seq in range(summarized_upto, turns)]
+    if not prompt["summary"] or prompt["history"] != expected:
+        raise AssertionError(f"reopened context skips turns: history starts at {prompt['history'][:1]}")
+    return {
+        "turns": turns,
+        "page_size": HISTORY_PAGE_SIZE,
+        "summarized_upto": summarized_upto,
+        "history_offset": app.session_state["history_offset"],
+        "context_turns": len(prompt["history"])
+    }
+
+
+RUNNERS = {
+    "ollama_stream": run_ollama_stream,
+    "hf_stream": run_hf_stream,
+    "prompt_build": run_prompt_build,
+    "format_code_block": run_format_code_block,
+    "rerun_render": run_rerun_render,
+    "pool_failover": run_pool_failover,
+    "semantic_precision": run_semantic_precision,
+    "cancel_prefill": run_cancel_prefill,
+    "admission_fairness": run_admission_fairness,
+    "reopen_summary_gap": run_reopen_summary_gap
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite against fake Ollama and HF servers")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--token-rate", type=float, default=200.0, help="tokens per second sent by the fake servers")
+    parser.add_argument("--first-token-delay", type=float, default=0.1, help="seconds before the first token")
+    parser.add_argument("--tokens", type=int, default=200, help="tokens per fake response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status used for injected failures")
+    parser.add_argument("--history-lengths", type=int, nargs="+", default=[5, 25, 100])
+    parser.add_argument("--response-sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("scenarios", "output")},
+        "scenarios": {}
+    }
+    for name in args.scenarios:
+        print(f"running {name}...", flush=True)
+        started = time.perf_counter()
+        try:
+            report["scenarios"][name] = RUNNERS[name](args)
+        except Exception as e:
+            report["scenarios"][name] = {"error": f"{type(e).__name__}: {e}"}
+        print(f"  done in {time.perf_counter() - started:.1f}s", flush=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
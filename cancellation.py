@@ -0,0 +1,136 @@
+import socket
+import threading
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+class CancelScope:
+    def __init__(self, parent=None):
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.streams = set()
+        self.children = set()
+        if parent is not None:
+            parent.add_child(self)
+
+    def is_set(self):
+        return self.event.is_set()
+
+    def wait(self, timeout=None):
+        return self.event.wait(timeout)
+
+    def add_child(self, child):
+        with self.lock:
+            self.children.add(child)
+            cancelled = self.event.is_set()
+        if cancelled:
+            child.set()
+
+    def register(self, stream):
+        with self.lock:
+            self.streams.add(stream)
+            cancelled = self.event.is_set()
+        if cancelled:
+            stream.interrupt()
+
+    def unregister(self, stream):
+        with self.lock:
+            self.streams.discard(stream)
+
+    def set(self):
+        with self.lock:
+            self.event.set()
+            streams = list(self.streams)
+            children = list(self.children)
+        for stream in streams:
+            stream.interrupt()
+        for child in children:
+            child.set()
+
+
+def current_scope():
+    return getattr(_local, "scope", None)
+
+
+def cancelled():
+    scope = current_scope()
+    return scope is not None and scope.is_set()
+
+
+@contextmanager
+def active_scope(scope):
+    previous = current_scope()
+    _local.scope = scope
+    try:
+        yield scope
+    finally:
+        _local.scope = previous
+
+
+class ScopedStream:
+    def __init__(self, stream, scope):
+        self.stream = stream
+        self.scope = scope
+        scope.register(self)
+
+    def interrupt(self):
+        sock = self.stream.get_extra_info("socket")
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except (AttributeError, OSError):
+            pass
+
+    def read(self, max_bytes, timeout=None):
+        return self.stream.read(max_bytes, timeout)
+
+    def write(self, buffer, timeout=None):
+        self.stream.write(buffer, timeout)
+
+    def start_tls(self, ssl_context, server_hostname=None, timeout=None):
+        self.stream = self.stream.start_tls(ssl_context, server_hostname, timeout)
+        return self
+
+    def get_extra_info(self, info):
+        return self.stream.get_extra_info(info)
+
+    def close(self):
+        self.scope.unregister(self)
+        self.stream.close()
+
+
+class ScopedBackend:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def connect_tcp(self, *args, **kwargs):
+        return ScopedStream(self.backend.connect_tcp(*args, **kwargs), current_scope())
+
+    def connect_unix_socket(self, *args, **kwargs):
+        return ScopedStream(self.backend.connect_unix_socket(*args, **kwargs), current_scope())
+
+    def sleep(self, seconds):
+        self.backend.sleep(seconds)
+
+
+def scoped_transport(httpx, httpcore):
+    class ScopedTransport(httpx.HTTPTransport):
+        def __init__(self):
+            super().__init__()
+            self.scoped = httpx.HTTPTransport()
+            self.scoped._pool = httpcore.ConnectionPool(
+                ssl_context=httpx.create_ssl_context(),
+                max_keepalive_connections=0,
+                network_backend=ScopedBackend(httpcore.SyncBackend())
+            )
+
+        def handle_request(self, request):
+            if current_scope() is None:
+                return super().handle_request(request)
+            return self.scoped.handle_request(request)
+
+        def close(self):
+            self.scoped.close()
+            super().close()
+
+    return ScopedTransport()
@@ -0,0 +1,202 @@
+import re
+import uuid
+
+import streamlit as st
+
+from conversation_store import ConversationConflict, ConversationStore
+from context_window import token_count_cache
+from message_memory import COMPRESS_KEEP_RECENT, MessageLog, MessageRecord, compress_older, evictable_prefix, session_memory
+from rendering import HISTORY_PAGE_SIZE, render_cache, visible_window
+
+QUERY_PARAM = "conversation"
+OWNER_COOKIE = "chat_owner"
+OWNER_COOKIE_MAX_AGE_SECONDS = 365 * 24 * 3600
+OWNER_PATTERN = re.compile(r"[0-9a-f]{32}")
+HISTORY_DEFAULTS = {
+    "conversation_id": None,
+    "history_offset": 0,
+    "persisted_upto": 0,
+    "persisted_summary": "",
+    "history_pages": 1
+}
+
+
+@st.cache_resource
+def get_conversation_store():
+    return ConversationStore()
+
+
+def init_owner():
+    if "owner_id" in st.session_state:
+        return
+    owner = str(st.context.cookies.get(OWNER_COOKIE, ""))
+    if not OWNER_PATTERN.fullmatch(owner):
+        owner = uuid.uuid4().hex
+        st.html(
+            f"<script>document.cookie = '{OWNER_COOKIE}={owner}; path=/; "
+            f"max-age={OWNER_COOKIE_MAX_AGE_SECONDS}; SameSite=Strict';</script>",
+            unsafe_allow_javascript=True
+        )
+    st.session_state.owner_id = owner
+
+
+def discard_active_generation():
+    active_generation = st.session_state.get("active_generation")
+    if active_generation is not None:
+        active_generation["handle"].cancel()
+        st.session_state.active_generation = None
+
+
+def start_conversation(greeting):
+    st.session_state.message_log = session_memory.track(st.session_state.session_id, [MessageRecord("ai", greeting)])
+    for key, value in HISTORY_DEFAULTS.items():
+        st.session_state[key] = value
+    st.session_state.conversation_context.reset()
+
+
+def open_conversation(conversation_id, greeting):
+    store = get_conversation_store()
+    conversation = store.get(conversation_id, st.session_state.owner_id)
+    first_seq, messages = (
+        store.load_recent(conversation_id, HISTORY_PAGE_SIZE, since=conversation["summarized_upto"]) if conversation else (0, [])
+    )
+    if not messages:
+        start_conversation(greeting)
+        return False
+
+    st.session_state.message_log = session_memory.track(st.session_state.session_id, messages)
+    st.session_state.conversation_id = conversation_id
+    st.session_state.history_offset = first_seq
+    st.session_state.persisted_upto = first_seq + len(messages)
+    st.session_state.persisted_summary = conversation["summary"]
+    st.session_state.history_pages = 1
+    st.session_state.conversation_context.reset()
+    st.session_state.conversation_context.restore(conversation["summary"], conversation["summarized_upto"] - first_seq)
+    return True
+
+
+def init_history(greeting):
+    init_owner()
+    requested = st.query_params.get(QUERY_PARAM)
+    if "message_log" in st.session_state and requested == st.session_state.get("conversation_id"):
+        for key, value in HISTORY_DEFAULTS.items():
+            st.session_state.setdefault(key, value)
+        if not isinstance(st.session_state.message_log, MessageLog):
+            st.session_state.message_log = session_memory.track(st.session_state.session_id, st.session_state.message_log)
+        return
+
+    discard_active_generation()
+
+    if requested is None or not open_conversation(requested, greeting):
+        start_conversation(greeting)
+        if requested is not None:
+            del st.query_params[QUERY_PARAM]
+
+
+def persist_history(app):
+    message_log = st.session_state.message_log
+    offset = st.session_state.history_offset
+    store = get_conversation_store()
+
+    if st.session_state.conversation_id is None:
+        first_user_message = next((msg["content"] for msg in message_log if msg["role"] == "user"), None)
+        if first_user_message is None:
+            return
+        st.session_state.conversation_id = store.create(app, st.session_state.owner_id, first_user_message)
+        st.query_params[QUERY_PARAM] = st.session_state.conversation_id
+
+    unsaved = message_log[st.session_state.persisted_upto - offset:]
+    if unsaved:
+        try:
+            store.append(st.session_state.conversation_id, st.session_state.persisted_upto, unsaved)
+        except ConversationConflict:
+            fork_conversation(store)
+            store.append(st.session_state.conversation_id, st.session_state.persisted_upto, unsaved)
+        st.session_state.persisted_upto += len(unsaved)
+    conversation_id = st.session_state.conversation_id
+
+    context = st.session_state.conversation_context
+    if context.summary != st.session_state.persisted_summary:
+        store.save_summary(conversation_id, context.summary, offset + context.summarized_count)
+        st.session_state.persisted_summary = context.summary
+
+    compact_history()
+
+
+def fork_conversation(store):
+    st.session_state.conversation_id = store.fork(
+        st.session_state.conversation_id,
+        st.session_state.owner_id,
+        st.session_state.persisted_upto
+    )
+    st.session_state.persisted_summary = None
+    st.query_params[QUERY_PARAM] = st.session_state.conversation_id
+    st.toast("This conversation was continued elsewhere, so your new messages were saved as a separate conversation.")
+
+
+def compact_history():
+    message_log = st.session_state.message_log
+    context = st.session_state.conversation_context
+    first_visible, _ = history_window()
+    keep_recent = max(COMPRESS_KEEP_RECENT, len(message_log) - first_visible)
+    session_memory.record_compression(compress_older(message_log, keep_recent))
+
+    limit = min(
+        st.session_state.persisted_upto - st.session_state.history_offset,
+        context.summarized_count,
+        len(message_log) - HISTORY_PAGE_SIZE
+    )
+    evicted = evictable_prefix(message_log, limit, session_memory.cap_bytes)
+    if evicted > 0:
+        del message_log[:evicted]
+        st.session_state.history_offset += evicted
+        context.shift(-evicted)
+        session_memory.record_eviction(evicted)
+
+
+def load_earlier_messages(count):
+    offset = st.session_state.history_offset
+    if offset <= 0 or count <= 0:
+        return 0
+
+    first_seq, older = get_conversation_store().load_before(st.session_state.conversation_id, offset, count)
+    st.session_state.message_log[:0] = [MessageRecord.from_dict(message) for message in older]
+    st.session_state.history_offset = first_seq
+    st.session_state.conversation_context.shift(len(older))
+    return len(older)
+
+
+def history_window():
+    first_visible = visible_window(len(st.session_state.message_log), st.session_state.history_pages)
+    return first_visible, first_visible + st.session_state.history_offset
+
+
+def show_more_history():
+    st.session_state.history_pages += 1
+    load_earlier_messages(HISTORY_PAGE_SIZE * st.session_state.history_pages - len(st.session_state.message_log))
+
+
+def render_conversation_list(app, greeting, limit=10):
+    with st.expander("🗂️ Conversations"):
+        if st.button("➕ New conversation"):
+            discard_active_generation()
+            if QUERY_PARAM in st.query_params:
+                del st.query_params[QUERY_PARAM]
+            start_conversation(greeting)
+            st.rerun()
+
+        conversations = get_conversation_store().list_conversations(app, st.session_state.owner_id, limit)
+        if not conversations:
+            st.caption("No saved conversations yet.")
+        for conversation in conversations:
+            marker = "▶ " if conversation["id"] == st.session_state.conversation_id else ""
+            title = conversation["title"].replace("[", "(").replace("]", ")") or "Untitled"
+            st.markdown(f"{marker}[{title}](?{QUERY_PARAM}={conversation['id']}) · {conversation['turns']} messages")
+
+
+def render_memory_report():
+    with st.expander("🧮 Memory"):
+        st.caption(f"This session: {session_memory.session_bytes(st.session_state.session_id):,} bytes")
+        st.json(session_memory.report())
+        st.caption("Shared caches")
+        st.json({"render_cache": render_cache.stats(), "token_count_cache": token_count_cache.stats()})
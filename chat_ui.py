@@ -0,0 +1,156 @@
+import html
+import time
+from datetime import datetime
+
+import streamlit as st
+
+from rendering import CodeFenceFormatter, PREVIEW_INTERVAL_SECONDS, render_message
+from think_parser import ThinkStreamParser
+
+
+def render_timestamp(suffix=""):
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    st.markdown(f"""
+    <div class="time-stamp">⏱️ {timestamp}{suffix}</div>
+    """, unsafe_allow_html=True)
+
+
+def render_thinking(thinking_container, trace):
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    trace = trace.strip()
+    if len(trace) > 2000:
+        trace = "…" + trace[-2000:]
+    trace_html = html.escape(trace).replace("\n", "<br>") if trace else f"Analyzing the problem in {st.session_state.language}..."
+    thinking_container.markdown(f"""
+    <div class="thinking-container">
+        <span>💭 {trace_html}</span>
+        <div class="time-stamp">⏱️ {timestamp}</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+
+def finish_thinking(thinking_container, trace):
+    trace = trace.strip()
+    if not trace:
+        thinking_container.empty()
+        return
+    with thinking_container.container():
+        with st.expander("💭 Thinking process"):
+            st.text(trace)
+
+
+def cache_status_label(cache_eligible, cache_source, similarity=None):
+    if not cache_eligible:
+        return ""
+    if cache_source == "exact":
+        return " · ⚡ cache hit"
+    if cache_source == "semantic":
+        return f" · ≈ semantic cache hit ({similarity:.2f})"
+    return " · cache miss"
+
+
+def render_timings(timings):
+    if not timings:
+        return
+    with st.expander("⏱️ Timing breakdown"):
+        rows = [f"| {name.replace('_', ' ')} | {duration_ms:,.1f} |" for name, duration_ms in timings]
+        st.markdown("\n".join(["| Span | ms |", "|---|---:|"] + rows))
+
+
+def render_latency_panel(trace_recorder, model):
+    with st.expander("📈 Latency"):
+        percentiles = trace_recorder.percentiles(model).get(model)
+        if not percentiles:
+            st.caption("No completed requests yet.")
+            return
+        st.json(percentiles)
+        histogram = trace_recorder.histogram(model, "total")
+        if histogram:
+            st.caption("Total request time")
+            st.bar_chart(histogram)
+
+
+def stop_active_generation():
+    active_generation = st.session_state.get("active_generation")
+    if active_generation is not None:
+        active_generation["handle"].cancel()
+
+
+def render_stop_button(placeholder):
+    placeholder.button("⏹ Stop generating", key="stop_generation", on_click=stop_active_generation)
+
+
+def render_streamed_response(chunk_stream, thinking_placeholder=None, progressive=True, status=None, timing=None):
+    finalized_area = st.container()
+    response_placeholder = st.empty()
+    trace_parser = ThinkStreamParser()
+    code_formatter = CodeFenceFormatter()
+    raw_chunks = []
+    thinking_chunks = []
+    response_chunks = []
+    started = time.monotonic()
+    last_thinking_update = 0.0
+    last_preview_update = 0.0
+    waits = []
+
+    def received(stream):
+        wait_started = time.monotonic()
+        for chunk in stream:
+            waits.append(time.monotonic() - wait_started)
+            yield chunk
+            wait_started = time.monotonic()
+        waits.append(time.monotonic() - wait_started)
+
+    for chunk in received(chunk_stream):
+        now = time.monotonic()
+
+        if chunk is None:
+            status_text = status() if status is not None and not raw_chunks else None
+            if progressive and response_chunks:
+                response_placeholder.markdown(code_formatter.preview() + " ▌", unsafe_allow_html=True)
+            elif status_text:
+                response_placeholder.markdown(status_text)
+            else:
+                response_placeholder.markdown(f"🧠 Processing... {now - started:.1f}s")
+            continue
+
+        raw_chunks.append(chunk)
+        thinking_delta, answer_delta = trace_parser.feed(chunk)
+
+        if thinking_delta:
+            thinking_chunks.append(thinking_delta)
+            if thinking_placeholder is not None and now - last_thinking_update >= PREVIEW_INTERVAL_SECONDS:
+                render_thinking(thinking_placeholder, "".join(thinking_chunks))
+                last_thinking_update = now
+
+        if answer_delta:
+            response_chunks.append(answer_delta)
+            if not progressive:
+                continue
+            segments = code_formatter.feed(answer_delta)
+            for segment in segments:
+                if segment.strip():
+                    finalized_area.markdown(segment, unsafe_allow_html=True)
+            if segments or now - last_preview_update >= PREVIEW_INTERVAL_SECONDS:
+                response_placeholder.markdown(code_formatter.preview() + " ▌", unsafe_allow_html=True)
+                last_preview_update = now
+
+    thinking_delta, answer_delta = trace_parser.flush()
+    thinking_chunks.append(thinking_delta)
+    response_chunks.append(answer_delta)
+    ai_response = "".join(response_chunks).strip()
+
+    if progressive:
+        for segment in code_formatter.feed(answer_delta) + code_formatter.close():
+            if segment.strip():
+                finalized_area.markdown(segment, unsafe_allow_html=True)
+        response_placeholder.empty()
+    else:
+        response_placeholder.markdown(render_message(ai_response), unsafe_allow_html=True)
+
+    if thinking_placeholder is not None:
+        finish_thinking(thinking_placeholder, "".join(thinking_chunks))
+    if timing is not None:
+        timing["started"] = started
+        timing["render_seconds"] = time.monotonic() - started - sum(waits)
+    return "".join(raw_chunks), ai_response
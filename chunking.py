@@ -0,0 +1,147 @@
+import os
+import re
+
+from context_window import count_tokens
+
+DECORATED = r"(?:(?:public|private|protected|internal|static|final|abstract|override|open|sealed|virtual|async|" \
+            r"extern|inline|partial|readonly|data|suspend|fileprivate|mutating|unsafe|const)\s+)*"
+
+LANGUAGE_SYNTAX = {
+    "Python": ((".py", ".pyi"), r"^(?: {4})?(?:async\s+def|def|class)\s"),
+    "JavaScript": (
+        (".js", ".jsx", ".mjs", ".cjs"),
+        r"^(?:export\s+(?:default\s+)?)?(?:async\s+)?(?:function\b|class\b|const\s+\w+\s*=|let\s+\w+\s*=)"
+    ),
+    "TypeScript": (
+        (".ts", ".tsx"),
+        r"^(?:export\s+(?:default\s+)?)?(?:declare\s+)?(?:abstract\s+)?(?:async\s+)?"
+        r"(?:function\b|class\b|interface\b|type\s+\w+|enum\b|namespace\b|const\s+\w+\s*[:=]|let\s+\w+\s*[:=])"
+    ),
+    "Java": ((".java",), r"^ {0,4}" + DECORATED + r"(?:class|interface|enum|record|@interface)\b|^ {4}" + DECORATED
+             + r"(?:<[^>]+>\s+)?[\w<>\[\],.? ]+\s+\w+\s*\("),
+    "C++": (
+        (".cpp", ".cc", ".cxx", ".hpp", ".hh", ".h", ".c"),
+        r"^(?:template\s*<|class\s|struct\s|namespace\s|enum\s|union\s|" + DECORATED
+        + r"[A-Za-z_][\w:<>,*&\s]*\s[*&]*[A-Za-z_][\w:~]*\s*\([^;]*$)"
+    ),
+    "C#": ((".cs",), r"^ {0,8}" + DECORATED + r"(?:class|interface|enum|struct|record|namespace)\b|^ {4,8}" + DECORATED
+           + r"[\w<>\[\],.? ]+\s+\w+\s*\("),
+    "Go": ((".go",), r"^(?:func|type|var|const)\b"),
+    "Rust": (
+        (".rs",),
+        r"^ {0,4}(?:pub(?:\([\w:]+\))?\s+)?(?:async\s+)?(?:unsafe\s+)?(?:const\s+)?"
+        r"(?:fn|struct|enum|trait|impl|mod|type|union|macro_rules!)\b"
+    ),
+    "PHP": ((".php",), r"^ {0,4}" + DECORATED + r"(?:function|class|interface|trait|enum)\b"),
+    "Ruby": ((".rb",), r"^ {0,2}(?:def|class|module)\s"),
+    "Swift": ((".swift",), r"^ {0,4}(?:@\w+\s+)*" + DECORATED + r"(?:func|class|struct|enum|protocol|extension|actor|init)\b"),
+    "Kotlin": (
+        (".kt", ".kts"),
+        r"^ {0,4}(?:@\w+\s+)*" + DECORATED + r"(?:fun|class|interface|object|enum\s+class|data\s+class|sealed\s+class)\b"
+    )
+}
+TEXT_EXTENSIONS = (".md", ".rst", ".txt", ".json", ".yaml", ".yml", ".toml", ".cfg", ".ini")
+
+EXTENSION_LANGUAGES = {
+    extension: language for language, (extensions, _) in LANGUAGE_SYNTAX.items() for extension in extensions
+}
+BOUNDARY_PATTERNS = {language: re.compile(pattern) for language, (_, pattern) in LANGUAGE_SYNTAX.items()}
+LEADING_PATTERN = re.compile(r"^\s*(?:#(?!include|define|if|endif|else|pragma)|//|/\*|\*|@|\[[A-Z#])")
+
+
+def language_for_path(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in EXTENSION_LANGUAGES:
+        return EXTENSION_LANGUAGES[extension]
+    if extension in TEXT_EXTENSIONS:
+        return "text"
+    return None
+
+
+def pack_units(units, max_tokens, overlap_tokens, separator):
+    buffer = []
+    used = 0
+
+    def flush():
+        return buffer[0][0], buffer[-1][0], separator.join(unit for _, unit, _ in buffer)
+
+    for position, unit in units:
+        tokens = count_tokens(unit)
+        if buffer and used + tokens > max_tokens:
+            yield flush()
+            carried = []
+            carried_tokens = 0
+            for entry in reversed(buffer):
+                if carried_tokens + entry[2] > overlap_tokens:
+                    break
+                carried.insert(0, entry)
+                carried_tokens += entry[2]
+            buffer, used = carried, carried_tokens
+        buffer.append((position, unit, tokens))
+        used += tokens
+
+    if buffer:
+        yield flush()
+
+
+def chunk_lines(lines, max_tokens, overlap_tokens, first_line=1):
+    for line_start, line_end, text in pack_units(enumerate(lines, start=first_line), max_tokens, overlap_tokens, "\n"):
+        if text.strip():
+            yield {"line_start": line_start, "line_end": line_end, "text": text}
+
+
+def block_starts(lines, language):
+    pattern = BOUNDARY_PATTERNS.get(language)
+    starts = [0]
+    for number in range(1, len(lines)):
+        line = lines[number]
+        if pattern is not None:
+            is_start = pattern.match(line) is not None
+        else:
+            is_start = bool(line.strip()) and (not lines[number - 1].strip() or line.startswith("#"))
+        if not is_start:
+            continue
+
+        start = number
+        while start - 1 > starts[-1] and lines[start - 1].strip() and LEADING_PATTERN.match(lines[start - 1]):
+            start -= 1
+        if start > starts[-1]:
+            starts.append(start)
+    return starts
+
+
+def chunk_source(lines, path, max_tokens, overlap_tokens):
+    language = language_for_path(path)
+    if language is None:
+        yield from chunk_lines(lines, max_tokens, overlap_tokens)
+        return
+
+    starts = block_starts(lines, language)
+    blocks = [(start, end) for start, end in zip(starts, starts[1:] + [len(lines)])]
+    pending_start = None
+    pending_end = None
+    pending_tokens = 0
+
+    def flush():
+        text = "\n".join(lines[pending_start:pending_end]).rstrip()
+        if text.strip():
+            yield {"line_start": pending_start + 1, "line_end": pending_start + text.count("\n") + 1, "text": text}
+
+    for start, end in blocks:
+        tokens = count_tokens("\n".join(lines[start:end]))
+        if tokens > max_tokens:
+            if pending_start is not None:
+                yield from flush()
+                pending_start = None
+            yield from chunk_lines(lines[start:end], max_tokens, overlap_tokens, first_line=start + 1)
+            continue
+        if pending_start is not None and pending_tokens + tokens > max_tokens:
+            yield from flush()
+            pending_start = None
+        if pending_start is None:
+            pending_start, pending_tokens = start, 0
+        pending_end = end
+        pending_tokens += tokens
+
+    if pending_start is not None:
+        yield from flush()
@@ -0,0 +1,203 @@
+import hashlib
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_CONTEXT_LENGTH = int(os.getenv("DEFAULT_CONTEXT_LENGTH", "4096"))
+CONTEXT_SAFETY_RATIO = float(os.getenv("CONTEXT_SAFETY_RATIO", "0.85"))
+MIN_PROMPT_TOKENS = int(os.getenv("MIN_PROMPT_TOKENS", "128"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "8192"))
+
+MODEL_CONTEXT_LENGTHS = {
+    "deepseek-r1:1.5b": int(os.getenv("OLLAMA_NUM_CTX", "4096")),
+    "deepseek-r1:3b": int(os.getenv("OLLAMA_NUM_CTX", "4096")),
+    "bigscience/bloom": 2048,
+    "bigscience/bloom-560m": 2048,
+    "google/flan-t5-xl": 512,
+    "google/flan-t5-large": 512,
+    "gpt2": 1024,
+    "gpt2-xl": 1024,
+    "EleutherAI/gpt-neo-1.3B": 2048
+}
+
+TOKEN_PATTERN = re.compile(r"_?[A-Za-z]{1,8}|\d{1,3}|[^\x00-\x7f]|_+|[^\w\s]| {4}|\t|\n")
+
+summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="context-summary")
+
+
+class ContextOverflow(ValueError):
+    pass
+
+
+def get_context_length(model_id):
+    return MODEL_CONTEXT_LENGTHS.get(model_id, DEFAULT_CONTEXT_LENGTH)
+
+
+class TokenCountCache:
+    def __init__(self, max_entries=TOKEN_CACHE_MAX_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def count(self, text):
+        key = hashlib.sha256(text.encode("utf-8")).digest()
+        with self.lock:
+            tokens = self.entries.get(key)
+            if tokens is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return tokens
+
+        tokens = len(TOKEN_PATTERN.findall(text))
+
+        with self.lock:
+            self.misses += 1
+            self.entries[key] = tokens
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return tokens
+
+    def stats(self):
+        with self.lock:
+            entries = len(self.entries)
+            key_bytes = sum(sys.getsizeof(key) for key in self.entries)
+            return {"entries": entries, "bytes": key_bytes, "hits": self.hits, "misses": self.misses}
+
+
+token_count_cache = TokenCountCache()
+
+
+def count_tokens(text):
+    return token_count_cache.count(text)
+
+
+def truncate_to_tokens(text, max_tokens, keep="end"):
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    tokens = list(TOKEN_PATTERN.finditer(text))
+    if keep == "end":
+        return text[tokens[-max_tokens].start():]
+    return text[:tokens[max_tokens - 1].end()]
+
+
+def extractive_summary(previous_summary, messages, max_line_chars=160):
+    lines = [previous_summary] if previous_summary else []
+
+    for msg in messages:
+        text = msg["content"].split("```")[0].strip() or msg["content"].strip()
+        text = " ".join(text.split())
+        if len(text) > max_line_chars:
+            text = text[:max_line_chars].rstrip() + "…"
+        speaker = "User" if msg["role"] == "user" else "Assistant"
+        lines.append(f"{speaker}: {text}")
+
+    return "\n".join(lines)
+
+
+class ConversationContext:
+    def __init__(self, context_length=DEFAULT_CONTEXT_LENGTH, reserve_tokens=512, summary_ratio=0.25,
+                 summarizer=extractive_summary):
+        self.context_length = context_length
+        self.reserve_tokens = reserve_tokens
+        self.summary_ratio = summary_ratio
+        self.summarizer = summarizer
+        self.summary = ""
+        self.summarized_count = 0
+        self.pending_summary = None
+        self.pending_upto = 0
+        self.lock = threading.Lock()
+
+    def _collect_summary(self):
+        if self.pending_summary is None or not self.pending_summary.done():
+            return
+
+        future, upto = self.pending_summary, self.pending_upto
+        self.pending_summary = None
+        try:
+            summary_cap = int(self.context_length * self.summary_ratio)
+            self.summary = truncate_to_tokens(future.result().strip(), summary_cap)
+            self.summarized_count = upto
+        except Exception:
+            pass
+
+    def _schedule_summary(self, messages, upto):
+        if self.pending_summary is not None or upto <= self.summarized_count:
+            return
+
+        evicted = list(messages[self.summarized_count:upto])
+        previous_summary = self.summary
+        summarizer = self.summarizer
+
+        def summarize():
+            try:
+                return summarizer(previous_summary, evicted)
+            except Exception:
+                return extractive_summary(previous_summary, evicted)
+
+        self.pending_upto = upto
+        self.pending_summary = summary_executor.submit(summarize)
+
+    def prompt_budget(self):
+        usable = int(self.context_length * CONTEXT_SAFETY_RATIO)
+        return usable - min(self.reserve_tokens, max(usable - MIN_PROMPT_TOKENS, 0))
+
+    def _overflow(self, needed):
+        return ContextOverflow(
+            f"This request needs about {needed} tokens, but only {self.prompt_budget()} fit in this model's "
+            f"{self.context_length}-token context window. Shorten the message or choose a model with a larger context."
+        )
+
+    def fit(self, messages, system_tokens=0, keep_last=True):
+        with self.lock:
+            self._collect_summary()
+
+            required = system_tokens + (count_tokens(messages[-1]["content"]) if keep_last and messages else 0)
+            if required > self.prompt_budget():
+                raise self._overflow(required)
+            available = self.prompt_budget() - system_tokens
+            summary_budget = int(available * self.summary_ratio)
+            summary = truncate_to_tokens(self.summary, summary_budget) if self.summary else ""
+            history_budget = available - count_tokens(summary)
+
+            first_kept = len(messages)
+            used = 0
+            while first_kept > 0:
+                message_tokens = count_tokens(messages[first_kept - 1]["content"])
+                if used + message_tokens > history_budget and (first_kept < len(messages) or not keep_last):
+                    break
+                used += message_tokens
+                first_kept -= 1
+
+            if used > history_budget:
+                summary = ""
+            if first_kept < self.summarized_count:
+                summary = ""
+            else:
+                self._schedule_summary(messages, first_kept)
+
+            return summary, list(messages[first_kept:])
+
+    def restore(self, summary, summarized_count):
+        with self.lock:
+            self.summary = summary
+            self.summarized_count = max(summarized_count, 0)
+
+    def shift(self, count):
+        with self.lock:
+            if self.summary or self.pending_summary is not None:
+                self.summarized_count = max(self.summarized_count + count, 0)
+                self.pending_upto = max(self.pending_upto + count, 0)
+
+    def reset(self):
+        with self.lock:
+            self.summary = ""
+            self.summarized_count = 0
+            self.pending_summary = None
@@ -0,0 +1,196 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_STORE_PATH = os.getenv("CONVERSATION_STORE_PATH", os.path.join(".cache", "conversations.sqlite3"))
+TITLE_MAX_CHARS = 80
+MESSAGE_FIELDS = ("role", "content")
+
+
+class ConversationConflict(RuntimeError):
+    pass
+
+
+class ConversationStore:
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                id TEXT PRIMARY KEY,
+                app TEXT NOT NULL,
+                owner TEXT NOT NULL DEFAULT '',
+                title TEXT NOT NULL,
+                summary TEXT NOT NULL DEFAULT '',
+                summarized_upto INTEGER NOT NULL DEFAULT 0,
+                turns INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS turns (
+                conversation_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                meta TEXT,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (conversation_id, seq)
+            ) WITHOUT ROWID
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(conversations)")}
+        if "owner" not in columns:
+            self.conn.execute("ALTER TABLE conversations ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+        self.conn.execute("DROP INDEX IF EXISTS conversations_updated")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS conversations_owner ON conversations (owner, app, updated_at)")
+
+    @staticmethod
+    def _row_to_message(role, content, meta):
+        message = {"role": role, "content": content}
+        if meta:
+            message.update(json.loads(meta))
+        return message
+
+    def create(self, app, owner, title=""):
+        conversation_id = uuid.uuid4().hex
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO conversations (id, app, owner, title, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (conversation_id, app, owner, " ".join(title.split())[:TITLE_MAX_CHARS], now, now)
+            )
+        return conversation_id
+
+    def fork(self, conversation_id, owner, upto):
+        forked_id = uuid.uuid4().hex
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self.conn.execute(
+                    "INSERT INTO conversations (id, app, owner, title, turns, created_at, updated_at) "
+                    "SELECT ?, app, owner, title, ?, ?, ? FROM conversations WHERE id = ? AND owner = ?",
+                    (forked_id, upto, now, now, conversation_id, owner)
+                )
+                self.conn.execute(
+                    "INSERT INTO turns (conversation_id, seq, role, content, meta, created_at) "
+                    "SELECT ?, seq, role, content, meta, created_at FROM turns WHERE conversation_id = ? AND seq < ?",
+                    (forked_id, conversation_id, upto)
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return forked_id
+
+    def append(self, conversation_id, first_seq, messages):
+        if not messages:
+            return
+        now = time.time()
+        rows = []
+        for seq, message in enumerate(messages, start=first_seq):
+            meta = {key: value for key, value in message.items() if key not in MESSAGE_FIELDS}
+            rows.append((conversation_id, seq, message["role"], message["content"], json.dumps(meta) if meta else None, now))
+
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany(
+                    "INSERT INTO turns (conversation_id, seq, role, content, meta, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self.conn.execute(
+                    "UPDATE conversations SET turns = MAX(turns, ?), updated_at = ? WHERE id = ?",
+                    (first_seq + len(rows), now, conversation_id)
+                )
+                self.conn.execute("COMMIT")
+            except sqlite3.IntegrityError as e:
+                self.conn.execute("ROLLBACK")
+                raise ConversationConflict(f"Conversation {conversation_id} already has turns from seq {first_seq}") from e
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def save_summary(self, conversation_id, summary, summarized_upto):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE conversations SET summary = ?, summarized_upto = ? WHERE id = ?",
+                (summary, summarized_upto, conversation_id)
+            )
+
+    def get(self, conversation_id, owner):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT app, title, summary, summarized_upto, turns, created_at, updated_at FROM conversations "
+                "WHERE id = ? AND owner = ?",
+                (conversation_id, owner)
+            ).fetchone()
+        if row is None:
+            return None
+        app, title, summary, summarized_upto, turns, created_at, updated_at = row
+        return {
+            "id": conversation_id,
+            "app": app,
+            "title": title,
+            "summary": summary,
+            "summarized_upto": summarized_upto,
+            "turns": turns,
+            "created_at": created_at,
+            "updated_at": updated_at
+        }
+
+    def load_recent(self, conversation_id, limit, since=None):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT seq, role, content, meta FROM turns WHERE conversation_id = ? ORDER BY seq DESC LIMIT ?",
+                (conversation_id, limit)
+            ).fetchall()
+        rows.reverse()
+        first_seq = rows[0][0] if rows else 0
+        messages = [self._row_to_message(role, content, meta) for _, role, content, meta in rows]
+        if rows and since is not None and since < first_seq:
+            first_seq, older = self.load_before(conversation_id, first_seq, first_seq - since)
+            messages[:0] = older
+        return first_seq, messages
+
+    def load_before(self, conversation_id, before_seq, limit):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT seq, role, content, meta FROM turns WHERE conversation_id = ? AND seq < ? "
+                "ORDER BY seq DESC LIMIT ?",
+                (conversation_id, before_seq, limit)
+            ).fetchall()
+        rows.reverse()
+        first_seq = rows[0][0] if rows else before_seq
+        return first_seq, [self._row_to_message(role, content, meta) for _, role, content, meta in rows]
+
+    def list_conversations(self, app, owner, limit=10):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, title, turns, updated_at FROM conversations WHERE owner = ? AND app = ? AND turns > 0 "
+                "ORDER BY updated_at DESC LIMIT ?",
+                (owner, app, limit)
+            ).fetchall()
+        return [{"id": row[0], "title": row[1], "turns": row[2], "updated_at": row[3]} for row in rows]
+
+    def delete(self, conversation_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM turns WHERE conversation_id = ?", (conversation_id,))
+            self.conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+
+    def stats(self):
+        with self.lock:
+            conversations, turns = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(turns), 0) FROM conversations"
+            ).fetchone()
+        return {"conversations": conversations, "turns": turns}
@@ -0,0 +1,265 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from chunking import chunk_source, pack_units
+from context_window import count_tokens
+
+DOCUMENT_CACHE_DIR = os.getenv("DOCUMENT_CACHE_DIR", os.path.join(".cache", "documents"))
+PDF_INGEST_WORKERS = int(os.getenv("PDF_INGEST_WORKERS", str(os.cpu_count() or 2)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+CHUNK_TOKENS = int(os.getenv("DOCUMENT_CHUNK_TOKENS", "300"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("DOCUMENT_CHUNK_OVERLAP_TOKENS", "40"))
+HASH_BLOCK_BYTES = 1024 * 1024
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+class DocumentError(Exception):
+    pass
+
+
+def content_hash(source):
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+        return digest.hexdigest()
+    with open(source, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def count_pdf_pages(path):
+    import pdfplumber
+
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_page_range(path, first_page, last_page):
+    import pdfplumber
+
+    pages = []
+    with pdfplumber.open(path, pages=range(first_page, last_page + 1)) as pdf:
+        for page in pdf.pages:
+            pages.append((page.page_number, page.extract_text() or ""))
+            page.close()
+    return first_page, pages
+
+
+def split_units(text, max_tokens):
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if count_tokens(paragraph) <= max_tokens:
+            yield paragraph
+            continue
+        for line in paragraph.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if count_tokens(line) <= max_tokens:
+                yield line
+                continue
+            words = line.split()
+            window = max(max_tokens // 2, 1)
+            for start in range(0, len(words), window):
+                yield " ".join(words[start:start + window])
+
+
+def chunk_pages(pages, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    units = ((page_number, unit) for page_number, text in pages for unit in split_units(text, max_tokens))
+    for page_start, page_end, text in pack_units(units, max_tokens, overlap_tokens, "\n\n"):
+        yield {"page_start": page_start, "page_end": page_end, "text": text}
+
+
+class DocumentIngestor:
+    def __init__(self, cache_dir=DOCUMENT_CACHE_DIR, workers=PDF_INGEST_WORKERS, pages_per_task=PDF_PAGES_PER_TASK,
+                 chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+        self.cache_dir = cache_dir
+        self.workers = max(1, workers)
+        self.pages_per_task = max(1, pages_per_task)
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.executor = None
+        self.lock = threading.Lock()
+        self.cache_hits = 0
+        self.extracted_pages = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _pool(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self.executor
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+
+    def _paths(self, document_hash):
+        base = os.path.join(self.cache_dir, document_hash)
+        return base + ".json", base + ".chunks.jsonl"
+
+    def cached(self, document_hash):
+        meta_path, chunks_path = self._paths(document_hash)
+        if not (os.path.exists(meta_path) and os.path.exists(chunks_path)):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def iter_chunks(self, document_hash):
+        _, chunks_path = self._paths(document_hash)
+        with open(chunks_path, encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def iter_pages(self, path, page_count, progress=None):
+        ranges = [
+            (first, min(first + self.pages_per_task - 1, page_count))
+            for first in range(1, page_count + 1, self.pages_per_task)
+        ]
+        if len(ranges) == 1:
+            _, pages = extract_page_range(path, *ranges[0])
+            if progress is not None:
+                progress(page_count, page_count)
+            yield from pages
+            return
+
+        executor = self._pool()
+        pending = {}
+        finished = {}
+        next_range = 0
+        next_emit = 1
+        pages_done = 0
+        max_in_flight = self.workers * 2
+
+        try:
+            while next_range < len(ranges) or pending:
+                while next_range < len(ranges) and len(pending) + len(finished) < max_in_flight:
+                    future = executor.submit(extract_page_range, path, *ranges[next_range])
+                    pending[future] = ranges[next_range]
+                    next_range += 1
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del pending[future]
+                    first_page, pages = future.result()
+                    finished[first_page] = pages
+                    pages_done += len(pages)
+                    if progress is not None:
+                        progress(pages_done, page_count)
+
+                while next_emit in finished:
+                    pages = finished.pop(next_emit)
+                    next_emit += self.pages_per_task
+                    yield from pages
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _write(self, document_hash, meta, chunks):
+        meta_path, chunks_path = self._paths(document_hash)
+        partial_path = chunks_path + f".{os.getpid()}.{threading.get_ident()}.partial"
+        started = time.monotonic()
+        chunk_count = 0
+        characters = 0
+        try:
+            with open(partial_path, "w", encoding="utf-8") as out:
+                for chunk in chunks:
+                    chunk["index"] = chunk_count
+                    out.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+                    chunk_count += 1
+                    characters += len(chunk["text"])
+            os.replace(partial_path, chunks_path)
+        finally:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+
+        meta.update({
+            "hash": document_hash,
+            "chunks": chunk_count,
+            "characters": characters,
+            "extract_seconds": round(time.monotonic() - started, 2)
+        })
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        return dict(meta, cached=False)
+
+    def _ingest_pdf(self, document_hash, source, name, progress):
+        spool = None
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            spool = tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix=".pdf", delete=False)
+            with spool:
+                spool.write(source)
+            path = spool.name
+        else:
+            path = source
+
+        try:
+            try:
+                page_count = count_pdf_pages(path)
+            except Exception as e:
+                raise DocumentError(f"Could not read {name} as a PDF: {e}") from e
+
+            chunks = chunk_pages(self.iter_pages(path, page_count, progress), self.chunk_tokens, self.overlap_tokens)
+            try:
+                document = self._write(document_hash, {"name": name, "kind": "pdf", "pages": page_count}, chunks)
+            except BrokenProcessPool as e:
+                self.shutdown()
+                raise DocumentError(f"A PDF extraction worker crashed while reading {name}: {e}") from e
+            except Exception as e:
+                raise DocumentError(f"Could not extract text from {name}: {e}") from e
+            with self.lock:
+                self.extracted_pages += page_count
+            return document
+        finally:
+            if spool is not None:
+                os.remove(spool.name)
+
+    def _ingest_text(self, document_hash, source, name):
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            text = bytes(source).decode("utf-8", errors="replace")
+        else:
+            with open(source, encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        lines = text.splitlines()
+        chunks = chunk_source(lines, name, self.chunk_tokens, self.overlap_tokens)
+        return self._write(document_hash, {"name": name, "kind": "text", "lines": len(lines)}, chunks)
+
+    def ingest(self, source, name, progress=None):
+        document_hash = content_hash(source)
+        cached = self.cached(document_hash)
+        if cached is not None:
+            with self.lock:
+                self.cache_hits += 1
+            return dict(cached, name=name, cached=True)
+
+        if name.lower().endswith(".pdf"):
+            return self._ingest_pdf(document_hash, source, name, progress)
+        return self._ingest_text(document_hash, source, name)
+
+    def stats(self):
+        entries = [entry for entry in os.listdir(self.cache_dir) if entry.endswith(".chunks.jsonl")]
+        return {
+            "workers": self.workers,
+            "cached_documents": len(entries),
+            "cache_bytes": sum(os.path.getsize(os.path.join(self.cache_dir, entry)) for entry in entries),
+            "cache_hits": self.cache_hits,
+            "extracted_pages": self.extracted_pages
+        }
+
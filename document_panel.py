@@ -0,0 +1,86 @@
+import atexit
+
+import streamlit as st
+
+from document_ingest import DocumentError, DocumentIngestor
+from retrieval import RETRIEVAL_TOP_K, RetrievalIndex, fit_to_budget, retrieval_budget
+
+DOCUMENT_TYPES = [
+    "pdf", "txt", "md", "rst", "json", "yaml", "yml", "toml",
+    "py", "js", "ts", "java", "cpp", "cc", "h", "hpp", "cs", "go", "rs", "php", "rb", "swift", "kt"
+]
+
+
+@st.cache_resource
+def get_document_ingestor():
+    document_ingestor = DocumentIngestor()
+    atexit.register(document_ingestor.shutdown)
+    return document_ingestor
+
+
+def sync_uploaded_documents(uploaded_files):
+    documents = st.session_state.setdefault("documents", {})
+    document_errors = st.session_state.setdefault("document_errors", {})
+    uploaded_ids = {uploaded_file.file_id for uploaded_file in uploaded_files}
+    for tracked in (documents, document_errors):
+        for file_id in [file_id for file_id in tracked if file_id not in uploaded_ids]:
+            del tracked[file_id]
+
+    document_ingestor = get_document_ingestor()
+    for uploaded_file in uploaded_files:
+        if uploaded_file.file_id in documents or uploaded_file.file_id in document_errors:
+            continue
+        progress_bar = st.progress(0.0, text=f"Extracting {uploaded_file.name}…")
+        try:
+            documents[uploaded_file.file_id] = document_ingestor.ingest(
+                uploaded_file.getbuffer(),
+                uploaded_file.name,
+                progress=lambda done, total: progress_bar.progress(done / total, text=f"{uploaded_file.name}: page {done}/{total}")
+            )
+        except DocumentError as e:
+            document_errors[uploaded_file.file_id] = str(e)
+        finally:
+            progress_bar.empty()
+    return documents
+
+
+def sync_retrieval_index(documents):
+    if "retrieval_index" not in st.session_state:
+        st.session_state.retrieval_index = RetrievalIndex()
+    retrieval_index = st.session_state.retrieval_index
+
+    wanted = {document["hash"]: document for document in documents.values()}
+    for document_hash in [document_hash for document_hash in retrieval_index.sources if document_hash not in wanted]:
+        retrieval_index.remove(document_hash)
+
+    document_ingestor = get_document_ingestor()
+    for document_hash, document in wanted.items():
+        if document_hash not in retrieval_index:
+            retrieval_index.add(
+                document_hash,
+                (dict(chunk, name=document["name"]) for chunk in document_ingestor.iter_chunks(document_hash))
+            )
+    return retrieval_index
+
+
+def retrieve_references(query, prompt_tokens):
+    indexes = [st.session_state.get("retrieval_index"), st.session_state.get("repository_index")]
+    hits = [hit for index in indexes if index is not None and len(index) for hit in index.search(query)]
+    hits.sort(key=lambda hit: hit["score"], reverse=True)
+    return fit_to_budget(hits[:RETRIEVAL_TOP_K], retrieval_budget(prompt_tokens))
+
+
+def render_document_panel():
+    with st.expander("📄 Documents"):
+        uploaded_files = st.file_uploader("Upload PDFs, code or text files", type=DOCUMENT_TYPES, accept_multiple_files=True)
+        documents = sync_uploaded_documents(uploaded_files or [])
+        retrieval_index = sync_retrieval_index(documents)
+        for document in documents.values():
+            source = "cached" if document["cached"] else f"{document['extract_seconds']}s"
+            size = f"{document['pages']} pages" if "pages" in document else f"{document['lines']} lines"
+            st.caption(f"{document['name']} · {size} · {document['chunks']} chunks · {source}")
+        if len(retrieval_index):
+            index_stats = retrieval_index.stats()
+            st.caption(f"🔎 {index_stats['chunks']} chunks · {index_stats['terms']} terms indexed for retrieval")
+        for error in st.session_state.document_errors.values():
+            st.error(error)
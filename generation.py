@@ -0,0 +1,353 @@
+import functools
+import os
+import time
+
+from cancellation import scoped_transport
+from context_window import get_context_length
+from model_router import hf_router
+from ollama_pool import ollama_pool
+from rate_limit import RateLimitedClient, hf_rate_limiter
+from startup_timing import timed_import
+from think_parser import split_thinking
+
+LANGUAGES = [
+    "Python", "JavaScript", "TypeScript", "Java", "C++", "C#",
+    "Go", "Rust", "PHP", "Ruby", "Swift", "Kotlin"
+]
+
+OLLAMA_MODELS = ["deepseek-r1:1.5b", "deepseek-r1:3b"]
+
+HF_MODELS = {
+    "Bloom": "bigscience/bloom",
+    "Bloom-560m": "bigscience/bloom-560m",
+    "Flan-T5-XL": "google/flan-t5-xl",
+    "Flan-T5-Large": "google/flan-t5-large",
+    "GPT2": "gpt2",
+    "GPT2-XL": "gpt2-xl",
+    "GPT-Neo": "EleutherAI/gpt-neo-1.3B"
+}
+
+DEFAULT_FALLBACK_MODEL = "gpt2"
+HF_MAX_NEW_TOKENS = 512
+
+
+def local_system_prompt(language):
+    return f"""You are DeepSeek, an expert AI coding assistant specialized in {language}.
+        Provide concise, correct solutions with strategic print statements for debugging.
+        When generating code solutions, prioritize writing in {language} unless specifically asked otherwise.
+        Break down complex problems step-by-step with clear explanations.
+        Always respond in English and follow best practices for {language} development."""
+
+
+def hf_system_prompt(language):
+    return f"You are DeepSeek, an expert AI coding assistant specialized in {language}."
+
+
+def make_ollama_engine(model_name, temp, base_url, keep_alive=None):
+    with timed_import("langchain_ollama", deferred=True):
+        import httpcore
+        import httpx
+        from langchain_ollama import ChatOllama
+
+    return ChatOllama(
+        model=model_name,
+        base_url=base_url,
+        keep_alive=keep_alive,
+        temperature=temp,
+        num_ctx=get_context_length(model_name),
+        sync_client_kwargs={"transport": scoped_transport(httpx, httpcore)}
+    )
+
+
+def make_hf_session():
+    import httpcore2
+    import httpx2
+    from huggingface_hub.utils._http import hf_request_event_hook
+
+    return httpx2.Client(
+        event_hooks={"request": [hf_request_event_hook]},
+        follow_redirects=True,
+        timeout=None,
+        transport=scoped_transport(httpx2, httpcore2)
+    )
+
+
+@functools.cache
+def install_hf_session():
+    from huggingface_hub import set_client_factory
+
+    set_client_factory(make_hf_session)
+
+
+def make_hf_client(token=None):
+    with timed_import("huggingface_hub", deferred=True):
+        from huggingface_hub import InferenceClient
+
+    install_hf_session()
+    return RateLimitedClient(InferenceClient(token=token), hf_rate_limiter)
+
+
+def build_local_prompt_chain(language, query, history=(), summary="", references=""):
+    from langchain_core.messages import SystemMessage, HumanMessage
+    from langchain_core.prompts import ChatPromptTemplate
+    from prompt_builder import to_langchain_message
+
+    prompt_sequence = [SystemMessage(content=local_system_prompt(language))]
+    if references:
+        prompt_sequence.append(SystemMessage(content=references))
+    if summary:
+        prompt_sequence.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+    prompt_sequence.extend(message for message in map(to_langchain_message, history) if message is not None)
+    if query:
+        prompt_sequence.append(HumanMessage(content=query))
+    return ChatPromptTemplate.from_messages(prompt_sequence)
+
+
+def build_hf_prompt(language, query, history=(), summary="", references=""):
+    conversation = hf_system_prompt(language) + "\n\n"
+    if references:
+        conversation += references + "\n\n"
+    if summary:
+        conversation += f"Summary of the earlier conversation:\n{summary}\n\n"
+
+    for msg in history:
+        if msg["role"] == "user":
+            conversation += f"User: {msg['content']}\n\n"
+        elif msg["role"] == "ai":
+            conversation += f"Assistant: {msg['content']}\n\n"
+
+    conversation += f"User: {query}\n\nAssistant:"
+    return conversation
+
+
+def get_processing_pipeline(prompt_chain, llm_engine):
+    from langchain_core.output_parsers import StrOutputParser
+
+    return prompt_chain | llm_engine | StrOutputParser()
+
+
+def generate_ai_response(prompt_chain, llm_engine):
+    processing_pipeline = get_processing_pipeline(prompt_chain, llm_engine)
+
+    def run():
+        yield processing_pipeline.invoke({})
+
+    return run()
+
+
+def stream_ai_response(prompt_chain, llm_engine):
+    return get_processing_pipeline(prompt_chain, llm_engine).stream({})
+
+
+def complete_with_ollama(prompt_chain, model_name, llm_engines, pool=ollama_pool):
+    return pool.call(model_name, lambda base_url: get_processing_pipeline(prompt_chain, llm_engines[base_url]).invoke({}))
+
+
+def format_hf_error(error):
+    return f"""
+I'm sorry, I encountered an error generating a response: {str(error)}
+
+This could be due to:
+1. The model being unavailable on Hugging Face
+2. Missing or invalid HF_TOKEN
+3. Network connectivity issues
+4. Rate limiting on the Hugging Face API
+
+Please try:
+- Selecting a different model
+- Checking your HF_TOKEN in the .env file
+- Reducing the complexity of your query
+- Waiting a few minutes and trying again
+"""
+
+
+def request_hf_completion(client, conversation, model_id, temp):
+    return client.text_generation(
+        prompt=conversation,
+        model=model_id,
+        max_new_tokens=HF_MAX_NEW_TOKENS,
+        temperature=temp,
+        do_sample=True
+    )
+
+
+def route_hf_model(model_name, outcome):
+    model_id = HF_MODELS[model_name]
+    fallback_model = hf_router.choose_fallback(model_id, HF_MODELS.values(), default=DEFAULT_FALLBACK_MODEL)
+    if hf_router.allow(model_id):
+        return model_id, fallback_model
+
+    if fallback_model is not None:
+        outcome["warning"] = f"{model_name} is temporarily disabled after repeated errors. Using {fallback_model} instead."
+    return fallback_model, None
+
+
+def complete_with_hf(client, conversation, model_name, temp, outcome):
+    model_id, fallback_model = route_hf_model(model_name, outcome)
+    if model_id is None:
+        raise RuntimeError("All models are temporarily disabled after repeated errors")
+    if model_id != HF_MODELS[model_name]:
+        outcome["status"] = "fallback"
+    outcome["model"] = model_id
+
+    try:
+        return hf_router.call(model_id, lambda routed_id: request_hf_completion(client, conversation, routed_id, temp)).strip()
+    except Exception as e:
+        if fallback_model is None:
+            raise
+        outcome["warning"] = f"Error with primary model: {str(e)}. Trying fallback model..."
+        outcome["status"] = "fallback"
+        outcome["model"] = fallback_model
+        return hf_router.call(fallback_model, lambda routed_id: request_hf_completion(client, conversation, routed_id, temp)).strip()
+
+
+def generate_response_with_hf_api(client, conversation, model_name, temp, outcome=None):
+    if outcome is None:
+        outcome = {}
+    outcome["status"] = "ok"
+
+    try:
+        response = complete_with_hf(client, conversation, model_name, temp, outcome)
+    except Exception as e:
+        outcome["status"] = "error"
+        return format_hf_error(e)
+
+    if outcome["status"] == "fallback":
+        return response + "\n\n(Note: This response was generated using a fallback model)"
+    return response
+
+
+def stream_hf_tokens(client, conversation, model_id, temp):
+    options = {"reserved": True} if isinstance(client, RateLimitedClient) else {}
+    token_stream = client.text_generation(
+        prompt=conversation,
+        model=model_id,
+        max_new_tokens=HF_MAX_NEW_TOKENS,
+        temperature=temp,
+        do_sample=True,
+        stream=True,
+        **options
+    )
+
+    leading = True
+    for token in token_stream:
+        if leading:
+            token = token.lstrip()
+            if not token:
+                continue
+            leading = False
+        yield token
+
+
+def stream_response_with_hf_api(client, conversation, model_name, temp, outcome=None, hedging=True):
+    if outcome is None:
+        outcome = {}
+    outcome["status"] = "ok"
+
+    try:
+        model_id, fallback_model = route_hf_model(model_name, outcome)
+        if model_id is None:
+            raise RuntimeError("All models are temporarily disabled after repeated errors")
+    except Exception as e:
+        outcome["status"] = "error"
+        yield format_hf_error(e)
+        return
+
+    race = {}
+    received_tokens = False
+    try:
+        for token in hf_router.hedged_stream(
+            lambda routed_id: stream_hf_tokens(client, conversation, routed_id, temp),
+            model_id,
+            fallback_model,
+            deadline=None if hedging else 0,
+            report=race,
+            acquire=client.acquire if isinstance(client, RateLimitedClient) else None
+        ):
+            received_tokens = True
+            yield token
+    except Exception as e:
+        outcome["status"] = "error"
+        if received_tokens:
+            yield f"\n\n(Note: The response was interrupted: {str(e)})"
+        else:
+            yield format_hf_error(e)
+        return
+
+    if race["winner"] == HF_MODELS[model_name]:
+        return
+
+    outcome["status"] = "fallback"
+    if model_id in race["errors"]:
+        outcome["warning"] = f"Error with primary model: {str(race['errors'][model_id])}. Trying fallback model..."
+    elif race["hedged"]:
+        outcome.setdefault("warning", f"{model_name} had not started answering after {hf_router.hedge_deadline:.0f}s, "
+                                      f"so {race['winner']} answered instead.")
+    yield "\n\n(Note: This response was generated using a fallback model)"
+
+
+def generate_full_response(client, conversation, model_name, temp, outcome):
+    yield generate_response_with_hf_api(client, conversation, model_name, temp, outcome)
+
+
+def resolve_hf_model_name(model):
+    if model in HF_MODELS:
+        return model
+    for model_name, model_id in HF_MODELS.items():
+        if model_id == model:
+            return model_name
+    raise ValueError(f"Unknown Hugging Face model: {model}")
+
+
+class Generator:
+    def __init__(self, hf_token=None, keep_alive=None, pool=ollama_pool):
+        self.hf_token = hf_token if hf_token is not None else os.getenv("HF_TOKEN")
+        self.keep_alive = keep_alive
+        self.pool = pool
+        self.hf_client = None
+        self.engines = {}
+
+    def ollama_engines(self, model_name, temp):
+        engines = {}
+        for base_url in self.pool.urls:
+            key = (model_name, round(float(temp), 2), base_url)
+            if key not in self.engines:
+                self.engines[key] = make_ollama_engine(model_name, temp, base_url, self.keep_alive)
+            engines[base_url] = self.engines[key]
+        return engines
+
+    def client(self):
+        if self.hf_client is None:
+            self.hf_client = make_hf_client(self.hf_token)
+        return self.hf_client
+
+    def generate(self, prompt, backend="ollama", model=None, language="Python", temperature=0.3, history=()):
+        if language not in LANGUAGES:
+            raise ValueError(f"Unsupported language: {language}")
+
+        started = time.monotonic()
+        outcome = {"status": "ok"}
+        if backend == "ollama":
+            model = model or OLLAMA_MODELS[0]
+            outcome["model"] = model
+            prompt_chain = build_local_prompt_chain(language, prompt, history)
+            raw_response = complete_with_ollama(prompt_chain, model, self.ollama_engines(model, temperature), self.pool)
+        elif backend == "huggingface":
+            model_name = resolve_hf_model_name(model or "GPT2")
+            conversation = build_hf_prompt(language, prompt, history)
+            raw_response = complete_with_hf(self.client(), conversation, model_name, temperature, outcome)
+        else:
+            raise ValueError(f"Unknown backend: {backend}")
+
+        thinking, response = split_thinking(raw_response)
+        return {
+            "backend": backend,
+            "model": outcome["model"],
+            "language": language,
+            "temperature": temperature,
+            "status": outcome["status"],
+            "warning": outcome.get("warning"),
+            "thinking": thinking,
+            "response": response,
+            "elapsed_s": round(time.monotonic() - started, 3)
+        }
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cancellation import CancelScope, active_scope
+
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", "8"))
+HEARTBEAT_SECONDS = 0.25
+
+generation_executor = ThreadPoolExecutor(max_workers=GENERATION_WORKERS, thread_name_prefix="generation")
+
+
+class GenerationHandle:
+    def __init__(self, chunk_source, executor=generation_executor, on_done=None, state=None, gate=None):
+        self.chunk_source = chunk_source
+        self.executor = executor
+        self.on_done = on_done
+        self.finalized = False
+        self.state = state
+        self.started = False
+        self.future = None
+        self.created_at = time.monotonic()
+        self.first_chunk_at = None
+        self.finished_at = None
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.cancel_event = CancelScope()
+        self.condition = threading.Condition()
+        if gate is None:
+            self.start()
+        else:
+            gate(self)
+
+    def _claim_start(self):
+        with self.condition:
+            if self.started:
+                return False
+            self.started = True
+            return True
+
+    def start(self):
+        if self._claim_start():
+            self.future = self.executor.submit(self._run, self.chunk_source)
+
+    def fail(self, error):
+        if self._claim_start():
+            self.error = error
+            self._finish()
+
+    def _finish(self):
+        with self.condition:
+            self.finished_at = time.monotonic()
+            self.done = True
+            self.condition.notify_all()
+        if self.on_done is not None:
+            self.on_done(self)
+
+    def _run(self, chunk_source):
+        with active_scope(self.cancel_event):
+            self._generate(chunk_source)
+
+    def _generate(self, chunk_source):
+        stream = None
+        try:
+            stream = chunk_source() if callable(chunk_source) else chunk_source
+            for chunk in stream:
+                if self.cancel_event.is_set():
+                    break
+                if not chunk:
+                    continue
+                with self.condition:
+                    if self.first_chunk_at is None:
+                        self.first_chunk_at = time.monotonic()
+                    self.chunks.append(chunk)
+                    self.condition.notify_all()
+        except Exception as e:
+            if not self.cancel_event.is_set():
+                self.error = e
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+            self._finish()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+        if self._claim_start():
+            self._finish()
+
+    def wait(self, timeout=None):
+        with self.condition:
+            self.condition.wait_for(lambda: self.done, timeout)
+            return self.done
+
+    def claim_finalization(self):
+        with self.condition:
+            if self.finalized:
+                return False
+            self.finalized = True
+            return True
+
+    def text(self):
+        with self.condition:
+            return "".join(self.chunks)
+
+    def iter_chunks(self, heartbeat_seconds=HEARTBEAT_SECONDS):
+        index = 0
+        while True:
+            with self.condition:
+                if index >= len(self.chunks) and not self.done:
+                    self.condition.wait(heartbeat_seconds)
+                available = self.chunks[index:]
+                finished = self.done
+
+            if available:
+                index += len(available)
+                yield from available
+            elif finished:
+                return
+            else:
+                yield None
@@ -0,0 +1,181 @@
+import os
+import sys
+import threading
+import weakref
+import zlib
+
+from rendering import HISTORY_PAGE_SIZE
+
+COMPRESS_THRESHOLD_BYTES = int(os.getenv("MESSAGE_COMPRESS_THRESHOLD_BYTES", "2048"))
+COMPRESS_KEEP_RECENT = int(os.getenv("MESSAGE_COMPRESS_KEEP_RECENT", str(HISTORY_PAGE_SIZE)))
+SESSION_MEMORY_CAP_BYTES = int(os.getenv("SESSION_MEMORY_CAP_BYTES", str(2 * 1024 * 1024)))
+COMPRESSION_LEVEL = 6
+
+
+class MessageRecord:
+    __slots__ = ("role", "_content", "compressed", "timings")
+
+    def __init__(self, role, content, timings=None):
+        self.role = sys.intern(role)
+        self._content = content
+        self.compressed = False
+        self.timings = tuple((sys.intern(name), duration) for name, duration in timings) if timings else None
+
+    @classmethod
+    def from_dict(cls, message):
+        if isinstance(message, cls):
+            return message
+        return cls(message["role"], message["content"], message.get("timings"))
+
+    @property
+    def content(self):
+        if self.compressed:
+            return zlib.decompress(self._content).decode("utf-8")
+        return self._content
+
+    def compress(self, threshold=COMPRESS_THRESHOLD_BYTES):
+        if self.compressed or len(self._content) < threshold:
+            return 0
+        raw = self._content.encode("utf-8")
+        packed = zlib.compress(raw, COMPRESSION_LEVEL)
+        if len(packed) >= len(raw):
+            return 0
+        saved = sys.getsizeof(self._content) - sys.getsizeof(packed)
+        self._content = packed
+        self.compressed = True
+        return saved
+
+    def nbytes(self):
+        size = sys.getsizeof(self) + sys.getsizeof(self._content)
+        if self.timings:
+            size += sys.getsizeof(self.timings) + sum(sys.getsizeof(span) + sys.getsizeof(span[1]) for span in self.timings)
+        return size
+
+    def __getitem__(self, key):
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        if key == "timings" and self.timings is not None:
+            return self.timings
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def items(self):
+        yield "role", self.role
+        yield "content", self.content
+        if self.timings is not None:
+            yield "timings", self.timings
+
+    def __repr__(self):
+        state = "compressed" if self.compressed else "plain"
+        return f"MessageRecord({self.role!r}, {state}, {self.nbytes()} bytes)"
+
+
+class MessageLog(list):
+    pass
+
+
+def message_nbytes(message):
+    if isinstance(message, MessageRecord):
+        return message.nbytes()
+    return sys.getsizeof(message) + sum(sys.getsizeof(value) for value in message.values())
+
+
+def log_nbytes(message_log):
+    return sys.getsizeof(message_log) + sum(message_nbytes(message) for message in list(message_log))
+
+
+def compress_older(message_log, keep_recent=COMPRESS_KEEP_RECENT, threshold=COMPRESS_THRESHOLD_BYTES):
+    saved = 0
+    for message in message_log[:max(len(message_log) - keep_recent, 0)]:
+        if isinstance(message, MessageRecord):
+            saved += message.compress(threshold)
+    return saved
+
+
+def evictable_prefix(message_log, limit, cap=SESSION_MEMORY_CAP_BYTES):
+    excess = log_nbytes(message_log) - cap
+    count = 0
+    while excess > 0 and count < limit:
+        excess -= message_nbytes(message_log[count])
+        count += 1
+    return count
+
+
+class SessionMemory:
+    def __init__(self, cap_bytes=SESSION_MEMORY_CAP_BYTES):
+        self.cap_bytes = cap_bytes
+        self.logs = weakref.WeakValueDictionary()
+        self.lock = threading.Lock()
+        self.compressed_bytes_saved = 0
+        self.evicted_messages = 0
+
+    def track(self, session_id, message_log):
+        if not isinstance(message_log, MessageLog):
+            message_log = MessageLog(MessageRecord.from_dict(message) for message in message_log)
+        with self.lock:
+            self.logs[session_id] = message_log
+        return message_log
+
+    def record_compression(self, saved):
+        with self.lock:
+            self.compressed_bytes_saved += saved
+
+    def record_eviction(self, count):
+        with self.lock:
+            self.evicted_messages += count
+
+    def session_bytes(self, session_id):
+        with self.lock:
+            message_log = self.logs.get(session_id)
+        return log_nbytes(message_log) if message_log is not None else 0
+
+    def report(self, top=10):
+        with self.lock:
+            logs = list(self.logs.items())
+            compressed_bytes_saved = self.compressed_bytes_saved
+            evicted_messages = self.evicted_messages
+
+        sessions = []
+        for session_id, message_log in logs:
+            messages = list(message_log)
+            sessions.append({
+                "session": session_id[:8],
+                "messages": len(messages),
+                "compressed": sum(1 for message in messages if getattr(message, "compressed", False)),
+                "bytes": log_nbytes(messages)
+            })
+        sessions.sort(key=lambda session: session["bytes"], reverse=True)
+        total = sum(session["bytes"] for session in sessions)
+        return {
+            "sessions": len(sessions),
+            "total_bytes": total,
+            "mean_bytes_per_session": round(total / len(sessions)) if sessions else 0,
+            "cap_bytes_per_session": self.cap_bytes,
+            "compressed_bytes_saved": compressed_bytes_saved,
+            "evicted_messages": evicted_messages,
+            "largest": sessions[:top]
+        }
+
+    def prometheus_lines(self):
+        report = self.report(top=0)
+        return [
+            "# HELP genai_sessions Streamlit sessions holding chat history",
+            "# TYPE genai_sessions gauge",
+            f"genai_sessions {report['sessions']}",
+            "# HELP genai_session_memory_bytes Approximate bytes of chat history held in memory",
+            "# TYPE genai_session_memory_bytes gauge",
+            f"genai_session_memory_bytes {report['total_bytes']}",
+            "# HELP genai_evicted_messages_total Messages evicted from memory to the conversation store",
+            "# TYPE genai_evicted_messages_total counter",
+            f"genai_evicted_messages_total {report['evicted_messages']}"
+        ]
+
+
+session_memory = SessionMemory()
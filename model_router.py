@@ -0,0 +1,247 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from statistics import median
+
+from cancellation import CancelScope, active_scope, current_scope
+from rate_limit import RateLimitTimeout
+
+ROUTER_WINDOW = int(os.getenv("HF_ROUTER_WINDOW", "50"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("HF_CIRCUIT_FAILURE_THRESHOLD", "3"))
+CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("HF_CIRCUIT_COOLDOWN_SECONDS", "60"))
+HEDGE_DEADLINE_SECONDS = float(os.getenv("HF_HEDGE_DEADLINE_SECONDS", "8"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="hf-hedge")
+
+
+class ModelHealth:
+    def __init__(self, window):
+        self.latencies = deque(maxlen=window)
+        self.results = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = None
+
+    @property
+    def p50(self):
+        return median(self.latencies) if self.latencies else None
+
+    @property
+    def p95(self):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    @property
+    def error_rate(self):
+        return self.results.count(False) / len(self.results) if self.results else 0.0
+
+
+class ModelRouter:
+    def __init__(self, window=ROUTER_WINDOW, failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+                 cooldown=CIRCUIT_COOLDOWN_SECONDS, hedge_deadline=HEDGE_DEADLINE_SECONDS, executor=hedge_executor):
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.hedge_deadline = hedge_deadline
+        self.executor = executor
+        self.models = {}
+        self.lock = threading.Lock()
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def _health(self, model_id):
+        if model_id not in self.models:
+            self.models[model_id] = ModelHealth(self.window)
+        return self.models[model_id]
+
+    def allow(self, model_id):
+        with self.lock:
+            health = self._health(model_id)
+            if health.state == OPEN and time.monotonic() - health.opened_at >= self.cooldown:
+                health.state = HALF_OPEN
+            return health.state != OPEN
+
+    def record_success(self, model_id, latency):
+        with self.lock:
+            health = self._health(model_id)
+            health.latencies.append(latency)
+            health.results.append(True)
+            health.consecutive_failures = 0
+            health.state = CLOSED
+
+    def record_latency(self, model_id, latency):
+        with self.lock:
+            self._health(model_id).latencies.append(latency)
+
+    def record_failure(self, model_id):
+        with self.lock:
+            health = self._health(model_id)
+            health.results.append(False)
+            health.consecutive_failures += 1
+            if health.state == HALF_OPEN or health.consecutive_failures >= self.failure_threshold:
+                health.state = OPEN
+                health.opened_at = time.monotonic()
+
+    def choose_fallback(self, primary, candidates, default=None):
+        ranked = []
+        for order, model_id in enumerate(dict.fromkeys(candidates)):
+            if model_id == primary or not self.allow(model_id):
+                continue
+            with self.lock:
+                health = self._health(model_id)
+                p50 = health.p50
+                ranked.append((health.error_rate, p50 if p50 is not None else float("inf"), model_id != default, order, model_id))
+        return min(ranked)[-1] if ranked else None
+
+    def call(self, model_id, func):
+        started = time.monotonic()
+        try:
+            result = func(model_id)
+        except RateLimitTimeout:
+            raise
+        except Exception:
+            self.record_failure(model_id)
+            raise
+        self.record_success(model_id, time.monotonic() - started)
+        return result
+
+    def _pump(self, model_id, make_stream, events, cancel_event):
+        with active_scope(cancel_event):
+            self._pump_scoped(model_id, make_stream, events, cancel_event)
+
+    def _pump_scoped(self, model_id, make_stream, events, cancel_event):
+        started = time.monotonic()
+        first_token_at = None
+        stream = None
+        if cancel_event.is_set():
+            events.put((model_id, None, None))
+            return
+        try:
+            stream = make_stream(model_id)
+            for token in stream:
+                if cancel_event.is_set():
+                    break
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                events.put((model_id, token, None))
+        except RateLimitTimeout as e:
+            events.put((model_id, None, e))
+            return
+        except Exception as e:
+            if not cancel_event.is_set():
+                self.record_failure(model_id)
+                events.put((model_id, None, e))
+                return
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                try:
+                    close()
+                except Exception:
+                    pass
+
+        if cancel_event.is_set():
+            if first_token_at is None:
+                self.record_latency(model_id, time.monotonic() - started)
+            events.put((model_id, None, None))
+            return
+        self.record_success(model_id, (first_token_at or time.monotonic()) - started)
+        events.put((model_id, None, None))
+
+    def hedged_stream(self, make_stream, primary, fallback=None, deadline=None, report=None, acquire=None):
+        deadline = self.hedge_deadline if deadline is None else deadline
+        report = {} if report is None else report
+        report.update({"winner": None, "hedged": False, "errors": {}})
+        events = queue.Queue()
+        cancel_events = {}
+        hedging = deadline > 0
+
+        def launch(model_id):
+            cancel_events[model_id] = CancelScope(current_scope())
+            self.executor.submit(self._pump, model_id, make_stream, events, cancel_events[model_id])
+
+        if acquire is not None:
+            acquire(True)
+        launch(primary)
+        started = time.monotonic()
+        try:
+            while True:
+                can_hedge = hedging and report["winner"] is None and fallback is not None and fallback not in cancel_events
+                timeout = max(started + deadline - time.monotonic(), 0) if can_hedge else None
+                try:
+                    model_id, token, error = events.get(timeout=timeout)
+                except queue.Empty:
+                    if not self.allow(fallback):
+                        fallback = None
+                    elif acquire is None or acquire(False):
+                        with self.lock:
+                            self.hedges += 1
+                        report["hedged"] = True
+                        launch(fallback)
+                    else:
+                        hedging = False
+                    continue
+
+                if report["winner"] is not None and model_id != report["winner"]:
+                    continue
+
+                if error is not None:
+                    report["errors"][model_id] = error
+                    if report["winner"] == model_id:
+                        raise error
+                    if fallback is not None and fallback not in cancel_events and self.allow(fallback):
+                        with self.lock:
+                            self.failovers += 1
+                        if acquire is not None:
+                            acquire(True)
+                        launch(fallback)
+                    elif len(report["errors"]) == len(cancel_events):
+                        raise error
+                    continue
+
+                if report["winner"] is None:
+                    report["winner"] = model_id
+                    if report["hedged"] and model_id != primary:
+                        with self.lock:
+                            self.hedge_wins += 1
+                    for other, cancel_event in cancel_events.items():
+                        if other != model_id:
+                            cancel_event.set()
+
+                if token is None:
+                    return
+                yield token
+        finally:
+            for cancel_event in cancel_events.values():
+                cancel_event.set()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "failovers": self.failovers,
+                "models": {
+                    model_id: {
+                        "circuit": health.state,
+                        "p50_first_token_s": round(health.p50, 3) if health.p50 is not None else None,
+                        "p95_first_token_s": round(health.p95, 3) if health.p95 is not None else None,
+                        "error_rate": round(health.error_rate, 3),
+                        "samples": len(health.results)
+                    }
+                    for model_id, health in self.models.items()
+                }
+            }
+
+
+hf_router = ModelRouter()
@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from admission import ollama_admission
+
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_PRELOAD_MODELS = [model for model in os.getenv("OLLAMA_PRELOAD_MODELS", "deepseek-r1:1.5b,deepseek-r1:3b").split(",") if model]
+KEEPALIVE_INTERVAL_SECONDS = float(os.getenv("OLLAMA_KEEPALIVE_INTERVAL_SECONDS", "60"))
+WARMUP_TIMEOUT_SECONDS = 300
+STATUS_TIMEOUT_SECONDS = 2
+
+COLD = "cold"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+STATE_ICONS = {COLD: "⚪", LOADING: "🟡", READY: "🟢", FAILED: "🔴"}
+
+
+class ModelWarmer:
+    def __init__(self, base_url, models=OLLAMA_PRELOAD_MODELS, keep_alive=OLLAMA_KEEP_ALIVE,
+                 interval=KEEPALIVE_INTERVAL_SECONDS):
+        self.base_url = base_url.rstrip("/")
+        self.keep_alive = keep_alive
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.states = {model: COLD for model in models}
+        self.errors = {}
+        self.expires = {}
+        self.load_seconds = {}
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="model-warmup")
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _post(self, path, payload, timeout):
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read() or b"{}")
+
+    def _get(self, path, timeout):
+        with urllib.request.urlopen(self.base_url + path, timeout=timeout) as response:
+            return json.loads(response.read() or b"{}")
+
+    def _load(self, model):
+        started = time.monotonic()
+        try:
+            ollama_admission.run(
+                "model-warmup",
+                self._post,
+                "/api/generate",
+                {"model": model, "keep_alive": self.keep_alive},
+                WARMUP_TIMEOUT_SECONDS
+            )
+        except Exception as e:
+            with self.lock:
+                self.states[model] = FAILED
+                self.errors[model] = str(e)
+        else:
+            with self.lock:
+                self.states[model] = READY
+                self.errors.pop(model, None)
+                self.load_seconds[model] = time.monotonic() - started
+        finally:
+            with self.lock:
+                self.pending.pop(model, None)
+
+    def warm(self, model, force=False):
+        with self.lock:
+            if model in self.pending:
+                return self.pending[model]
+            if self.states.get(model) == READY and not force:
+                return None
+            self.states[model] = LOADING
+            self.pending[model] = self.executor.submit(self._load, model)
+            return self.pending[model]
+
+    def preload(self):
+        for model in list(self.states):
+            self.warm(model)
+        self.start()
+
+    def refresh(self):
+        try:
+            loaded = {entry["name"]: entry.get("expires_at") for entry in self._get("/api/ps", STATUS_TIMEOUT_SECONDS).get("models", [])}
+        except Exception:
+            return set()
+
+        with self.lock:
+            for model in self.states:
+                if model in self.pending:
+                    continue
+                if model in loaded:
+                    self.states[model] = READY
+                    self.expires[model] = loaded[model]
+                elif self.states[model] == READY:
+                    self.states[model] = COLD
+                    self.expires.pop(model, None)
+            return {model for model in self.states if model in loaded and model not in self.pending}
+
+    def _touch(self, model):
+        try:
+            ollama_admission.run(
+                "model-keepalive",
+                self._post,
+                "/api/generate",
+                {"model": model, "keep_alive": self.keep_alive},
+                STATUS_TIMEOUT_SECONDS
+            )
+        except Exception:
+            pass
+
+    def _keepalive_loop(self):
+        while not self.stop_event.wait(self.interval):
+            for model in self.refresh():
+                self._touch(model)
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._keepalive_loop, name="model-keepalive", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def status(self):
+        with self.lock:
+            return {
+                model: {
+                    "state": state,
+                    "expires_at": self.expires.get(model),
+                    "load_seconds": round(self.load_seconds[model], 2) if model in self.load_seconds else None,
+                    "error": self.errors.get(model)
+                }
+                for model, state in self.states.items()
+            }
+
+    def status_lines(self):
+        lines = []
+        for model, info in self.status().items():
+            detail = info["state"]
+            if info["state"] == READY and info["load_seconds"] is not None:
+                detail += f" · warmed in {info['load_seconds']:.1f}s"
+            elif info["state"] == FAILED:
+                detail += f" · {info['error']}"
+            lines.append(f"{STATE_ICONS[info['state']]} `{model}` — {detail}")
+        return lines
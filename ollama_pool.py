@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+import time
+import urllib.request
+
+from cancellation import cancelled
+
+OLLAMA_HOSTS = [host.strip().rstrip("/") for host in os.getenv("OLLAMA_HOSTS", "http://localhost:11434").split(",") if host.strip()]
+PROBE_INTERVAL_SECONDS = float(os.getenv("OLLAMA_PROBE_INTERVAL_SECONDS", "10"))
+PROBE_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_PROBE_TIMEOUT_SECONDS", "2"))
+FAILURE_THRESHOLD = int(os.getenv("OLLAMA_FAILURE_THRESHOLD", "2"))
+AFFINITY_WEIGHT = float(os.getenv("OLLAMA_AFFINITY_WEIGHT", "1"))
+LATENCY_SMOOTHING = 0.3
+
+
+class NoHealthyHost(RuntimeError):
+    pass
+
+
+class OllamaHost:
+    def __init__(self, url):
+        self.url = url
+        self.healthy = True
+        self.outstanding = 0
+        self.latency = None
+        self.loaded_models = set()
+        self.failures = 0
+        self.last_error = None
+        self.last_probe = None
+
+    def score(self, model):
+        penalty = 0 if model in self.loaded_models else AFFINITY_WEIGHT
+        return self.outstanding + penalty, self.latency if self.latency is not None else float("inf")
+
+
+class OllamaPool:
+    def __init__(self, urls=OLLAMA_HOSTS, probe_interval=PROBE_INTERVAL_SECONDS, probe_timeout=PROBE_TIMEOUT_SECONDS,
+                 failure_threshold=FAILURE_THRESHOLD):
+        self.hosts = [OllamaHost(url) for url in urls]
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.failure_threshold = failure_threshold
+        self.lock = threading.Lock()
+        self.routed = 0
+        self.failovers = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def urls(self):
+        return [host.url for host in self.hosts]
+
+    def _record_failure(self, host, error):
+        host.failures += 1
+        host.last_error = str(error)
+        if host.failures >= self.failure_threshold:
+            host.healthy = False
+
+    def probe(self, host):
+        started = time.monotonic()
+        try:
+            with urllib.request.urlopen(host.url + "/api/ps", timeout=self.probe_timeout) as response:
+                loaded = json.loads(response.read() or b"{}").get("models", [])
+        except Exception as e:
+            with self.lock:
+                host.last_probe = time.time()
+                self._record_failure(host, e)
+            return False
+
+        elapsed = time.monotonic() - started
+        with self.lock:
+            host.last_probe = time.time()
+            host.latency = elapsed if host.latency is None else host.latency + LATENCY_SMOOTHING * (elapsed - host.latency)
+            host.loaded_models = {entry.get("name") or entry.get("model") for entry in loaded}
+            host.failures = 0
+            host.last_error = None
+            host.healthy = True
+        return True
+
+    def probe_all(self):
+        for host in self.hosts:
+            self.probe(host)
+
+    def _probe_loop(self):
+        while True:
+            self.probe_all()
+            if self.stop_event.wait(self.probe_interval):
+                return
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._probe_loop, name="ollama-probe", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def acquire(self, model, exclude=()):
+        with self.lock:
+            remaining = [host for host in self.hosts if host.url not in exclude]
+            if not remaining:
+                raise NoHealthyHost(f"No healthy Ollama host available for {model}")
+            candidates = [host for host in remaining if host.healthy] or remaining
+            host = min(candidates, key=lambda candidate: candidate.score(model))
+            host.outstanding += 1
+            self.routed += 1
+            return host
+
+    def release(self, host, model, error=None):
+        with self.lock:
+            host.outstanding -= 1
+            if error is None:
+                host.failures = 0
+                host.loaded_models.add(model)
+            else:
+                self._record_failure(host, error)
+
+    def stream(self, model, make_stream):
+        tried = set()
+        while True:
+            host = self.acquire(model, exclude=tried)
+            tried.add(host.url)
+            started = False
+            stream = None
+            try:
+                stream = make_stream(host.url)
+                for chunk in stream:
+                    started = True
+                    yield chunk
+            except GeneratorExit:
+                self.release(host, model)
+                raise
+            except Exception as e:
+                if cancelled():
+                    self.release(host, model)
+                    raise
+                self.release(host, model, e)
+                if started or len(tried) >= len(self.hosts):
+                    raise
+                with self.lock:
+                    self.failovers += 1
+                continue
+            finally:
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
+            self.release(host, model)
+            return
+
+    def call(self, model, func):
+        tried = set()
+        while True:
+            host = self.acquire(model, exclude=tried)
+            tried.add(host.url)
+            try:
+                result = func(host.url)
+            except Exception as e:
+                self.release(host, model, e)
+                if len(tried) >= len(self.hosts):
+                    raise
+                with self.lock:
+                    self.failovers += 1
+                continue
+            self.release(host, model)
+            return result
+
+    def stats(self):
+        with self.lock:
+            return {
+                "routed": self.routed,
+                "failovers": self.failovers,
+                "hosts": {
+                    host.url: {
+                        "healthy": host.healthy,
+                        "outstanding": host.outstanding,
+                        "latency_ms": round(host.latency * 1000, 1) if host.latency is not None else None,
+                        "loaded_models": sorted(host.loaded_models),
+                        "last_error": host.last_error
+                    }
+                    for host in self.hosts
+                }
+            }
+
+
+ollama_pool = OllamaPool()
@@ -0,0 +1,51 @@
+def to_langchain_message(msg):
+    from langchain_core.messages import AIMessage, HumanMessage
+
+    if msg["role"] == "user":
+        return HumanMessage(content=msg["content"])
+    if msg["role"] == "ai":
+        return AIMessage(content=msg["content"])
+    return None
+
+
+UNCONVERTED = object()
+
+
+class PromptHistory:
+    def __init__(self):
+        self.sources = []
+        self.messages = []
+        self.converted_from = 0
+
+    def rebuild(self, message_log):
+        self.sources = []
+        self.messages = []
+        self.converted_from = 0
+        self.extend(message_log)
+
+    def extend(self, entries):
+        for msg in entries:
+            self.sources.append(msg)
+            self.messages.append(UNCONVERTED)
+
+    def sync(self, message_log):
+        synced = len(self.sources)
+        if synced > len(message_log) or (synced and message_log[synced - 1] is not self.sources[-1]):
+            self.rebuild(message_log)
+        else:
+            self.extend(message_log[synced:])
+        return self.messages
+
+    def tail(self, message_log, count):
+        messages = self.sync(message_log)
+        if count <= 0:
+            return []
+
+        first = max(len(messages) - count, 0)
+        for index in range(self.converted_from, first):
+            messages[index] = UNCONVERTED
+        for index in range(first, len(messages)):
+            if messages[index] is UNCONVERTED:
+                messages[index] = to_langchain_message(self.sources[index])
+        self.converted_from = first
+        return [message for message in messages[first:] if message is not None]
@@ -0,0 +1,183 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from itertools import count
+
+HF_RATE_LIMIT_PER_MINUTE = float(os.getenv("HF_RATE_LIMIT_PER_MINUTE", "30"))
+HF_RATE_LIMIT_BURST = int(os.getenv("HF_RATE_LIMIT_BURST", "5"))
+HF_RATE_LIMIT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("HF_RATE_LIMIT_QUEUE_TIMEOUT_SECONDS", "120"))
+HF_MAX_RETRIES = int(os.getenv("HF_MAX_RETRIES", "4"))
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 30.0
+RETRYABLE_STATUS_CODES = {429, 503}
+
+
+class RateLimitTimeout(TimeoutError):
+    pass
+
+
+def response_status(error):
+    return getattr(getattr(error, "response", None), "status_code", None)
+
+
+def retry_after_seconds(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_seconds(attempt, base=RETRY_BASE_SECONDS, cap=RETRY_MAX_SECONDS):
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute=HF_RATE_LIMIT_PER_MINUTE, capacity=HF_RATE_LIMIT_BURST,
+                 queue_timeout=HF_RATE_LIMIT_QUEUE_TIMEOUT_SECONDS):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, capacity)
+        self.queue_timeout = queue_timeout
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.condition = threading.Condition()
+        self.sequence = count()
+        self.waiting = deque()
+        self.acquired = 0
+        self.throttled = 0
+        self.retries = 0
+        self.timeouts = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _ready_in(self, now):
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else None
+
+    def acquire(self, timeout=None):
+        timeout = self.queue_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        ticket = next(self.sequence)
+
+        with self.condition:
+            self.waiting.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    ready_in = self._ready_in(now)
+                    if self.waiting[0] == ticket and ready_in == 0:
+                        self.tokens -= 1
+                        self.acquired += 1
+                        return
+                    if now >= deadline:
+                        self.timeouts += 1
+                        raise RateLimitTimeout(f"Waited {timeout:.0f}s for Hugging Face API capacity")
+                    wait = deadline - now
+                    if self.waiting[0] == ticket and ready_in is not None:
+                        wait = min(wait, ready_in)
+                    self.condition.wait(wait)
+            finally:
+                self.waiting.remove(ticket)
+                self.condition.notify_all()
+
+    def try_acquire(self):
+        with self.condition:
+            now = time.monotonic()
+            self._refill(now)
+            if self.waiting or self._ready_in(now) != 0:
+                return False
+            self.tokens -= 1
+            self.acquired += 1
+            return True
+
+    def pause(self, seconds):
+        with self.condition:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = 0.0
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.throttled += 1
+            self.condition.notify_all()
+
+    def status(self):
+        with self.condition:
+            now = time.monotonic()
+            if not self.waiting:
+                return None
+            if now < self.paused_until:
+                return f"⏳ Hugging Face API is rate limiting; resuming in {self.paused_until - now:.0f}s ({len(self.waiting)} queued)"
+            return f"⏳ Waiting for Hugging Face API capacity ({len(self.waiting)} queued)"
+
+    def stats(self):
+        with self.condition:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                "tokens_available": round(self.tokens, 2),
+                "capacity": self.capacity,
+                "rate_per_minute": round(self.rate * 60, 2),
+                "queued": len(self.waiting),
+                "paused_for_s": round(max(self.paused_until - now, 0), 1),
+                "acquired": self.acquired,
+                "throttled": self.throttled,
+                "retries": self.retries,
+                "timeouts": self.timeouts
+            }
+
+
+class RateLimitedClient:
+    def __init__(self, client, bucket, max_retries=HF_MAX_RETRIES):
+        self.client = client
+        self.bucket = bucket
+        self.max_retries = max_retries
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def acquire(self, blocking=True):
+        if not blocking:
+            return self.bucket.try_acquire()
+        self.bucket.acquire()
+        return True
+
+    def text_generation(self, *args, reserved=False, **kwargs):
+        attempt = 0
+        while True:
+            if not reserved or attempt > 0:
+                self.bucket.acquire()
+            try:
+                return self.client.text_generation(*args, **kwargs)
+            except Exception as e:
+                status = response_status(e)
+                if status not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                    raise
+                delay = retry_after_seconds(e)
+                if delay is None:
+                    delay = backoff_seconds(attempt)
+                with self.bucket.condition:
+                    self.bucket.retries += 1
+                if status == 429:
+                    self.bucket.pause(delay)
+                else:
+                    time.sleep(delay)
+                attempt += 1
+
+
+hf_rate_limiter = TokenBucket()
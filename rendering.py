@@ -0,0 +1,204 @@
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+PREVIEW_INTERVAL_SECONDS = 0.05
+
+
+FENCE = "```"
+
+
+def trailing_backticks(text):
+    count = 0
+    while count < 2 and count < len(text) and text[-1 - count] == "`":
+        count += 1
+    return count
+
+
+def wrap_code(lang, code):
+    return f'\n\n<div class="code-block">\n\n{FENCE}{lang}\n{code}\n{FENCE}\n\n</div>\n\n'
+
+
+class CodeFenceFormatter:
+    def __init__(self):
+        self.state = "text"
+        self.pending = ""
+        self.text_parts = []
+        self.text_last_char = ""
+        self.header_parts = []
+        self.code_parts = []
+        self.lang = ""
+
+    def _add_text(self, piece, segments):
+        if not piece:
+            return
+        boundary = (self.text_last_char + piece).rfind("\n\n")
+        if boundary >= 0:
+            cut = boundary - len(self.text_last_char)
+            self.text_parts.append(piece[:cut + 2])
+            segments.append("".join(self.text_parts))
+            self.text_parts = [piece[cut + 2:]] if piece[cut + 2:] else []
+        else:
+            self.text_parts.append(piece)
+        self.text_last_char = piece[-1]
+
+    def _finish_text(self, segments):
+        text = "".join(self.text_parts)
+        if text:
+            segments.append(text)
+        self.text_parts = []
+        self.text_last_char = ""
+
+    def _start_code(self, header):
+        info = header.strip()
+        if info and not any(char.isspace() for char in info):
+            self.lang = info
+            self.code_parts = []
+        else:
+            self.lang = ""
+            self.code_parts = [header.lstrip() + "\n"] if info else []
+
+    def _finish_code(self, segments):
+        code = "".join(self.code_parts).strip("\n").rstrip()
+        segments.append(wrap_code(self.lang, code))
+        self.code_parts = []
+        self.lang = ""
+
+    def feed(self, chunk):
+        data = self.pending + chunk
+        self.pending = ""
+        segments = []
+        pos = 0
+
+        while pos < len(data):
+            if self.state == "text":
+                index = data.find(FENCE, pos)
+                if index < 0:
+                    keep = trailing_backticks(data[pos:])
+                    self._add_text(data[pos:len(data) - keep], segments)
+                    self.pending = data[len(data) - keep:]
+                    break
+                self._add_text(data[pos:index], segments)
+                self._finish_text(segments)
+                self.header_parts = []
+                self.state = "header"
+                pos = index + len(FENCE)
+
+            elif self.state == "header":
+                newline = data.find("\n", pos)
+                index = data.find(FENCE, pos)
+                if index >= 0 and (newline < 0 or index < newline):
+                    self.header_parts.append(data[pos:index])
+                    self.lang = ""
+                    self.code_parts = ["".join(self.header_parts)]
+                    self._finish_code(segments)
+                    self.state = "text"
+                    pos = index + len(FENCE)
+                elif newline >= 0:
+                    self.header_parts.append(data[pos:newline])
+                    self._start_code("".join(self.header_parts))
+                    self.state = "code"
+                    pos = newline + 1
+                else:
+                    keep = trailing_backticks(data[pos:])
+                    self.header_parts.append(data[pos:len(data) - keep])
+                    self.pending = data[len(data) - keep:]
+                    break
+
+            else:
+                index = data.find(FENCE, pos)
+                if index < 0:
+                    keep = trailing_backticks(data[pos:])
+                    self.code_parts.append(data[pos:len(data) - keep])
+                    self.pending = data[len(data) - keep:]
+                    break
+                self.code_parts.append(data[pos:index])
+                self._finish_code(segments)
+                self.state = "text"
+                pos = index + len(FENCE)
+
+        return segments
+
+    def preview(self):
+        if self.state == "text":
+            return "".join(self.text_parts) + self.pending
+        if self.state == "header":
+            return wrap_code("", "")
+        code = ("".join(self.code_parts) + self.pending).strip("\n").rstrip()
+        return wrap_code(self.lang, code)
+
+    def close(self):
+        segments = []
+        if self.state == "text":
+            self._add_text(self.pending, segments)
+            self._finish_text(segments)
+        elif self.state == "header":
+            self._start_code("".join(self.header_parts) + self.pending)
+            self._finish_code(segments)
+        else:
+            self.code_parts.append(self.pending)
+            self._finish_code(segments)
+        self.pending = ""
+        self.state = "text"
+        return segments
+
+
+def format_code_block(content):
+    formatter = CodeFenceFormatter()
+    return "".join(formatter.feed(content) + formatter.close())
+
+
+class RenderCache:
+    def __init__(self, formatter=format_code_block, max_bytes=RENDER_CACHE_MAX_BYTES):
+        self.formatter = formatter
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def entry_bytes(key, rendered):
+        return sys.getsizeof(key) + sys.getsizeof(rendered)
+
+    def get(self, content):
+        key = hashlib.sha256(content.encode("utf-8")).digest()
+        with self.lock:
+            rendered = self.entries.get(key)
+            if rendered is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return rendered
+
+        rendered = self.formatter(content)
+
+        with self.lock:
+            self.misses += 1
+            if key not in self.entries:
+                self.entries[key] = rendered
+                self.size += self.entry_bytes(key, rendered)
+            while self.size > self.max_bytes and len(self.entries) > 1:
+                evicted_key, evicted = self.entries.popitem(last=False)
+                self.size -= self.entry_bytes(evicted_key, evicted)
+        return rendered
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+
+render_cache = RenderCache()
+
+
+def render_message(content):
+    return render_cache.get(content)
+
+
+def visible_window(total_messages, pages_loaded, page_size=HISTORY_PAGE_SIZE):
+    visible = page_size * max(pages_loaded, 1)
+    return max(total_messages - visible, 0)
@@ -0,0 +1,366 @@
+import hashlib
+import io
+import mmap
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+
+import numpy as np
+
+from chunking import chunk_source, language_for_path
+from document_ingest import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, content_hash
+from retrieval import RETRIEVAL_TOP_K, RetrievalIndex
+
+REPOSITORY_INDEX_DIR = os.getenv("REPOSITORY_INDEX_DIR", os.path.join(".cache", "repositories"))
+REPOSITORY_MAX_FILE_BYTES = int(os.getenv("REPOSITORY_MAX_FILE_BYTES", str(1024 * 1024)))
+REPOSITORY_MAX_ARCHIVE_BYTES = int(os.getenv("REPOSITORY_MAX_ARCHIVE_BYTES", str(256 * 1024 * 1024)))
+REPOSITORY_ROOTS = [
+    os.path.realpath(root.strip()) for root in os.getenv("REPOSITORY_ROOTS", "").split(os.pathsep) if root.strip()
+]
+IGNORED_DIRECTORIES = {"node_modules", "__pycache__", "venv", "env", "build", "dist", "target", "vendor", "bin", "obj"}
+
+CHUNK_RECORD = np.dtype([
+    ("offset", "<u8"),
+    ("length", "<u4"),
+    ("file_id", "<u4"),
+    ("line_start", "<u4"),
+    ("line_end", "<u4")
+])
+
+
+class RepositoryError(Exception):
+    pass
+
+
+def resolve_local_root(path, roots=REPOSITORY_ROOTS):
+    resolved = os.path.realpath(path)
+    if not any(os.path.commonpath([resolved, root]) == root for root in roots):
+        raise RepositoryError(f"{path} is outside the allowed repository roots")
+    if not os.path.isdir(resolved):
+        raise RepositoryError(f"{path} is not a directory")
+    return resolved
+
+
+def extract_archive(source, name, uploads_dir=os.path.join(REPOSITORY_INDEX_DIR, "uploads")):
+    root = os.path.join(uploads_dir, content_hash(source)[:16])
+    if os.path.isdir(root):
+        return root
+
+    os.makedirs(uploads_dir, exist_ok=True)
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(source))
+    except zipfile.BadZipFile as e:
+        raise RepositoryError(f"Could not read {name} as a zip archive: {e}") from e
+
+    with archive:
+        if sum(info.file_size for info in archive.infolist()) > REPOSITORY_MAX_ARCHIVE_BYTES:
+            raise RepositoryError(f"{name} is larger than {REPOSITORY_MAX_ARCHIVE_BYTES // (1024 * 1024)} MB uncompressed")
+        staging = tempfile.mkdtemp(dir=uploads_dir, suffix=".partial")
+        try:
+            archive.extractall(staging)
+            os.replace(staging, root)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isdir(root):
+                raise
+    return root
+
+
+class ChunkStore:
+    def __init__(self, text_path, records_path):
+        self.text_path = text_path
+        self.records_path = records_path
+        self.view = (np.zeros(0, dtype=CHUNK_RECORD), b"")
+
+    def remap(self, chunk_count, text_bytes):
+        records = np.zeros(0, dtype=CHUNK_RECORD)
+        if chunk_count:
+            records = np.memmap(self.records_path, dtype=CHUNK_RECORD, mode="r", shape=(chunk_count,))
+        text = b""
+        if text_bytes:
+            with open(self.text_path, "rb") as f:
+                text = mmap.mmap(f.fileno(), text_bytes, access=mmap.ACCESS_READ)
+        self.view = (records, text)
+
+    def record(self, chunk):
+        return self.view[0][chunk]
+
+    def text(self, chunk):
+        records, text = self.view
+        offset = int(records[chunk]["offset"])
+        return text[offset:offset + int(records[chunk]["length"])].decode("utf-8")
+
+
+class RepositoryIndex:
+    def __init__(self, root, index_dir=None, chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                 max_file_bytes=REPOSITORY_MAX_FILE_BYTES):
+        self.root = os.path.abspath(root)
+        self.index_dir = index_dir or os.path.join(
+            REPOSITORY_INDEX_DIR, hashlib.sha256(self.root.encode("utf-8")).hexdigest()[:16]
+        )
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.max_file_bytes = max_file_bytes
+        self.lock = threading.Lock()
+        self.last_refresh = None
+        os.makedirs(self.index_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(
+            os.path.join(self.index_dir, "index.sqlite3"), check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                language TEXT NOT NULL,
+                first_chunk INTEGER NOT NULL,
+                chunk_count INTEGER NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+        with self.lock:
+            self._load()
+
+    def _meta(self):
+        meta = {"generation": 0, "segment": 0, "chunks": 0, "text_bytes": 0, "dead_chunks": 0}
+        meta.update(self.conn.execute("SELECT key, value FROM meta"))
+        return meta
+
+    def _save_meta(self, meta):
+        self.conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", meta.items())
+
+    def _segment_paths(self, segment):
+        base = os.path.join(self.index_dir, f"chunks-{segment}")
+        return base + ".txt", base + ".idx"
+
+    def _load(self):
+        meta = self._meta()
+        store = ChunkStore(*self._segment_paths(meta["segment"]))
+        store.remap(meta["chunks"], meta["text_bytes"])
+        retrieval_index = RetrievalIndex(text_loader=lambda chunk_meta: store.text(chunk_meta["chunk"]))
+        paths = {}
+        for file_id, path, first_chunk, chunk_count in self.conn.execute(
+            "SELECT id, path, first_chunk, chunk_count FROM files ORDER BY first_chunk"
+        ):
+            paths[file_id] = path
+            retrieval_index.add(file_id, (
+                {"chunk": chunk, "text": store.text(chunk)} for chunk in range(first_chunk, first_chunk + chunk_count)
+            ))
+        self.view = (retrieval_index, store, paths)
+        self.generation = meta["generation"]
+
+    def __len__(self):
+        return len(self.view[0])
+
+    def scan(self):
+        for directory, subdirectories, filenames in os.walk(self.root):
+            subdirectories[:] = sorted(
+                name for name in subdirectories if not name.startswith(".") and name not in IGNORED_DIRECTORIES
+            )
+            for filename in sorted(filenames):
+                path = os.path.join(directory, filename)
+                if language_for_path(filename) is not None and not os.path.islink(path):
+                    yield os.path.relpath(path, self.root).replace(os.sep, "/"), path
+
+    def _read_source(self, path, stat):
+        if stat is None or stat.st_size > self.max_file_bytes:
+            return None
+        with open(path, "rb") as f:
+            data = f.read()
+        return None if b"\0" in data[:8192] else data
+
+    def _append_chunks(self, text_file, records_file, meta, file_id, chunks):
+        records = np.zeros(len(chunks), dtype=CHUNK_RECORD)
+        for position, chunk in enumerate(chunks):
+            encoded = chunk["text"].encode("utf-8")
+            text_file.write(encoded)
+            records[position] = (meta["text_bytes"], len(encoded), file_id, chunk["line_start"], chunk["line_end"])
+            meta["text_bytes"] += len(encoded)
+        records_file.write(records.tobytes())
+        meta["chunks"] += len(chunks)
+
+    def _update_view(self, meta, dropped, added):
+        retrieval_index, store, paths = self.view
+        store.remap(meta["chunks"], meta["text_bytes"])
+        for file_id in dropped:
+            retrieval_index.remove(file_id)
+            paths.pop(file_id, None)
+        for file_id, relative_path, first_chunk, chunk_count in added:
+            paths[file_id] = relative_path
+            retrieval_index.add(file_id, (
+                {"chunk": chunk, "text": store.text(chunk)} for chunk in range(first_chunk, first_chunk + chunk_count)
+            ))
+        self.generation = meta["generation"]
+
+    def refresh(self, progress=None):
+        started = time.monotonic()
+        counts = {"unchanged": 0, "touched": 0, "indexed": 0, "removed": 0, "skipped": 0, "new_chunks": 0}
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                meta = self._meta()
+                if meta["generation"] != self.generation:
+                    self._load()
+                known = {
+                    row[1]: row for row in self.conn.execute(
+                        "SELECT id, path, size, mtime_ns, hash, chunk_count FROM files"
+                    )
+                }
+                files = list(self.scan())
+                dropped = []
+                added = []
+
+                text_path, records_path = self._segment_paths(meta["segment"])
+                with open(text_path, "ab") as text_file, open(records_path, "ab") as records_file:
+                    text_file.truncate(meta["text_bytes"])
+                    records_file.truncate(meta["chunks"] * CHUNK_RECORD.itemsize)
+
+                    for done, (relative_path, path) in enumerate(files, start=1):
+                        if progress is not None:
+                            progress(done, len(files))
+                        previous = known.pop(relative_path, None)
+                        try:
+                            stat = os.stat(path)
+                        except OSError:
+                            stat = None
+                        if previous is not None and stat is not None \
+                                and (previous[2], previous[3]) == (stat.st_size, stat.st_mtime_ns):
+                            counts["unchanged"] += 1
+                            continue
+
+                        data = self._read_source(path, stat)
+                        if data is None:
+                            counts["skipped"] += 1
+                            if previous is not None:
+                                known[relative_path] = previous
+                            continue
+
+                        digest = content_hash(data)
+                        if previous is not None and previous[4] == digest:
+                            self.conn.execute(
+                                "UPDATE files SET size = ?, mtime_ns = ? WHERE id = ?",
+                                (stat.st_size, stat.st_mtime_ns, previous[0])
+                            )
+                            counts["touched"] += 1
+                            continue
+
+                        lines = data.decode("utf-8", errors="replace").splitlines()
+                        chunks = list(chunk_source(lines, relative_path, self.chunk_tokens, self.overlap_tokens))
+                        row = (stat.st_size, stat.st_mtime_ns, digest, language_for_path(relative_path), meta["chunks"], len(chunks))
+                        if previous is not None:
+                            file_id = previous[0]
+                            dropped.append(file_id)
+                            meta["dead_chunks"] += previous[5]
+                            self.conn.execute(
+                                "UPDATE files SET size = ?, mtime_ns = ?, hash = ?, language = ?, first_chunk = ?, chunk_count = ? "
+                                "WHERE id = ?",
+                                row + (file_id,)
+                            )
+                        else:
+                            file_id = self.conn.execute(
+                                "INSERT INTO files (size, mtime_ns, hash, language, first_chunk, chunk_count, path) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                row + (relative_path,)
+                            ).lastrowid
+
+                        self._append_chunks(text_file, records_file, meta, file_id, chunks)
+                        added.append((file_id, relative_path, meta["chunks"] - len(chunks), len(chunks)))
+                        counts["indexed"] += 1
+                        counts["new_chunks"] += len(chunks)
+
+                for file_id, _, _, _, _, chunk_count in known.values():
+                    self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+                    dropped.append(file_id)
+                    meta["dead_chunks"] += chunk_count
+                    counts["removed"] += 1
+
+                if dropped or added:
+                    meta["generation"] += 1
+                    self._save_meta(meta)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+            self._update_view(meta, dropped, added)
+
+            if meta["dead_chunks"] > max(1024, meta["chunks"] // 2):
+                self._compact()
+
+            counts["files"] = len(files)
+            counts["seconds"] = round(time.monotonic() - started, 2)
+            self.last_refresh = counts
+            return counts
+
+    def _compact(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            meta = self._meta()
+            store = self.view[1]
+            old_paths = self._segment_paths(meta["segment"])
+            segment = meta["segment"] + 1
+            text_path, records_path = self._segment_paths(segment)
+            text_bytes = 0
+            chunk_count = 0
+            with open(text_path, "wb") as text_file, open(records_path, "wb") as records_file:
+                for file_id, first_chunk, count in self.conn.execute(
+                    "SELECT id, first_chunk, chunk_count FROM files ORDER BY first_chunk"
+                ).fetchall():
+                    records = np.array(store.view[0][first_chunk:first_chunk + count])
+                    for position in range(count):
+                        encoded = store.text(first_chunk + position).encode("utf-8")
+                        text_file.write(encoded)
+                        records["offset"][position] = text_bytes
+                        text_bytes += len(encoded)
+                    records_file.write(records.tobytes())
+                    self.conn.execute("UPDATE files SET first_chunk = ? WHERE id = ?", (chunk_count, file_id))
+                    chunk_count += count
+
+            meta.update(segment=segment, chunks=chunk_count, text_bytes=text_bytes, dead_chunks=0,
+                        generation=meta["generation"] + 1)
+            self._save_meta(meta)
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+        self._load()
+        for path in old_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def search(self, query, k=RETRIEVAL_TOP_K):
+        retrieval_index, store, paths = self.view
+        hits = retrieval_index.search(query, k)
+        for hit in hits:
+            record = store.record(hit.pop("chunk"))
+            hit.update(
+                name=paths.get(int(record["file_id"]), "?"),
+                line_start=int(record["line_start"]),
+                line_end=int(record["line_end"])
+            )
+        return hits
+
+    def stats(self):
+        meta = self._meta()
+        text_path, records_path = self._segment_paths(meta["segment"])
+        return {
+            "root": self.root,
+            "files": len(self.view[2]),
+            "chunks": meta["chunks"] - meta["dead_chunks"],
+            "dead_chunks": meta["dead_chunks"],
+            "mapped_bytes": sum(os.path.getsize(path) for path in (text_path, records_path) if os.path.exists(path)),
+            "terms": self.view[0].stats()["terms"],
+            "last_refresh": self.last_refresh
+        }
@@ -0,0 +1,68 @@
+import os
+
+import streamlit as st
+
+from repository_index import REPOSITORY_ROOTS, RepositoryError, RepositoryIndex, extract_archive, resolve_local_root
+
+
+@st.cache_resource
+def get_repository_index(root):
+    return RepositoryIndex(root)
+
+
+def index_repository(root):
+    repository_index = get_repository_index(os.path.abspath(root))
+    progress_bar = st.progress(0.0, text=f"Scanning {root}…")
+
+    def progress(done, total):
+        if done == total or done % max(total // 50, 1) == 0:
+            progress_bar.progress(done / total, text=f"Indexing {done}/{total} files")
+
+    try:
+        repository_index.refresh(progress)
+    finally:
+        progress_bar.empty()
+    st.session_state.repository_index = repository_index
+    return repository_index
+
+
+def render_repository_panel(allow_local_paths=True):
+    with st.expander("📁 Repository"):
+        root = ""
+        if allow_local_paths and REPOSITORY_ROOTS:
+            root = st.text_input("Local repository path", placeholder=REPOSITORY_ROOTS[0])
+        archive = st.file_uploader("Upload a repository .zip", type=["zip"])
+
+        try:
+            if archive is not None and archive.file_id != st.session_state.get("repository_source"):
+                st.session_state.repository_source = archive.file_id
+                index_repository(extract_archive(archive.getbuffer(), archive.name))
+            elif root and root != st.session_state.get("repository_source"):
+                st.session_state.repository_source = root
+                index_repository(resolve_local_root(root))
+        except (RepositoryError, OSError) as e:
+            st.session_state.repository_index = None
+            st.error(str(e))
+
+        repository_index = st.session_state.get("repository_index")
+        if repository_index is None:
+            return
+
+        refresh_column, detach_column = st.columns(2)
+        if refresh_column.button("🔄 Re-index changes"):
+            index_repository(repository_index.root)
+        if detach_column.button("✖️ Detach"):
+            st.session_state.repository_index = None
+            st.rerun()
+
+        repository_stats = repository_index.stats()
+        st.caption(
+            f"{os.path.basename(repository_stats['root'])} · {repository_stats['files']} files · "
+            f"{repository_stats['chunks']} chunks · {repository_stats['mapped_bytes'] / (1024 * 1024):.1f} MB mapped"
+        )
+        last_refresh = repository_stats["last_refresh"]
+        if last_refresh is not None:
+            st.caption(
+                f"Last scan {last_refresh['seconds']}s: {last_refresh['indexed']} re-indexed · "
+                f"{last_refresh['unchanged'] + last_refresh['touched']} unchanged · {last_refresh['removed']} removed"
+            )
@@ -0,0 +1,248 @@
+import os
+import re
+import threading
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from context_window import count_tokens, truncate_to_tokens
+
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "6"))
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "1024"))
+RETRIEVAL_CONTEXT_RATIO = float(os.getenv("RETRIEVAL_CONTEXT_RATIO", "0.3"))
+RETRIEVAL_VECTOR_WEIGHT = float(os.getenv("RETRIEVAL_VECTOR_WEIGHT", "0"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+RERANK_POOL = 50
+
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+CAMEL_BOUNDARY = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i if in is it its of on or so that the this to was "
+    "what when where which who why will with you your".split()
+)
+
+
+def tokenize(text):
+    terms = []
+    for identifier in IDENTIFIER_PATTERN.findall(text):
+        lowered = identifier.lower()
+        if lowered in STOPWORDS:
+            continue
+        terms.append(lowered)
+        if identifier == lowered and "_" not in identifier:
+            continue
+        parts = [part.lower() for piece in identifier.split("_") for part in CAMEL_BOUNDARY.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part not in STOPWORDS and len(part) > 1)
+    return terms
+
+
+class RetrievalIndex:
+    def __init__(self, k1=BM25_K1, b=BM25_B, vector_weight=RETRIEVAL_VECTOR_WEIGHT, embedder=None, text_loader=None):
+        self.k1 = k1
+        self.b = b
+        self.text_loader = text_loader
+        self.vector_weight = vector_weight
+        self.embedder = embedder
+        if vector_weight > 0 and embedder is None:
+            from semantic_cache import HashingEmbedder
+
+            self.embedder = HashingEmbedder()
+
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.texts = []
+        self.meta = []
+        self.lengths = []
+        self.vectors = []
+        self.alive = []
+        self.postings = {}
+        self.doc_freq = Counter()
+        self.sources = {}
+        self.alive_count = 0
+        self.total_length = 0
+        self._invalidate()
+
+    def __contains__(self, source_id):
+        return source_id in self.sources
+
+    def __len__(self):
+        return self.alive_count
+
+    def _invalidate(self):
+        self.arrays = {}
+        self.length_array = None
+        self.alive_array = None
+        self.vector_matrix = None
+
+    def _text(self, slot):
+        if self.text_loader is not None:
+            return self.text_loader(self.meta[slot])
+        return self.texts[slot]
+
+    def _add_one(self, text, meta, vector):
+        slot = len(self.texts)
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = (array("I"), array("f"))
+            postings[0].append(slot)
+            postings[1].append(tf)
+            self.doc_freq[term] += 1
+
+        length = sum(counts.values())
+        self.texts.append(text if self.text_loader is None else None)
+        self.meta.append(meta)
+        self.lengths.append(length)
+        self.alive.append(True)
+        if vector is not None:
+            self.vectors.append(vector)
+        self.total_length += length
+        self.alive_count += 1
+        return slot
+
+    def add(self, source_id, chunks):
+        with self.lock:
+            if source_id in self.sources:
+                self._remove(source_id)
+
+            slots = []
+            for chunk in chunks:
+                meta = {key: value for key, value in chunk.items() if key != "text"}
+                vector = self.embedder.embed([chunk["text"]])[0] if self.embedder is not None else None
+                slots.append(self._add_one(chunk["text"], meta, vector))
+            self.sources[source_id] = slots
+            self._invalidate()
+            return len(slots)
+
+    def _remove(self, source_id):
+        slots = self.sources.pop(source_id, [])
+        for slot in slots:
+            for term in set(tokenize(self._text(slot))):
+                self.doc_freq[term] -= 1
+                if self.doc_freq[term] <= 0:
+                    del self.doc_freq[term]
+            self.alive[slot] = False
+            self.total_length -= self.lengths[slot]
+            self.alive_count -= 1
+            self.texts[slot] = None
+        self._invalidate()
+        if len(self.texts) > 1024 and self.alive_count < len(self.texts) // 2:
+            self._compact()
+        return len(slots)
+
+    def remove(self, source_id):
+        with self.lock:
+            return self._remove(source_id)
+
+    def _compact(self):
+        entries = [
+            (source_id, [(self._text(slot), self.meta[slot], self.vectors[slot] if self.vectors else None) for slot in slots])
+            for source_id, slots in self.sources.items()
+        ]
+        self._reset()
+        for source_id, chunks in entries:
+            self.sources[source_id] = [self._add_one(text, meta, vector) for text, meta, vector in chunks]
+
+    def _term_arrays(self, term):
+        arrays = self.arrays.get(term)
+        if arrays is None:
+            slots, tfs = self.postings[term]
+            arrays = self.arrays[term] = (np.array(slots, dtype=np.int64), np.array(tfs, dtype=np.float32))
+        return arrays
+
+    def search(self, query, k=RETRIEVAL_TOP_K):
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        with self.lock:
+            terms = [term for term in query_terms if term in self.doc_freq]
+            if not terms or not self.alive_count:
+                return []
+
+            if self.length_array is None:
+                self.length_array = np.asarray(self.lengths, dtype=np.float32)
+                self.alive_array = np.asarray(self.alive, dtype=bool)
+            average_length = self.total_length / self.alive_count
+            norms = self.k1 * (1 - self.b + self.b * self.length_array / max(average_length, 1e-9))
+            scores = np.zeros(len(self.texts), dtype=np.float32)
+
+            for term in terms:
+                slots, tfs = self._term_arrays(term)
+                df = self.doc_freq[term]
+                idf = np.log(1 + (self.alive_count - df + 0.5) / (df + 0.5))
+                scores[slots] += idf * tfs * (self.k1 + 1) / (tfs + norms[slots])
+
+            scores[~self.alive_array] = 0
+            pool = min(RERANK_POOL if self.embedder is not None else k, int(np.count_nonzero(scores)))
+            if pool == 0:
+                return []
+            candidates = np.argpartition(-scores, pool - 1)[:pool]
+
+            if self.embedder is not None and self.vector_weight > 0:
+                if self.vector_matrix is None:
+                    self.vector_matrix = np.vstack(self.vectors)
+                query_vector = self.embedder.embed([query])[0]
+                bm25 = scores[candidates] / max(float(scores[candidates].max()), 1e-9)
+                cosine = self.vector_matrix[candidates] @ query_vector
+                combined = (1 - self.vector_weight) * bm25 + self.vector_weight * cosine
+            else:
+                combined = scores[candidates]
+
+            order = np.argsort(-combined)[:k]
+            return [
+                dict(self.meta[candidates[index]], text=self._text(candidates[index]), score=round(float(combined[index]), 4))
+                for index in order
+            ]
+
+    def select(self, query, token_budget, k=RETRIEVAL_TOP_K):
+        return fit_to_budget(self.search(query, k), token_budget)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "sources": len(self.sources),
+                "chunks": self.alive_count,
+                "terms": len(self.doc_freq),
+                "slots": len(self.texts)
+            }
+
+
+def fit_to_budget(hits, token_budget):
+    selected = []
+    remaining = token_budget
+    for hit in hits:
+        tokens = count_tokens(hit["text"])
+        if tokens > remaining:
+            if selected or remaining < 64:
+                continue
+            hit["text"] = truncate_to_tokens(hit["text"], remaining, keep="start")
+            tokens = remaining
+        selected.append(hit)
+        remaining -= tokens
+        if remaining <= 0:
+            break
+    return selected
+
+
+def retrieval_budget(prompt_tokens):
+    return min(RETRIEVAL_TOKEN_BUDGET, int(prompt_tokens * RETRIEVAL_CONTEXT_RATIO))
+
+
+def reference_label(hit):
+    if "line_start" in hit:
+        return f"{hit['name']} lines {hit['line_start']}-{hit['line_end']}"
+    if "page_start" in hit:
+        pages = hit["page_start"] if hit["page_start"] == hit["page_end"] else f"{hit['page_start']}-{hit['page_end']}"
+        return f"{hit['name']} p.{pages}"
+    return hit.get("name", "document")
+
+
+def format_references(hits):
+    if not hits:
+        return ""
+    sections = [f"[{number}] {reference_label(hit)}\n{hit['text']}" for number, hit in enumerate(hits, start=1)]
+    return "Relevant excerpts from the user's files:\n\n" + "\n\n".join(sections)
@@ -0,0 +1,204 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+
+DEFAULT_INDEX_PATH = os.getenv("SEMANTIC_CACHE_PATH", os.path.join(".cache", "semantic"))
+DEFAULT_CAPACITY = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "5000"))
+DEFAULT_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+DEFAULT_BATCH_SIZE = 16
+DEFAULT_CANDIDATES = 5
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "0") == "1"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+STOPWORDS = frozenset(
+    "a an the and or but if of to in on at by for with from into as is are was were be been being do does did "
+    "how what why when where which who whom can could would should will shall may might must i me my we our you "
+    "your it its this that these those there here please explain show tell give write make help some any".split()
+)
+
+
+def stable_hash(text):
+    return zlib.crc32(text.encode("utf-8"))
+
+
+def content_terms(text):
+    return tuple(word for word in TOKEN_PATTERN.findall(text.lower()) if word not in STOPWORDS)
+
+
+class HashingEmbedder:
+    def __init__(self, dim=512, ngram_range=(1, 2), char_ngrams=3):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.char_ngrams = char_ngrams
+
+    def features(self, text):
+        words = TOKEN_PATTERN.findall(text.lower())
+        low, high = self.ngram_range
+        for size in range(low, high + 1):
+            for start in range(len(words) - size + 1):
+                yield " ".join(words[start:start + size])
+
+        if self.char_ngrams:
+            for word in words:
+                padded = f"#{word}#"
+                for start in range(len(padded) - self.char_ngrams + 1):
+                    yield "~" + padded[start:start + self.char_ngrams]
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self.features(text):
+                hashed = stable_hash(feature)
+                vectors[row, hashed % self.dim] += 1.0 if hashed & 0x80000000 else -1.0
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class SemanticCache:
+    def __init__(self, path=DEFAULT_INDEX_PATH, embedder=None, capacity=DEFAULT_CAPACITY,
+                 threshold=DEFAULT_THRESHOLD, batch_size=DEFAULT_BATCH_SIZE):
+        os.makedirs(path, exist_ok=True)
+
+        self.embedder = embedder or HashingEmbedder()
+        self.dim = self.embedder.dim
+        self.capacity = capacity
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.pending = []
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(os.path.join(path, "entries.sqlite3"), check_same_thread=False, isolation_level=None, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                slot INTEGER PRIMARY KEY,
+                scope INTEGER NOT NULL,
+                query TEXT NOT NULL,
+                response TEXT NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        vectors_path = os.path.join(path, "vectors.f32")
+        layout = f"{self.capacity}x{self.dim}"
+        stored_layout = self.conn.execute("SELECT value FROM meta WHERE key = 'layout'").fetchone()
+        expected_size = self.capacity * self.dim * 4
+
+        if stored_layout is None or stored_layout[0] != layout or not os.path.exists(vectors_path) \
+                or os.path.getsize(vectors_path) != expected_size:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('layout', ?)", (layout,))
+            self.vectors = np.memmap(vectors_path, dtype=np.float32, mode="w+", shape=(self.capacity, self.dim))
+        else:
+            self.vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+
+        self.occupied = np.zeros(self.capacity, dtype=bool)
+        self.scopes = np.zeros(self.capacity, dtype=np.int64)
+        self.last_access = np.zeros(self.capacity, dtype=np.float64)
+
+        for slot, scope, last_access in self.conn.execute("SELECT slot, scope, last_access FROM entries"):
+            self.occupied[slot] = True
+            self.scopes[slot] = scope
+            self.last_access[slot] = last_access
+
+    @staticmethod
+    def scope_id(*parts):
+        return stable_hash("\x1f".join(str(part) for part in parts))
+
+    def lookup(self, query, scope, threshold=None, top_k=DEFAULT_CANDIDATES):
+        threshold = self.threshold if threshold is None else threshold
+        query_vector = self.embedder.embed([query])[0]
+        terms = content_terms(query)
+
+        with self.lock:
+            for pending_scope, pending_query, pending_response, pending_vector in reversed(self.pending):
+                score = float(pending_vector @ query_vector)
+                if pending_scope == scope and score >= threshold and content_terms(pending_query) == terms:
+                    self.hits += 1
+                    return pending_response, score
+
+            for slot, score in self.search(query_vector, scope, top_k):
+                if score < threshold:
+                    break
+                row = self.conn.execute("SELECT query, response FROM entries WHERE slot = ?", (slot,)).fetchone()
+                if row is None or content_terms(row[0]) != terms:
+                    continue
+
+                now = time.time()
+                self.last_access[slot] = now
+                self.conn.execute("UPDATE entries SET last_access = ? WHERE slot = ?", (now, slot))
+                self.hits += 1
+                return row[1], score
+
+            self.misses += 1
+            return None
+
+    def search(self, query_vector, scope, top_k=1):
+        candidates = np.flatnonzero(self.occupied & (self.scopes == scope))
+        if candidates.size == 0:
+            return []
+
+        scores = self.vectors[candidates] @ query_vector
+        top_k = min(top_k, scores.size)
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(candidates[index]), float(scores[index])) for index in best]
+
+    def add(self, query, response, scope):
+        query_vector = self.embedder.embed([query])[0]
+        with self.lock:
+            self.pending.append((scope, query, response, query_vector))
+            if len(self.pending) >= self.batch_size:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.pending:
+            return
+
+        batch = self.pending[-self.capacity:]
+        self.pending = []
+
+        free_slots = np.flatnonzero(~self.occupied)
+        if free_slots.size < len(batch):
+            evictable = np.flatnonzero(self.occupied)
+            oldest = evictable[np.argsort(self.last_access[evictable])][:len(batch) - free_slots.size]
+            free_slots = np.concatenate([free_slots, oldest])
+        slots = free_slots[:len(batch)]
+
+        now = time.time()
+        self.vectors[slots] = np.stack([vector for _, _, _, vector in batch])
+        self.vectors.flush()
+        self.occupied[slots] = True
+        self.scopes[slots] = [scope for scope, _, _, _ in batch]
+        self.last_access[slots] = now
+
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO entries (slot, scope, query, response, last_access) VALUES (?, ?, ?, ?, ?)",
+            [(int(slot), scope, query, response, now) for slot, (scope, query, response, _) in zip(slots, batch)]
+        )
+        self.conn.execute("COMMIT")
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": int(self.occupied.sum()) + len(self.pending),
+                "capacity": self.capacity,
+                "pending": len(self.pending),
+                "hits": self.hits,
+                "misses": self.misses
+            }
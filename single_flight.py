@@ -0,0 +1,122 @@
+import threading
+from concurrent.futures import Future
+
+from generation_worker import GenerationHandle
+
+
+class Subscription:
+    def __init__(self, flight, handle, leader):
+        self.flight = flight
+        self.handle = handle
+        self.leader = leader
+        self.cancel_event = threading.Event()
+
+    @property
+    def done(self):
+        return self.handle.done or self.cancelled
+
+    @property
+    def error(self):
+        return self.handle.error
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set() or self.handle.cancelled
+
+    def cancel(self):
+        if self.cancel_event.is_set():
+            return
+        self.cancel_event.set()
+        self.flight.unsubscribe(self.handle)
+
+    def wait(self, timeout=None):
+        if self.cancel_event.is_set():
+            return True
+        return self.handle.wait(timeout)
+
+    @property
+    def state(self):
+        return self.handle.state
+
+    @property
+    def created_at(self):
+        return self.handle.created_at
+
+    @property
+    def first_chunk_at(self):
+        return self.handle.first_chunk_at
+
+    @property
+    def finished_at(self):
+        return self.handle.finished_at
+
+    def text(self):
+        return self.handle.text()
+
+    def iter_chunks(self):
+        for chunk in self.handle.iter_chunks():
+            if self.cancel_event.is_set():
+                return
+            yield chunk
+
+    def claim_finalization(self):
+        return self.handle.claim_finalization()
+
+
+class SingleFlight:
+    def __init__(self):
+        self.inflight = {}
+        self.subscribers = {}
+        self.deduplicated = 0
+        self.lock = threading.Lock()
+
+    def subscribe(self, key, chunk_source_factory, state=None, gate=None):
+        with self.lock:
+            handle = self.inflight.get(key)
+            if handle is not None and not handle.done and not handle.cancelled:
+                self.subscribers[handle] += 1
+                self.deduplicated += 1
+                return Subscription(self, handle, leader=False)
+
+            chunk_source = Future()
+            handle = GenerationHandle(
+                chunk_source.result,
+                on_done=lambda done_handle: self._release(key, done_handle),
+                state=state,
+                gate=gate
+            )
+            self.inflight[key] = handle
+            self.subscribers[handle] = 1
+
+        try:
+            chunk_source.set_result(chunk_source_factory())
+        except Exception as e:
+            chunk_source.set_exception(e)
+        return Subscription(self, handle, leader=True)
+
+    def unsubscribe(self, handle):
+        with self.lock:
+            remaining = self.subscribers.get(handle, 0) - 1
+            if remaining > 0:
+                self.subscribers[handle] = remaining
+                return
+            if self.subscribers.pop(handle, None) is None:
+                return
+        handle.cancel()
+
+    def _release(self, key, handle):
+        with self.lock:
+            if self.inflight.get(key) is handle:
+                del self.inflight[key]
+            self.subscribers.pop(handle, None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "inflight": len(self.inflight),
+                "subscribers": sum(self.subscribers.values()),
+                "deduplicated": self.deduplicated
+            }
+
+
+single_flight = SingleFlight()
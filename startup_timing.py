@@ -0,0 +1,40 @@
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PROCESS_START = time.perf_counter()
+
+startup_imports = {}
+deferred_imports = {}
+first_render_seconds = None
+
+
+@contextmanager
+def timed_import(name, deferred=False):
+    registry = deferred_imports if deferred else startup_imports
+    if name in registry:
+        yield
+        return
+
+    start = time.perf_counter()
+    yield
+    registry[name] = time.perf_counter() - start
+
+
+def mark_first_render():
+    global first_render_seconds
+    if first_render_seconds is not None:
+        return
+
+    first_render_seconds = time.perf_counter() - PROCESS_START
+    logger.info("Startup report: %s", startup_report())
+
+
+def startup_report():
+    return {
+        "startup_imports_ms": {name: round(seconds * 1000, 1) for name, seconds in startup_imports.items()},
+        "deferred_imports_ms": {name: round(seconds * 1000, 1) for name, seconds in deferred_imports.items()},
+        "time_to_first_render_ms": round(first_render_seconds * 1000, 1) if first_render_seconds is not None else None
+    }
@@ -0,0 +1,155 @@
+THEMES = {
+    "Dark Mode": {
+        "bg_color": "#1a1a1a",
+        "sidebar_bg": "#2d2d2d",
+        "text_color": "#ffffff",
+        "accent_color": "#4287f5",
+        "secondary_bg": "#3d3d3d",
+        "card_bg": "#2a2a2a",
+        "code_bg": "#252525",
+        "highlight_color": "#f9a825"
+    },
+    "Oceanic": {
+        "bg_color": "#0f2027",
+        "sidebar_bg": "#203a43",
+        "text_color": "#f0f8ff",
+        "accent_color": "#64b5f6",
+        "secondary_bg": "#2c5364",
+        "card_bg": "#1c313a",
+        "code_bg": "#162025",
+        "highlight_color": "#4fc3f7"
+    },
+    "Forest": {
+        "bg_color": "#0a1e0f",
+        "sidebar_bg": "#1e3b26",
+        "text_color": "#e8f5e9",
+        "accent_color": "#66bb6a",
+        "secondary_bg": "#2e5735",
+        "card_bg": "#1b2e20",
+        "code_bg": "#0f2213",
+        "highlight_color": "#aed581"
+    },
+    "Sunset": {
+        "bg_color": "#1a0f1c",
+        "sidebar_bg": "#2c1e33",
+        "text_color": "#ffebee",
+        "accent_color": "#ff7043",
+        "secondary_bg": "#3e2842",
+        "card_bg": "#261829",
+        "code_bg": "#1c131e",
+        "highlight_color": "#ffab40"
+    }
+}
+
+
+def build_theme_css(theme):
+    return f"""
+<style>
+    .main {{
+        background-color: {theme["bg_color"]};
+        color: {theme["text_color"]};
+    }}
+    
+    .sidebar .sidebar-content {{
+        background-color: {theme["sidebar_bg"]};
+    }}
+    
+    .stTextInput textarea, .stTextArea textarea {{
+        color: {theme["text_color"]} !important;
+        background-color: {theme["secondary_bg"]} !important;
+        border: 1px solid {theme["accent_color"]}40 !important;
+    }}
+    
+    .stSelectbox div[data-baseweb="select"] {{
+        color: {theme["text_color"]} !important;
+        background-color: {theme["secondary_bg"]} !important;
+        border: 1px solid {theme["accent_color"]}40 !important;
+    }}
+    
+    .stSelectbox svg {{
+        fill: {theme["text_color"]} !important;
+    }}
+    
+    div[role="listbox"] div {{
+        background-color: {theme["sidebar_bg"]} !important;
+        color: {theme["text_color"]} !important;
+    }}
+    
+    .stButton > button {{
+        background-color: {theme["accent_color"]};
+        color: {theme["text_color"]};
+        border: none;
+        border-radius: 4px;
+        padding: 0.5rem 1rem;
+        transition: all 0.3s;
+    }}
+    
+    .stButton > button:hover {{
+        background-color: {theme["highlight_color"]};
+    }}
+    
+    .message-container {{
+        background-color: {theme["card_bg"]};
+        border-radius: 10px;
+        padding: 15px;
+        margin-bottom: 15px;
+        border-left: 4px solid {theme["accent_color"]};
+        box-shadow: 0 2px 5px rgba(0,0,0,0.2);
+    }}
+    
+    .thinking-container {{
+        background-color: {theme["card_bg"]}90;
+        border-radius: 10px;
+        padding: 10px 15px;
+        margin: 10px 0;
+        border-left: 3px dashed {theme["highlight_color"]};
+    }}
+    
+    .time-stamp {{
+        font-size: 0.7rem;
+        color: {theme["text_color"]}80;
+        margin-top: 5px;
+        font-style: italic;
+    }}
+    
+    .header-container {{
+        display: flex;
+        justify-content: space-between;
+        align-items: center;
+        margin-bottom: 20px;
+    }}
+    
+    .code-block {{
+        background-color: {theme["code_bg"]};
+        border-radius: 5px;
+        border-left: 3px solid {theme["accent_color"]};
+    }}
+    
+    /* Hide default streamlit branding */
+    #MainMenu, footer, header {{
+        visibility: hidden;
+    }}
+    
+    /* Custom scrollbar */
+    ::-webkit-scrollbar {{
+        width: 8px;
+        height: 8px;
+    }}
+    
+    ::-webkit-scrollbar-track {{
+        background: {theme["bg_color"]};
+    }}
+    
+    ::-webkit-scrollbar-thumb {{
+        background: {theme["accent_color"]}80;
+        border-radius: 4px;
+    }}
+    
+    ::-webkit-scrollbar-thumb:hover {{
+        background: {theme["accent_color"]};
+    }}
+</style>
+"""
+
+
+THEME_CSS = {name: build_theme_css(theme) for name, theme in THEMES.items()}
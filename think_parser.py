@@ -0,0 +1,65 @@
+THINK_OPEN_TAG = "<think>"
+THINK_CLOSE_TAG = "</think>"
+
+
+def partial_tag_length(text, tag):
+    for length in range(min(len(text), len(tag) - 1), 0, -1):
+        if text.endswith(tag[:length]):
+            return length
+    return 0
+
+
+class ThinkStreamParser:
+    def __init__(self):
+        self.in_thinking = False
+        self.answer_started = False
+        self.buffer = ""
+
+    def _emit(self, text, thinking_parts, answer_parts):
+        if self.in_thinking:
+            thinking_parts.append(text)
+            return
+        if not self.answer_started:
+            text = text.lstrip()
+            if not text:
+                return
+            self.answer_started = True
+        answer_parts.append(text)
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        thinking_parts = []
+        answer_parts = []
+
+        while self.buffer:
+            tag = THINK_CLOSE_TAG if self.in_thinking else THINK_OPEN_TAG
+            index = self.buffer.find(tag)
+            if index >= 0:
+                self._emit(self.buffer[:index], thinking_parts, answer_parts)
+                self.buffer = self.buffer[index + len(tag):]
+                self.in_thinking = not self.in_thinking
+                continue
+
+            keep = partial_tag_length(self.buffer, tag)
+            ready = self.buffer[:len(self.buffer) - keep]
+            self.buffer = self.buffer[len(self.buffer) - keep:]
+            if ready:
+                self._emit(ready, thinking_parts, answer_parts)
+            break
+
+        return "".join(thinking_parts), "".join(answer_parts)
+
+    def flush(self):
+        thinking_parts = []
+        answer_parts = []
+        if self.buffer:
+            self._emit(self.buffer, thinking_parts, answer_parts)
+            self.buffer = ""
+        return "".join(thinking_parts), "".join(answer_parts)
+
+
+def split_thinking(text):
+    parser = ThinkStreamParser()
+    thinking, answer = parser.feed(text)
+    final_thinking, final_answer = parser.flush()
+    return (thinking + final_thinking).strip(), (answer + final_answer).strip()
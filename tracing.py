@@ -0,0 +1,204 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", os.path.join(".cache", "traces.jsonl"))
+TRACE_LOG_MAX_BYTES = int(os.getenv("TRACE_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+TRACE_LOG_BACKUPS = int(os.getenv("TRACE_LOG_BACKUPS", "3"))
+TRACE_WINDOW = int(os.getenv("TRACE_WINDOW", "1000"))
+METRICS_PORT = os.getenv("METRICS_PORT")
+
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+PERCENTILES = (0.5, 0.95, 0.99)
+SPAN_ORDER = ("retrieval", "cache_lookup", "prompt_build", "queue_wait", "time_to_first_token", "generation", "render", "total")
+
+
+class Trace:
+    def __init__(self, model, backend):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.model = model
+        self.backend = backend
+        self.started = time.monotonic()
+        self.wall_time = time.time()
+        self.spans = []
+        self.attributes = {}
+
+    def add_span(self, name, start, end):
+        if start is None or end is None:
+            return
+        start = max(start, self.started)
+        self.spans.append({
+            "name": name,
+            "start_ms": round((start - self.started) * 1000, 2),
+            "duration_ms": round(max(end - start, 0) * 1000, 2)
+        })
+
+    @contextmanager
+    def span(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_span(name, start, time.monotonic())
+
+    def add_generation_spans(self, handle):
+        self.add_span("time_to_first_token", self.started, handle.first_chunk_at)
+        self.add_span("generation", handle.created_at, handle.finished_at)
+
+    def finish(self, **attributes):
+        self.attributes.update(attributes)
+        self.add_span("total", self.started, time.monotonic())
+        return self
+
+    def breakdown(self):
+        def position(span):
+            order = SPAN_ORDER.index(span["name"]) if span["name"] in SPAN_ORDER else len(SPAN_ORDER) - 1.5
+            return order, span["start_ms"]
+
+        return [(span["name"], span["duration_ms"]) for span in sorted(self.spans, key=position)]
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "timestamp": self.wall_time,
+            "model": self.model,
+            "backend": self.backend,
+            "attributes": self.attributes,
+            "spans": self.spans
+        }
+
+
+class LatencyHistogram:
+    def __init__(self, window=TRACE_WINDOW, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+        for index, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[index] += 1
+                break
+
+    def percentiles(self):
+        ordered = sorted(self.samples)
+        return {
+            f"p{int(fraction * 100)}": round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 1)
+            for fraction in PERCENTILES
+        } if ordered else {}
+
+
+class TraceRecorder:
+    def __init__(self, log_path=TRACE_LOG_PATH, max_bytes=TRACE_LOG_MAX_BYTES, backups=TRACE_LOG_BACKUPS):
+        self.log_path = log_path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.logger = None
+        self.server = None
+        self.collectors = []
+
+    def register_collector(self, collector):
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    def _trace_logger(self):
+        if self.logger is None and self.log_path:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            handler = RotatingFileHandler(self.log_path, maxBytes=self.max_bytes, backupCount=self.backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger = logging.getLogger(f"genai.traces.{id(self)}")
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+            self.logger.addHandler(handler)
+        return self.logger
+
+    def record(self, trace):
+        with self.lock:
+            for span in trace.spans:
+                key = (trace.model, span["name"])
+                if key not in self.histograms:
+                    self.histograms[key] = LatencyHistogram()
+                self.histograms[key].observe(span["duration_ms"] / 1000)
+            trace_logger = self._trace_logger()
+
+        if trace_logger is not None:
+            trace_logger.info(json.dumps(trace.to_dict()))
+
+    def percentiles(self, model=None):
+        with self.lock:
+            report = {}
+            for (span_model, span_name), histogram in sorted(self.histograms.items()):
+                if model is None or span_model == model:
+                    report.setdefault(span_model, {})[span_name] = dict(histogram.percentiles(), count=histogram.count)
+            return report
+
+    def histogram(self, model, span_name):
+        with self.lock:
+            histogram = self.histograms.get((model, span_name))
+            if histogram is None:
+                return {}
+            return {
+                ("+Inf" if bound == float("inf") else f"≤{bound:g}s"): count
+                for bound, count in zip(histogram.buckets, histogram.counts)
+            }
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP genai_span_seconds Duration of generation request spans",
+            "# TYPE genai_span_seconds histogram"
+        ]
+        with self.lock:
+            for (model, span_name), histogram in sorted(self.histograms.items()):
+                labels = f'model="{model}",span="{span_name}"'
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f'genai_span_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"genai_span_seconds_sum{{{labels}}} {histogram.total:.6f}")
+                lines.append(f"genai_span_seconds_count{{{labels}}} {histogram.count}")
+        for collector in list(self.collectors):
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+    def start_metrics_server(self, port, host="0.0.0.0"):
+        if self.server is not None:
+            return self.server
+        recorder = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = recorder.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="metrics-server", daemon=True).start()
+        return self.server
+
+
+trace_recorder = TraceRecorder()